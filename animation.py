@@ -0,0 +1,96 @@
+import math
+import time
+
+# 目標影格間隔與單一影格的時間預算 (秒)
+FRAME_INTERVAL = 1 / 60
+FRAME_BUDGET = 0.008
+
+
+def linear(t):
+    return t
+
+
+def ease_in_out(t):
+    return t * t * (3 - 2 * t)
+
+
+def ease_out_cubic(t):
+    return 1 - (1 - t) ** 3
+
+
+class Animation:
+    __slots__ = ("start_value", "end_value", "duration", "apply", "easing", "on_done", "started")
+
+    def __init__(self, start_value, end_value, duration, apply, easing, on_done, started):
+        self.start_value = start_value
+        self.end_value = end_value
+        self.duration = duration
+        self.apply = apply
+        self.easing = easing
+        self.on_done = on_done
+        self.started = started
+
+    def value(self, now):
+        t = min(1.0, (now - self.started) / self.duration) if self.duration > 0 else 1.0
+        return self.start_value + (self.end_value - self.start_value) * self.easing(t), t >= 1.0
+
+
+class Animator:
+    """以 after() 驅動的補間動畫，所有動畫共用一個計時器，不會卡住事件迴圈。
+
+    數值依實際經過的時間計算，事件迴圈忙碌時自然跳過中間的影格；單一影格超出 budget 時
+    會拉長到下一個影格的間隔。同一個 key 開始新的動畫會取消舊的 (舊動畫的 on_done 不會被呼叫)。
+    """
+
+    def __init__(self, after, after_cancel, clock=time.monotonic, interval=FRAME_INTERVAL, budget=FRAME_BUDGET):
+        self.after = after
+        self.after_cancel = after_cancel
+        self.clock = clock
+        self.interval = interval
+        self.budget = budget
+        self.animations = {}
+        self.frames = 0
+        self.skipped = 0
+        self._job = None
+
+    def animate(self, key, start, end, duration, apply, easing=ease_in_out, on_done=None):
+        self.animations[key] = Animation(start, end, duration, apply, easing, on_done, self.clock())
+        apply(start)
+        if self._job is None:
+            self._arm(self.interval)
+
+    def cancel(self, key):
+        self.animations.pop(key, None)
+        if not self.animations and self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def is_running(self, key):
+        return key in self.animations
+
+    def _arm(self, delay):
+        self._job = self.after(max(1, math.ceil(delay * 1000)), self._frame)
+
+    def _frame(self):
+        self._job = None
+        start = self.clock()
+        finished = []
+        for key, animation in list(self.animations.items()):
+            value, done = animation.value(start)
+            animation.apply(value)
+            if done:
+                finished.append((key, animation))
+        self.frames += 1
+
+        for key, animation in finished:
+            # on_done 可能已經在同一個 key 開始下一段動畫
+            if self.animations.get(key) is animation:
+                del self.animations[key]
+            if animation.on_done:
+                animation.on_done()
+
+        if self.animations and self._job is None:
+            cost = self.clock() - start
+            skip = math.ceil(cost / self.interval) if cost > self.budget else 0
+            self.skipped += skip
+            self._arm(self.interval * (1 + skip))
@@ -0,0 +1,166 @@
+"""執行排程動作的後端。
+
+ExecBackend 直接啟動指令 (不經過 shell)，記錄結束代碼與輸出；同一個動作可以列出多個候選指令，
+前一個找不到或失敗時換下一個。DryRunBackend 只記錄被要求的動作，方便在一般電腦上測試與量測。
+OsTimer 把期限直接交給作業系統的關機計時器，排好之後這個程式就可以結束。
+"""
+import math
+import os
+import subprocess
+import time
+
+WINDOWS_COMMANDS = {
+    "shutdown": [["shutdown", "-p", "-f"]],
+    "reboot": [["shutdown", "-r", "-t", "0", "-f"]],
+    "sleep": [["rundll32.exe", "powrprof.dll,SetSuspendState", "0,1,0"]],
+    "hibernate": [["shutdown", "-h"]],
+}
+
+LINUX_COMMANDS = {
+    "shutdown": [["systemctl", "poweroff"], ["shutdown", "-h", "now"]],
+    "reboot": [["systemctl", "reboot"], ["shutdown", "-r", "now"]],
+    "sleep": [["systemctl", "suspend"]],
+    "hibernate": [["systemctl", "hibernate"]],
+}
+
+BACKENDS = ("exec", "dry-run")
+# 可以交給作業系統關機計時器的動作
+HANDOFF_ACTIONS = ("shutdown", "reboot")
+# 等待指令結束的秒數；關機指令通常立刻返回
+COMMAND_TIMEOUT = 30
+
+
+class ActionResult:
+    """一次動作的結果；issued 是指令送出 (行程已建立) 當下的 epoch 秒數，沒送出時為 None。"""
+
+    __slots__ = ("action", "argv", "returncode", "error", "issued")
+
+    def __init__(self, action, argv, returncode, error, issued):
+        self.action = action
+        self.argv = argv
+        self.returncode = returncode
+        self.error = error
+        self.issued = issued
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and self.error is None
+
+
+class ExecBackend:
+    def __init__(self, commands=None, timeout=COMMAND_TIMEOUT, clock=time.time):
+        self.commands = commands or (WINDOWS_COMMANDS if os.name == "nt" else LINUX_COMMANDS)
+        self.timeout = timeout
+        self.clock = clock
+
+    def run(self, action):
+        # 依序嘗試候選指令，成功就停；全部失敗時回傳最後一個的結果，issued 記第一次送出的時間
+        result = ActionResult(action, None, None, "沒有可用的指令", None)
+        issued = None
+        for argv in self.commands.get(action, ()):
+            result = self._run_one(action, argv)
+            issued = issued or result.issued
+            if result.ok:
+                break
+        result.issued = issued
+        return result
+
+    def _run_one(self, action, argv):
+        try:
+            proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        except OSError as e:
+            return ActionResult(action, argv, None, str(e), None)
+        issued = self.clock()
+        try:
+            output, _ = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return ActionResult(action, argv, None, f"指令逾時 ({self.timeout} 秒)", issued)
+        message = output.decode(errors="replace").strip() if proc.returncode else None
+        return ActionResult(action, argv, proc.returncode, message or None, issued)
+
+
+class DryRunBackend:
+    """不真的執行，只把 (動作, 時間) 記在 calls 裡。"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.calls = []
+
+    def run(self, action):
+        issued = self.clock()
+        self.calls.append((action, issued))
+        return ActionResult(action, None, 0, None, issued)
+
+
+def run_command(argv, timeout=COMMAND_TIMEOUT):
+    """執行指令並回傳 (結束代碼, 輸出)；找不到執行檔時結束代碼為 None。"""
+    try:
+        proc = subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              timeout=timeout, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return None, str(e)
+    return proc.returncode, proc.stdout.decode(errors="replace").strip()
+
+
+class OsTimer:
+    """作業系統的關機計時器：Windows 用 shutdown /t 秒數，其他平台用 shutdown +分鐘 (無條件進位到分鐘)。
+
+    runner(argv) 回傳 (結束代碼, 輸出)，測試時可以換成假的。
+    """
+
+    def __init__(self, runner=run_command, windows=os.name == "nt", clock=time.time):
+        self.runner = runner
+        self.windows = windows
+        self.clock = clock
+
+    def arm_argv(self, action, deadline):
+        delay = max(0.0, deadline - self.clock())
+        if self.windows:
+            flag = "/s" if action == "shutdown" else "/r"
+            return ["shutdown", flag, "/f", "/t", str(min(315360000, math.ceil(delay)))]
+        flag = "-h" if action == "shutdown" else "-r"
+        return ["shutdown", flag, f"+{math.ceil(delay / 60)}"]
+
+    def cancel_argv(self):
+        return ["shutdown", "/a"] if self.windows else ["shutdown", "-c"]
+
+    def arm(self, action, deadline):
+        if action not in HANDOFF_ACTIONS:
+            raise ValueError(f"{action} 無法交給系統排程")
+        return self._run(action, self.arm_argv(action, deadline))
+
+    def cancel(self):
+        return self._run("cancel", self.cancel_argv())
+
+    def _run(self, action, argv):
+        issued = self.clock()
+        returncode, output = self.runner(argv)
+        return ActionResult(action, argv, returncode, output if returncode != 0 else None, issued)
+
+
+class FakeRunner:
+    """代替 run_command 的假指令執行器：記錄 argv，回傳固定的結果。"""
+
+    def __init__(self, returncode=0, output=""):
+        self.returncode = returncode
+        self.output = output
+        self.calls = []
+
+    def __call__(self, argv):
+        self.calls.append(argv)
+        return self.returncode, self.output
+
+
+def create_os_timer(name="exec"):
+    return OsTimer(FakeRunner()) if name == "dry-run" else OsTimer()
+
+
+def create_backend(name="exec"):
+    if name == "dry-run":
+        return DryRunBackend()
+    if name == "exec":
+        return ExecBackend()
+    raise ValueError(f"未知的後端: {name}")
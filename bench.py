@@ -0,0 +1,1167 @@
+"""效能量測與回歸檢查：python bench.py [名稱 ...] [--tk] [--json 結果.json] [--baseline 基準.json]
+
+每個項目印出一行 JSON。--json 把全部結果 (含環境資訊) 存成一個檔案，之後可當作 --baseline；
+比對時只看各項目登記的指標 (lower 越低越好、higher 越高越好)，變差超過 --threshold 或基準裡有的指標這次沒量到，
+就以結束代碼 1 結束。量測途中的正確性檢查失敗 (結果帶有 "error") 不論有沒有基準都以結束代碼 1 結束。
+"""
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from animation import Animator
+from clock_renderer import ClockRenderer
+from control import ControlServer, bind_control_socket, send_command
+from scheduler import DeadlineWaiter, FakeClock, SchedulerCore
+from ticker import TickScheduler
+
+COLORS = {
+    "clock_face": "#1e1e1e",
+    "clock_border": "#00bcd4",
+    "clock_tick": "#808080",
+    "hand_target": "#ff1744",
+    "hand_hour": "#ffffff",
+    "hand_min": "#ffffff",
+    "hand_sec": "#2979ff"
+}
+
+BENCHMARKS = {}
+# 每個項目用來判斷回歸的指標：{名稱: {指標路徑: "lower" 或 "higher"}}，巢狀結果以 "." 分隔
+TRACKED = {}
+# 預設容許的變化比例
+DEFAULT_THRESHOLD = 0.3
+# 依單位設定的絕對雜訊門檻：差距小於這個值的計時指標不算回歸
+NOISE_FLOOR = {"_ms": 0.5, "_us": 5.0}
+
+
+def benchmark(name, lower=(), higher=()):
+    def register(func):
+        BENCHMARKS[name] = func
+        TRACKED[name] = {**{metric: "lower" for metric in lower}, **{metric: "higher" for metric in higher}}
+        return func
+    return register
+
+
+class FakeCanvas:
+    """記錄呼叫次數的假 Canvas，讓繪製流程可在無視窗環境下量測。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.next_id = 0
+        self.items = {}
+
+    def create_line(self, *coords, **options):
+        return self._create(coords, options)
+
+    def create_oval(self, *coords, **options):
+        return self._create(coords, options)
+
+    def _create(self, coords, options):
+        self.calls += 1
+        self.next_id += 1
+        self.items[self.next_id] = [coords, options]
+        return self.next_id
+
+    def coords(self, item, *coords):
+        self.calls += 1
+        self.items[item][0] = coords
+
+    def itemconfigure(self, item, **options):
+        self.calls += 1
+        self.items[item][1].update(options)
+
+    def delete(self, tag):
+        self.calls += 1
+        if tag == "all":
+            self.items.clear()
+        else:
+            self.items.pop(tag, None)
+
+
+def make_canvas(use_tk):
+    if not use_tk:
+        return FakeCanvas(), None
+    import tkinter as tk
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=280, height=280)
+    canvas.pack()
+    return canvas, root
+
+
+def legacy_draw_clock(canvas, scale, now, target):
+    # 舊版 update_clock 的繪製流程：每個 frame 都 delete("all") 後重建全部項目
+    def draw_hand(center, length, angle, color, width=2):
+        scaled_width = max(1, int(width * scale))
+        angle_rad = math.radians(angle - 90)
+        x = center + length * math.cos(angle_rad)
+        y = center + length * math.sin(angle_rad)
+        canvas.create_line(center, center, x, y, width=scaled_width, fill=color, capstyle="round")
+
+    canvas.delete("all")
+    center = 140 * scale
+    radius = 120 * scale
+    canvas.create_oval(center - radius, center - radius, center + radius, center + radius, width=int(3 * scale),
+                       outline=COLORS["clock_border"], fill=COLORS["clock_face"])
+    tick_len_long = 20 * scale
+    tick_len_short = 10 * scale
+    tick_width = max(1, int(2 * scale))
+    for i in range(12):
+        rad = math.radians(i * 30 - 90)
+        x1 = center + (radius - tick_len_short) * math.cos(rad)
+        y1 = center + (radius - tick_len_short) * math.sin(rad)
+        x2 = center + (radius - tick_len_long) * math.cos(rad)
+        y2 = center + (radius - tick_len_long) * math.sin(rad)
+        canvas.create_line(x1, y1, x2, y2, width=tick_width, fill=COLORS["clock_tick"])
+    if target:
+        t_h, t_m = target.hour, target.minute
+        draw_hand(center, radius * 0.55, (t_h % 12 + t_m / 60) * 30, COLORS["hand_target"], width=5)
+        draw_hand(center, radius * 0.75, t_m * 6, COLORS["hand_target"], width=3)
+    draw_hand(center, radius * 0.5, (now.hour % 12) * 30 + now.minute * 0.5, COLORS["hand_hour"], width=6)
+    draw_hand(center, radius * 0.8, now.minute * 6, COLORS["hand_min"], width=4)
+    draw_hand(center, radius * 0.9, now.second * 6, COLORS["hand_sec"], width=2)
+    center_dot = 5 * scale
+    canvas.create_oval(center - center_dot, center - center_dot, center + center_dot, center + center_dot,
+                       fill=COLORS["hand_sec"])
+
+
+def frames_per_cpu_second(draw, frames, rounds=3):
+    # 分成幾輪取最快的一輪，降低其他行程干擾的影響
+    best = None
+    chunk = max(1, frames // rounds)
+    for r in range(rounds):
+        start = time.process_time()
+        for i in range(r * chunk, (r + 1) * chunk):
+            draw(i)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return chunk / best if best > 0 else float("inf")
+
+
+@benchmark("clock", lower=("retained_calls_per_frame",), higher=("retained_fps",))
+def bench_clock(args):
+    # 模擬 10 Hz 更新：每 10 個 frame 秒針才前進一格
+    base = datetime.datetime(2024, 1, 1, 23, 0, 0)
+    target = base + datetime.timedelta(minutes=90)
+    frames = args.frames
+    results = {}
+
+    canvas, root = make_canvas(args.tk)
+    results["legacy_fps"] = frames_per_cpu_second(
+        lambda i: legacy_draw_clock(canvas, 1.0, base + datetime.timedelta(seconds=i // 10), target), frames)
+    results["legacy_calls_per_frame"] = getattr(canvas, "calls", 0) / frames
+    if root:
+        root.destroy()
+
+    canvas, root = make_canvas(args.tk)
+    renderer = ClockRenderer(canvas, COLORS, 1.0)
+    setup_calls = getattr(canvas, "calls", 0)
+    results["retained_fps"] = frames_per_cpu_second(
+        lambda i: renderer.render(base + datetime.timedelta(seconds=i // 10), target), frames)
+    results["retained_calls_per_frame"] = (getattr(canvas, "calls", 0) - setup_calls) / frames
+    if root:
+        root.destroy()
+
+    results["speedup"] = results["retained_fps"] / results["legacy_fps"]
+    return results
+
+
+class EventLoop:
+    """最小化的 after()/after_cancel() 事件迴圈；virtual=True 時以虛擬時間推進。"""
+
+    def __init__(self, virtual=True, start=1_700_000_000.25):
+        self.virtual = virtual
+        self.offset = start - time.time()
+        self.now = start
+        self.jobs = []
+        self.ids = itertools.count()
+        self.cancelled = set()
+
+    def clock(self):
+        return self.now if self.virtual else time.time() + self.offset
+
+    def after(self, ms, func):
+        job = next(self.ids)
+        heapq.heappush(self.jobs, (self.clock() + ms / 1000, job, func))
+        return job
+
+    def after_cancel(self, job):
+        self.cancelled.add(job)
+
+    def run(self, seconds):
+        end = self.clock() + seconds
+        while self.jobs and self.jobs[0][0] <= end:
+            when, job, func = heapq.heappop(self.jobs)
+            if job in self.cancelled:
+                continue
+            if self.virtual:
+                self.now = when
+            else:
+                time.sleep(max(0, when - self.clock()))
+            func()
+
+
+def legacy_wakeups(seconds):
+    loop = EventLoop()
+    count = 0
+
+    def update():
+        nonlocal count
+        count += 1
+        loop.after(100, update)
+
+    update()
+    loop.run(seconds)
+    return count / (seconds / 60)
+
+
+@benchmark("ticker", lower=("visible_wakeups_per_minute", "hidden_wakeups_per_minute"))
+def bench_ticker(args):
+    results = {"legacy_wakeups_per_minute": legacy_wakeups(600)}
+
+    # 視窗顯示 / 隱藏兩種情境，各模擬 10 分鐘，期限設在模擬結束前 30 秒
+    for name, period in (("visible", 1), ("hidden", 60)):
+        loop = EventLoop()
+        deadline = loop.clock() + 570
+        ticker = TickScheduler(loop.after, loop.after_cancel,
+                               lambda now: 1 if deadline - now <= 60 else period,
+                               deadline_fn=lambda: deadline, clock=loop.clock)
+        ticker.start()
+        loop.run(600)
+        results[f"{name}_wakeups_per_minute"] = ticker.stats.total / 10
+
+    # 以真實時間跑幾秒量測喚醒誤差
+    loop = EventLoop(virtual=False)
+    ticker = TickScheduler(loop.after, loop.after_cancel, lambda now: 1, clock=loop.clock)
+    ticker.start()
+    loop.run(args.seconds)
+    summary = ticker.stats.summary()
+    results["jitter_mean_ms"] = summary.get("jitter_mean_ms")
+    results["jitter_max_ms"] = summary.get("jitter_max_ms")
+    return results
+
+
+@benchmark("queue", lower=("10000.add_us", "10000.cancel_us", "10000.query_us", "10000.pop_us"))
+def bench_queue(args):
+    # 每種規模各做 n 次新增、n/2 次取消、查詢前幾筆，再把時間推進到全部到期
+    import random
+    rng = random.Random(0)
+    results = {}
+    for n in (100, 1000, 10000):
+        clock = FakeClock()
+        core = SchedulerCore(clock)
+        start = time.perf_counter()
+        entries = [core.add_countdown("shutdown", rng.uniform(60, 86400), (600, 60)) for _ in range(n)]
+        add_us = (time.perf_counter() - start) / n * 1e6
+
+        start = time.perf_counter()
+        for entry in rng.sample(entries, n // 2):
+            core.cancel(entry.id)
+        cancel_us = (time.perf_counter() - start) / (n // 2) * 1e6
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            core.upcoming(3)
+            core.next_entry()
+        query_us = (time.perf_counter() - start) / 1000 * 1e6
+
+        clock.advance(86400)
+        start = time.perf_counter()
+        fired = len(core.pop_due())
+        pop_us = (time.perf_counter() - start) / max(1, fired) * 1e6
+        results[str(n)] = {"add_us": add_us, "cancel_us": cancel_us, "query_us": query_us, "pop_us": pop_us}
+    return results
+
+
+def rss_bytes():
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def build_widget_tree(root):
+    import tkinter as tk
+    canvas = tk.Canvas(root, width=280, height=280)
+    canvas.pack()
+    for _ in range(2):
+        frame = tk.LabelFrame(root, text="group")
+        frame.pack()
+        for _ in range(2):
+            tk.Entry(frame, width=4).pack(side="left")
+            tk.Label(frame, text="label").pack(side="left")
+    tk.Label(root, text="status").pack()
+    tk.Button(root, text="button").pack()
+    return canvas
+
+
+def measure_idle(root, seconds):
+    root.after(int(seconds * 1000), root.quit)
+    start = time.process_time()
+    root.mainloop()
+    return {"cpu_percent": (time.process_time() - start) / seconds * 100, "rss_mb": rss_bytes() / 2 ** 20}
+
+
+@benchmark("background", lower=("background.cpu_percent", "background.rss_mb"))
+def bench_background(args):
+    if not args.tk:
+        return {"skipped": "需要 --tk"}
+    import tkinter as tk
+    base = datetime.datetime(2024, 1, 1, 23, 0, 0)
+    results = {}
+
+    # 舊版：視窗隱藏後仍每 100 ms 重畫整個錶面
+    root = tk.Tk()
+    canvas = build_widget_tree(root)
+    root.withdraw()
+
+    def redraw():
+        legacy_draw_clock(canvas, 1.0, datetime.datetime.now(), base)
+        root.after(100, redraw)
+
+    redraw()
+    results["legacy"] = measure_idle(root, args.seconds)
+    root.destroy()
+
+    # 背景模式：拆掉元件樹，期限交給等待執行緒
+    root = tk.Tk()
+    build_widget_tree(root)
+    root.withdraw()
+    for widget in root.winfo_children():
+        widget.destroy()
+    waiter = DeadlineWaiter(lambda entry, deadline: None)
+    waiter.add_countdown("shutdown", 3600)
+    results["background"] = measure_idle(root, args.seconds)
+    waiter.clear()
+    root.destroy()
+    return results
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def timer_lateness(loop, duration, start_fade):
+    """以 10 ms 週期的計時器代表期限檢查，回傳淡出期間它最晚延遲了多少毫秒。"""
+    worst = 0.0
+    end = loop.clock() + duration
+
+    def arm():
+        expected = loop.clock() + 0.01
+        loop.after(10, lambda: check(expected))
+
+    def check(expected):
+        nonlocal worst
+        worst = max(worst, loop.clock() - expected)
+        if loop.clock() < end:
+            arm()
+
+    arm()
+    loop.after(20, start_fade)
+    loop.run(duration)
+    return worst * 1000
+
+
+@benchmark("animation", lower=("animator_max_timer_delay_ms",))
+def bench_animation(args):
+    results = {}
+
+    # 舊版：在事件迴圈裡 while + update() + sleep(0.015) 做 10 步淡出
+    loop = EventLoop(virtual=False)
+
+    def legacy_fade():
+        for _ in range(10):
+            busy(0.0005)
+            time.sleep(0.015)
+
+    results["legacy_max_timer_delay_ms"] = timer_lateness(loop, 0.5, legacy_fade)
+
+    # 新版：after() 驅動，每個影格只做一次設定透明度 (約 0.5 ms)
+    for name, cost in (("animator", 0.0005), ("animator_loaded", 0.03)):
+        loop = EventLoop(virtual=False)
+        animator = Animator(loop.after, loop.after_cancel, clock=loop.clock)
+        done = []
+        start = lambda: animator.animate("alpha", 1.0, 0.0, 0.15, lambda value: busy(cost),
+                                         on_done=lambda: done.append(loop.clock()))
+        results[f"{name}_max_timer_delay_ms"] = timer_lateness(loop, 0.5, start)
+        results[f"{name}_frames"] = animator.frames
+        results[f"{name}_skipped_frames"] = animator.skipped
+        results[f"{name}_finished"] = bool(done)
+    return results
+
+
+class FakeWidget:
+    def __init__(self):
+        self.calls = 0
+
+    def config(self, **options):
+        self.calls += 1
+
+
+@benchmark("view", lower=("status_configs_per_second", "unchanged_state_configs", "previews"))
+def bench_view(args):
+    from view import Debouncer, WidgetView
+    results = {}
+    seconds = 60
+
+    # 倒數中的狀態列：舊版每 100 ms 重設一次 text 與 fg，新版只送出有變的屬性
+    label = FakeWidget()
+    for tick in range(seconds * 10):
+        label.config(text=f"剩餘 0:59:{59 - tick // 10:02}", fg="#ff5252")
+    results["legacy_status_configs_per_second"] = label.calls / seconds
+
+    loop = EventLoop()
+    view = WidgetView(clock=loop.clock)
+    label = FakeWidget()
+    for tick in range(seconds * 10):
+        loop.now += 0.1
+        view.config(label, text=f"剩餘 0:59:{59 - tick // 10:02}", fg="#ff5252")
+    results["status_configs_per_second"] = view.calls_per_second()
+    results["status_configs_skipped"] = view.skipped
+
+    # update_ui_state / on_mode_change 反覆呼叫但狀態不變
+    widgets = [FakeWidget() for _ in range(9)]
+    for _ in range(100):
+        for widget in widgets:
+            view.config(widget, state="normal", bg="#3c3f41")
+    results["unchanged_state_configs"] = sum(widget.calls for widget in widgets)
+    results["legacy_unchanged_state_configs"] = 100 * len(widgets)
+
+    # 打字：20 個按鍵、間隔 50 ms
+    previews = []
+    debounce = Debouncer(loop.after, loop.after_cancel, 150, lambda: previews.append(loop.clock()))
+    for i in range(20):
+        loop.after(i * 50, debounce)
+    loop.run(2)
+    results["keystrokes"] = 20
+    results["previews"] = len(previews)
+    return results
+
+
+@benchmark("tray", lower=("icon_decode_ms", "renders", "total_ms"))
+def bench_tray(args):
+    try:
+        import PIL
+    except ImportError:
+        return {"skipped": "需要 PIL"}
+    import tray
+    from tray import BadgeCache, badge_label, load_base_icon
+    # 舊版每次縮小到系統列都重新解碼 icon.ico；新版只解碼一次，徽章依顯示值快取
+    start = time.perf_counter()
+    load_base_icon()
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    # 模擬 3 小時倒數期間每秒呼叫一次更新，並在途中反覆縮小/還原
+    cache = BadgeCache(load_base_icon())
+    label = None
+    swaps = 0
+    start = time.perf_counter()
+    for remaining in range(3 * 3600, 0, -1):
+        new_label = badge_label(remaining)
+        if new_label != label:
+            label = new_label
+            cache.get(label, 1.0)
+            swaps += 1
+    for _ in range(100):
+        cache.get(label, 1.0)
+    elapsed = time.perf_counter() - start
+    return {
+        "icon_decode_ms": decode_ms,
+        "updates": 3 * 3600,
+        "icon_swaps": swaps,
+        "renders": cache.misses,
+        "cache_hits": cache.hits,
+        "cache_size": len(cache._images),
+        "cache_limit": tray.BADGE_CACHE_SIZE,
+        "total_ms": elapsed * 1000,
+    }
+
+
+def legacy_save_config(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+@benchmark("config", lower=("store_load_ms", "store_update_ms", "burst_writes"))
+def bench_config(args):
+    import tempfile
+    from service import ScheduleService
+    from settings import ConfigStore
+
+    runs = 200
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "AutoShutdown", "config.json")
+        # 先存一份帶有排程的設定，量測啟動時載入並接回排程的成本
+        store = ConfigStore(path, delay=0)
+        service = ScheduleService(store=store)
+        service.arm("shutdown", seconds=5400)
+        for hours in range(1, 10):
+            service.add("reboot", seconds=hours * 3600)
+        store.flush()
+        service.waiter.clear()
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            with open(path, 'r', encoding='utf-8') as f:
+                json.load(f)
+        results["legacy_load_ms"] = (time.perf_counter() - start) / runs * 1000
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            ConfigStore(path)
+        results["store_load_ms"] = (time.perf_counter() - start) / runs * 1000
+
+        store = ConfigStore(path)
+        service = ScheduleService(store=store)
+        start = time.perf_counter()
+        results["resumed"] = service.resume()
+        results["resume_ms"] = (time.perf_counter() - start) * 1000
+        service.waiter.clear()
+
+        # UI 執行緒上的成本：舊版每次同步改寫整個檔案，新版只更新記憶體並交給背景執行緒
+        data = dict(store.data)
+        start = time.perf_counter()
+        for i in range(runs):
+            data["cd_m"] = str(i)
+            legacy_save_config(path, data)
+        results["legacy_save_ms"] = (time.perf_counter() - start) / runs * 1000
+
+        store = ConfigStore(path, delay=0.05)
+        start = time.perf_counter()
+        for i in range(runs):
+            store.update(cd_m=str(i))
+        results["store_update_ms"] = (time.perf_counter() - start) / runs * 1000
+        time.sleep(0.2)
+        results["burst_updates"] = runs
+        results["burst_writes"] = store.writes
+    return results
+
+
+class FiredListener:
+    def __init__(self):
+        self.fired = threading.Event()
+
+    def on_action_fired(self, entry, result):
+        self.fired.set()
+
+
+@benchmark("action", lower=("exec_latency_ms_median", "dry_run_latency_ms_median"))
+def bench_action(args):
+    from backends import DryRunBackend, ExecBackend
+    from service import ScheduleService
+
+    runs = 10
+    results = {}
+    # 舊版：os.system 先啟動 shell 再由 shell 啟動指令，這裡量到指令結束為止
+    start = time.perf_counter()
+    for _ in range(runs):
+        os.system("true" if os.name != "nt" else "cmd /c exit 0")
+    results["legacy_os_system_ms"] = (time.perf_counter() - start) / runs * 1000
+
+    noop = [["true"]] if os.name != "nt" else [["cmd", "/c", "exit", "0"]]
+    for name, backend in (("dry_run", DryRunBackend()), ("exec", ExecBackend({"shutdown": noop}))):
+        listener = FiredListener()
+        service = ScheduleService(listener, backend=backend)
+        latencies = []
+        for _ in range(runs):
+            listener.fired.clear()
+            service.arm("shutdown", seconds=0.05)
+            listener.fired.wait(5)
+            latencies.append(service.last_latency * 1000)
+        latencies.sort()
+        results[f"{name}_latency_ms_median"] = latencies[len(latencies) // 2]
+        results[f"{name}_latency_ms_max"] = latencies[-1]
+    return results
+
+
+@benchmark("handoff", lower=("handoff_exit_ms",))
+def bench_handoff(args):
+    import tempfile
+    if not os.path.exists("/proc/self/statm"):
+        return {"skipped": "需要 /proc"}
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, APPDATA=tmp)
+        sock = bind_control_socket(0)
+        port = str(sock.getsockname()[1])
+        sock.close()
+
+        # 留在背景等待：常駐行程的記憶體與 CPU 時間
+        proc = subprocess.Popen([sys.executable, "main.py", "--in", "90m", "--backend", "dry-run", "--port", port],
+                                cwd=here, env=env, stdout=subprocess.DEVNULL)
+        time.sleep(1)
+        with open(f"/proc/{proc.pid}/statm") as f:
+            results["resident_rss_mb"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+        time.sleep(args.seconds)
+        with open(f"/proc/{proc.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        results["resident_cpu_ms"] = (int(fields[11]) + int(fields[12])) * 1000 / os.sysconf("SC_CLK_TCK")
+        proc.terminate()
+        proc.wait()
+
+        # 交給系統排程：行程設定完就結束
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, "main.py", "--in", "90m", "--handoff", "--backend", "dry-run",
+                               "--port", port], cwd=here, env=env, capture_output=True, text=True)
+        results["handoff_exit_ms"] = (time.perf_counter() - start) * 1000
+        results["handoff_ok"] = done.returncode == 0
+    return results
+
+
+@benchmark("process_exit", lower=("latency_ms_median",))
+def bench_process_exit(args):
+    # 啟動一個假的子程序、開始等它結束，再把它砍掉：量從 kill 到動作送出的延遲
+    from backends import DryRunBackend
+    from process_watch import open_process_handle
+    from service import ScheduleService
+
+    runs = 10
+    listener = FiredListener()
+    backend = DryRunBackend()
+    service = ScheduleService(listener, backend=backend)
+    latencies = []
+    for _ in range(runs):
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        listener.fired.clear()
+        service.watch_process("shutdown", child.pid)
+        killed = time.time()
+        child.kill()
+        fired = listener.fired.wait(5)
+        child.wait()
+        if not fired:
+            return {"error": "程序結束後沒有觸發"}
+        latencies.append((backend.calls[-1][1] - killed) * 1000)
+    latencies.sort()
+    handle = open_process_handle(os.getpid())
+    handle.close()
+    return {
+        "handle": type(handle).__name__,
+        "latency_ms_median": latencies[len(latencies) // 2],
+        "latency_ms_max": latencies[-1],
+    }
+
+
+@benchmark("idle", lower=("sample_us", "watch_cpu_percent"))
+def bench_idle(args):
+    # 閒置偵測本身的成本：單次取樣加入環形緩衝區的耗時，以及實際取樣執行緒在預設間隔下的 CPU 佔用
+    from idle import IDLE_INTERVAL, IdleWatch, create_sampler
+    try:
+        sampler = create_sampler()
+    except ValueError as e:
+        return {"skipped": str(e)}
+    # 取樣執行緒第一次醒來前就量完，結束後才取消 (取消時會關掉 sampler)
+    watch = IdleWatch("shutdown", 10, lambda watch, now: None, sampler=sampler).start()
+    runs = 2000
+    start = time.perf_counter()
+    for _ in range(runs):
+        watch.record(time.monotonic(), sampler.sample())
+    sample_us = (time.perf_counter() - start) / runs * 1e6
+    watch.cancel()
+
+    # 以 20 倍的取樣頻率跑真的執行緒，再換算回預設間隔
+    interval = IDLE_INTERVAL / 20
+    watch = IdleWatch("shutdown", 10, lambda watch, now: None, interval=interval).start()
+    cpu_start = time.process_time()
+    time.sleep(args.seconds)
+    cpu = time.process_time() - cpu_start
+    watch.cancel()
+    return {
+        "sample_us": sample_us,
+        "samples": watch.samples,
+        "watch_cpu_percent": cpu / args.seconds * 100 * interval / IDLE_INTERVAL,
+        "estimated_cpu_percent": sample_us / 1e6 / IDLE_INTERVAL * 100,
+    }
+
+
+@benchmark("hooks", lower=("parallel_ms", "timeout_overrun_ms", "budget_overrun_ms", "deadline_latency_ms"))
+def bench_hooks(args):
+    # 關機前的準備工作：並行與依序執行的耗時、單一項目逾時與總時限是否準時，
+    # 以及提前開始之後，期限到時關機是否還要再等
+    from backends import DryRunBackend
+    from hooks import HookPipeline, HookRun
+    from service import ScheduleService
+
+    def sleeper(seconds, timeout=30):
+        return {"type": "command", "argv": [sys.executable, "-c", f"import time; time.sleep({seconds})"],
+                "timeout": timeout}
+
+    hooks = [sleeper(0.2)] * 8
+    start = time.perf_counter()
+    results = HookRun(hooks, workers=4, budget=30).wait()
+    parallel = time.perf_counter() - start
+    if not all(result.ok for result in results):
+        return {"error": [result.error for result in results if not result.ok]}
+
+    timeout = 0.3
+    start = time.perf_counter()
+    [result] = HookRun([sleeper(60, timeout)], workers=1, budget=30).wait()
+    timeout_overrun = time.perf_counter() - start - timeout
+
+    budget = 0.5
+    run = HookRun([sleeper(60, 60)] * 2, workers=2, budget=budget, clock=time.perf_counter)
+    run.wait()
+    budget_overrun = time.perf_counter() - run.started - budget
+    run.cancel()
+
+    listener = FiredListener()
+    service = ScheduleService(listener, backend=DryRunBackend(), hooks=HookPipeline([sleeper(0.2)], lead=0.8))
+    service.arm("shutdown", seconds=1.0)
+    fired = listener.fired.wait(10)
+    return {
+        "parallel_ms": parallel * 1000,
+        "sequential_ms": sum(result.elapsed for result in results) * 1000,
+        "timeout_error": result.error,
+        "timeout_overrun_ms": timeout_overrun * 1000,
+        "budget_overrun_ms": budget_overrun * 1000,
+        "deadline_latency_ms": service.last_latency * 1000 if fired else None,
+    }
+
+
+@benchmark("fleet", higher=("pooled_requests_per_second",), lower=("blackhole_round_ms",))
+def bench_fleet(args):
+    # 本機上開一堆控制端點當作受控的電腦，比較持續連線、每次重新連線與逐台送出的吞吐量
+    import asyncio
+    from backends import DryRunBackend
+    from fleet import FleetController
+    from service import ScheduleService
+
+    count, rounds = 50, 20
+    servers, hosts = [], []
+    for _ in range(count):
+        sock = bind_control_socket(0)
+        hosts.append(("127.0.0.1", sock.getsockname()[1]))
+        server = ControlServer([sock], ScheduleService(backend=DryRunBackend()).handle_command)
+        server.start()
+        servers.append(server)
+    while not all(server.loop for server in servers):
+        time.sleep(0.01)
+    query = {"cmd": "query"}
+
+    async def pooled():
+        controller = FleetController(hosts)
+        await controller.send(query)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = await controller.send(query)
+        elapsed = time.perf_counter() - start
+        connects = sum(connection.connects for connection in controller.connections)
+        await controller.close()
+        return elapsed, connects, all(response["ok"] for _, response, _ in results)
+
+    async def reconnecting():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            controller = FleetController(hosts)
+            await controller.send(query)
+            await controller.close()
+        return time.perf_counter() - start
+
+    async def blackhole(timeout):
+        # 一台只 listen 不回應的主機不會拖慢其他主機，整輪的時間上限就是它的逾時
+        sock = bind_control_socket(0)
+        controller = FleetController(hosts + [("127.0.0.1", sock.getsockname()[1])], timeout=timeout)
+        start = time.perf_counter()
+        results = await controller.send(query)
+        elapsed = time.perf_counter() - start
+        await controller.close()
+        sock.close()
+        return elapsed, sum(1 for _, response, _ in results if response["ok"])
+
+    try:
+        pooled_elapsed, connects, ok = asyncio.run(pooled())
+        fresh_elapsed = asyncio.run(reconnecting())
+        start = time.perf_counter()
+        for host, port in hosts:
+            send_command(query, port, host)
+        sequential_elapsed = time.perf_counter() - start
+        blackhole_elapsed, blackhole_ok = asyncio.run(blackhole(0.5))
+    finally:
+        for server in servers:
+            server.stop()
+    return {
+        "hosts": count,
+        "all_ok": ok,
+        "pooled_connects": connects,
+        "pooled_requests_per_second": count * rounds / pooled_elapsed,
+        "reconnect_requests_per_second": count * rounds / fresh_elapsed,
+        "sequential_requests_per_second": count / sequential_elapsed,
+        "blackhole_round_ms": blackhole_elapsed * 1000,
+        "blackhole_ok_hosts": blackhole_ok,
+    }
+
+
+GUI_MODULES = ("tkinter", "pystray", "PIL")
+
+
+def time_subprocess(argv, runs):
+    """回傳多次執行子程序的最短耗時 (毫秒)，排除第一次的磁碟快取影響。"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run(argv, cwd=here, capture_output=True)
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(argv, cwd=here, capture_output=True, text=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, proc
+
+
+@benchmark("startup", lower=("import_main_ms", "import_gui_ms", "cli_status_ms"))
+def bench_startup(args):
+    runs = 5
+    results = {}
+    check = "import sys, {mod}; print(','.join(m for m in {gui!r} if m in sys.modules))"
+
+    baseline, _ = time_subprocess([sys.executable, "-c", "pass"], runs)
+    results["interpreter_ms"] = baseline
+    for mod in ("main", "gui"):
+        elapsed, proc = time_subprocess([sys.executable, "-c", check.format(mod=mod, gui=GUI_MODULES)], runs)
+        results[f"import_{mod}_ms"] = elapsed - baseline
+        results[f"import_{mod}_gui_modules"] = proc.stdout.strip().split(",") if proc.stdout.strip() else []
+
+    # 命令列查詢的完整往返：啟動直譯器、連線到執行中的程式、印出結果
+    sock = bind_control_socket(0)
+    port = sock.getsockname()[1]
+    server = ControlServer([sock], lambda request: {"running": False, "upcoming": []})
+    server.start()
+    elapsed, proc = time_subprocess([sys.executable, "main.py", "--status", "--port", str(port)], runs)
+    server.stop()
+    results["cli_status_ms"] = elapsed
+    results["cli_status_ok"] = proc.returncode == 0
+    return results
+
+
+@benchmark("target", lower=("countdown_us", "time_of_day_us"))
+def bench_target(args):
+    from scheduler import calculate_target
+    runs = 20000
+    now = datetime.datetime(2024, 1, 1, 23, 0, 0)
+    results = {}
+    for name, mode, h, m in (("countdown", 1, "1", "30"), ("time_of_day", 2, "3", "0")):
+        # 取 5 輪中最快的一輪，降低其他行程干擾造成的誤判
+        best = None
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(runs // 5):
+                calculate_target(mode, h, m, now)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[f"{name}_us"] = best / (runs // 5) * 1e6
+    return results
+
+
+@benchmark("history", lower=("record_us", "append_us", "stats_week_ms", "stats_all_ms"))
+def bench_history(args):
+    # 寫入端：呼叫端 record() 的成本、背景批次附加每筆的成本、輪替後的檔案大小；
+    # 讀取端：在滿載的檔案 (加上輪替下來的 .1) 上查最近一週與全部的統計，和逐行 JSON 的紀錄比較
+    import tempfile
+    from history import HISTORY_MAX_BYTES, HistoryLog, HistoryReader
+
+    events = ("armed", "cancelled", "armed", "fired")
+    now = datetime.datetime(2027, 3, 1, 12).timestamp()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.bin")
+        clock = itertools.count(now - 60 * 86400, 60 * 86400 * 16 / HISTORY_MAX_BYTES / 2)
+        log = HistoryLog(path, clock=lambda: next(clock))
+        runs = HISTORY_MAX_BYTES // 16 * 2
+        start = time.perf_counter()
+        for i in range(runs):
+            log.record(events[i % 4], "shutdown", "countdown", 1800.0, True)
+        record_us = (time.perf_counter() - start) / runs * 1e6
+        start = time.perf_counter()
+        log.flush()
+        append_us = (time.perf_counter() - start) / runs * 1e6
+        sizes = [os.path.getsize(name) for name in (path + ".1", path)]
+
+        reader = HistoryReader(path)
+        results = {}
+        for name, days in (("stats_week_ms", 7), ("stats_all_ms", 61)):
+            start = time.perf_counter()
+            stats = reader.stats(days, now)
+            results[name] = (time.perf_counter() - start) * 1000
+            results[name.replace("_ms", "_fired")] = stats["fired"]
+
+        # 同樣的紀錄以逐行 JSON 存放時，每次查詢都要讀進整個檔案再逐行解析
+        jsonl = os.path.join(tmp, "history.jsonl")
+        with open(jsonl, "w", encoding="utf-8") as f:
+            for when, event, action, trigger, ok, value in reader.records():
+                f.write(json.dumps({"time": when, "event": event, "action": action, "trigger": trigger,
+                                    "ok": ok, "value": value}) + "\n")
+        start = time.perf_counter()
+        since = datetime.datetime.combine(datetime.date.fromtimestamp(now) - datetime.timedelta(days=6),
+                                          datetime.time()).timestamp()
+        with open(jsonl, encoding="utf-8") as f:
+            results["jsonl_week_fired"] = sum(1 for line in f if (item := json.loads(line))["time"] >= since
+                                              and item["event"] == "fired")
+        results["jsonl_week_ms"] = (time.perf_counter() - start) * 1000
+        results["jsonl_bytes_per_record"] = os.path.getsize(jsonl) / reader.count()
+        results["records"] = reader.count()
+    return {
+        "record_us": record_us,
+        "append_us": append_us,
+        "rotations": log.rotations,
+        "file_bytes": sizes,
+        "within_cap": all(size <= HISTORY_MAX_BYTES for size in sizes),
+        **results,
+    }
+
+
+RECURRENCE_RULES = ("*/7 2-5 1,15,28-31 * 1-5", "30 */6 * feb,apr,jun sat,sun", "15 14 13 * fri", "0 0 29 2 *",
+                    "平日 03:00", "every 90m")
+
+
+def rule_matches(rule, t):
+    # 舊做法要用的逐分鐘判斷，直接看編譯好的查表
+    by_day = rule.days[t.day] == t.day
+    by_weekday = rule.weekday_offsets[(t.weekday() + 1) % 7] == 0
+    day = (by_day or by_weekday) if rule.either else (by_day and by_weekday)
+    return day and rule.minutes[t.minute] == t.minute and rule.hours[t.hour] == t.hour \
+        and rule.months[t.month] == t.month
+
+
+def scan_next(rule, epoch):
+    t = datetime.datetime.fromtimestamp(epoch).replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    while not rule_matches(rule, t):
+        t += datetime.timedelta(minutes=1)
+    return t.timestamp()
+
+
+@benchmark("recurrence", lower=("next_us",), higher=("speedup",))
+def bench_recurrence(args):
+    # 每條規則算出一整年的每一次；再拿前幾次跟逐分鐘往後試的舊做法比對結果與耗時
+    from recurrence import CronRule, parse_rule
+    start = datetime.datetime(2027, 1, 1).timestamp()
+    end = datetime.datetime(2028, 1, 1).timestamp()
+    rules = [parse_rule(text, anchor=start) for text in RECURRENCE_RULES]
+    occurrences = {}
+    calls = 0
+    begin = time.perf_counter()
+    for rule in rules:
+        epoch, found = start, []
+        while True:
+            epoch = rule.next_after(epoch)
+            calls += 1
+            if epoch >= end:
+                break
+            found.append(epoch)
+        occurrences[rule.text] = found
+    next_us = (time.perf_counter() - begin) / calls * 1e6
+
+    # 2 月 29 日逐分鐘找要掃過一年以上，不比
+    sampled = [rule for rule in rules if isinstance(rule, CronRule) and occurrences[rule.text]]
+    scans = 0
+    begin = time.perf_counter()
+    for rule in sampled:
+        epoch = start
+        for expected in occurrences[rule.text][:20]:
+            epoch = scan_next(rule, epoch)
+            scans += 1
+            if epoch != expected:
+                return {"error": f"{rule.text}: {datetime.datetime.fromtimestamp(expected)} != "
+                                 f"{datetime.datetime.fromtimestamp(epoch)}"}
+    scan_us = (time.perf_counter() - begin) / scans * 1e6
+    return {
+        "occurrences": {text: len(found) for text, found in occurrences.items()},
+        "next_us": next_us,
+        "scan_us": scan_us,
+        "speedup": scan_us / next_us,
+    }
+
+
+def run_frames(frames, diagnostics):
+    import types
+    from backends import DryRunBackend
+    from gui import ShutdownApp
+    from service import ScheduleService
+    from view import WidgetView
+
+    clock = FakeClock()
+    service = ScheduleService(backend=DryRunBackend(), diagnostics=diagnostics)
+    service.waiter = DeadlineWaiter(service.on_deadline, SchedulerCore(clock), timer=_IdleTimer())
+    service.schedule = service.waiter.add_countdown("shutdown", 5400, (600, 60))
+    canvas = FakeCanvas()
+    app = types.SimpleNamespace(service=service, view=WidgetView(clock=clock.monotonic), lbl_status=FakeWidget(),
+                                clock=ClockRenderer(canvas, COLORS, 1.0), is_running=True, target_time=None,
+                                preview_time=None, diagnostics=diagnostics, show_diagnostics=False)
+    start = time.perf_counter()
+    for _ in range(frames):
+        clock.advance(1)
+        ShutdownApp.update_clock(app)
+    return time.perf_counter() - start, app.view.calls
+
+
+@benchmark("frame", lower=("frame_us", "configs_per_frame"))
+def bench_frame(args):
+    # 以假的 Canvas 與 Label 執行真正的 ShutdownApp.update_clock，每個 frame 代表排程時鐘上的一秒；
+    # 另外量一次開啟計時量測時的成本
+    from diagnostics import Diagnostics
+    frames = min(args.frames, 3600)
+    elapsed, calls = run_frames(frames, Diagnostics())
+    diagnostics = Diagnostics(enabled=True)
+    measured, _ = run_frames(frames, diagnostics)
+    return {
+        "frames": frames,
+        "frame_us": elapsed / frames * 1e6,
+        "configs_per_frame": calls / frames,
+        "diagnostics_frame_us": measured / frames * 1e6,
+        "diagnostics_p95_ms": diagnostics.histograms["frame_ms"].percentile(0.95),
+    }
+
+
+class _IdleTimer:
+    """假時鐘不會前進，等待執行緒只要一直睡著即可。"""
+
+    def wait(self, targets):
+        time.sleep(3600)
+
+    def wake(self):
+        pass
+
+    def close(self):
+        pass
+
+
+FIRST_FRAME_SCRIPT = """
+import socket, sys, time
+from service import ScheduleService
+from backends import DryRunBackend
+from settings import ConfigStore
+from gui import ShutdownApp, enable_high_dpi
+import tkinter as tk
+enable_high_dpi()
+root = tk.Tk()
+sock = socket.socket()
+sock.bind(("127.0.0.1", 0))
+sock.listen()
+app = ShutdownApp(root, [sock], ScheduleService(store=ConfigStore(sys.argv[1]), backend=DryRunBackend()))
+root.update()
+print(time.perf_counter())
+root.destroy()
+"""
+
+
+@benchmark("first_frame", lower=("first_frame_ms",))
+def bench_first_frame(args):
+    # 冷啟動到第一個畫面：從啟動直譯器起算，到視窗第一次處理完事件為止
+    if not args.tk:
+        return {"skipped": "需要 --tk"}
+    import tempfile
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", FIRST_FRAME_SCRIPT, os.path.join(tmp, "config.json")],
+                           cwd=here, capture_output=True, check=True)
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+    return {"first_frame_ms": best}
+
+
+def lookup(result, path):
+    for key in path.split("."):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def find_failures(results):
+    """回傳 (項目, 錯誤) 的清單：量測途中檢查失敗 (結果帶有 "error"，例如觸發沒發生、算出的時間不對) 的項目。"""
+    return [(name, result["error"]) for name, result in results.items() if "error" in result]
+
+
+def find_regressions(results, baseline, threshold):
+    """回傳 (項目, 指標, 基準值, 目前值) 的清單，只列出變差超過 threshold 的指標；
+    基準裡有、這次卻沒有量到的指標也算，目前值為 None。"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or "skipped" in result or "skipped" in old:
+            continue
+        for metric, direction in TRACKED.get(name, {}).items():
+            new_value, old_value = lookup(result, metric), lookup(old, metric)
+            if not isinstance(old_value, (int, float)):
+                continue
+            if not isinstance(new_value, (int, float)):
+                regressions.append((name, metric, old_value, None))
+                continue
+            floor = next((value for unit, value in NOISE_FLOOR.items() if metric.endswith(unit)), 0)
+            if abs(new_value - old_value) <= floor:
+                continue
+            if direction == "lower":
+                worse = new_value > old_value * (1 + threshold)
+            else:
+                worse = new_value < old_value * (1 - threshold)
+            if worse:
+                regressions.append((name, metric, old_value, new_value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoShutdown 效能量測")
+    parser.add_argument("names", nargs="*", help="要執行的項目 (預設全部): " + ", ".join(BENCHMARKS))
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=3, help="真實時間量測的秒數")
+    parser.add_argument("--tk", action="store_true", help="使用真正的 Tk Canvas (需要顯示環境)")
+    parser.add_argument("--json", metavar="檔案", help="把全部結果存成 JSON")
+    parser.add_argument("--baseline", metavar="檔案", help="與先前 --json 存下的結果比對")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="容許變差的比例 (預設 0.3)")
+    args = parser.parse_args()
+    if args.tk and not (os.name == "nt" or os.environ.get("DISPLAY")):
+        parser.error("--tk 需要顯示環境")
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("未知的項目: " + ", ".join(unknown))
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+        print(json.dumps({"name": name, **results[name]}, ensure_ascii=False), flush=True)
+
+    if args.json:
+        report = {"python": sys.version.split()[0], "platform": sys.platform, "time": time.time(),
+                  "results": results}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = find_failures(results)
+    for name, error in failures:
+        print(f"失敗: {name}: {error}", file=sys.stderr)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, metric, old_value, new_value in regressions:
+            current = "沒有量到" if new_value is None else f"{new_value:.4g}"
+            print(f"回歸: {name}.{metric} {old_value:.4g} -> {current}", file=sys.stderr)
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import math
+
+# 指針設定: (名稱, 長度比例, 寬度, 顏色鍵)，順序即為堆疊順序 (先建立的在下層)
+HANDS = (
+    ("target_hour", 0.55, 5, "hand_target"),
+    ("target_min", 0.75, 3, "hand_target"),
+    ("hour", 0.5, 6, "hand_hour"),
+    ("min", 0.8, 4, "hand_min"),
+    ("sec", 0.9, 2, "hand_sec"),
+)
+
+
+def hand_angles(now, target=None):
+    angles = {
+        "hour": (now.hour % 12) * 30 + now.minute * 0.5,
+        "min": now.minute * 6,
+        "sec": now.second * 6,
+        "target_hour": None,
+        "target_min": None,
+    }
+    if target:
+        angles["target_hour"] = (target.hour % 12 + target.minute / 60) * 30
+        angles["target_min"] = target.minute * 6
+    return angles
+
+
+class ClockRenderer:
+    """保留模式的時鐘繪製：錶面與刻度只建立一次，指針以 coords() 移動。"""
+
+    def __init__(self, canvas, colors, scale=1.0):
+        self.canvas = canvas
+        self.colors = colors
+        self.scale = None
+        self.items = {}
+        self.angles = {}
+        self._endpoints = {}
+        self.set_scale(scale)
+
+    def set_scale(self, scale):
+        if scale == self.scale:
+            return
+        self.scale = scale
+        self.canvas.delete("all")
+        self.items = {}
+        self.angles = {}
+        self._endpoints = {}
+
+        self.center = 140 * scale
+        self.radius = 120 * scale
+        center, radius = self.center, self.radius
+
+        self.canvas.create_oval(center - radius, center - radius, center + radius, center + radius,
+                                width=int(3 * scale), outline=self.colors["clock_border"],
+                                fill=self.colors["clock_face"])
+
+        tick_len_long = 20 * scale
+        tick_len_short = 10 * scale
+        tick_width = max(1, int(2 * scale))
+        for i in range(12):
+            rad = math.radians(i * 30 - 90)
+            x1 = center + (radius - tick_len_short) * math.cos(rad)
+            y1 = center + (radius - tick_len_short) * math.sin(rad)
+            x2 = center + (radius - tick_len_long) * math.cos(rad)
+            y2 = center + (radius - tick_len_long) * math.sin(rad)
+            self.canvas.create_line(x1, y1, x2, y2, width=tick_width, fill=self.colors["clock_tick"])
+
+        for name, _, width, color_key in HANDS:
+            self.items[name] = self.canvas.create_line(center, center, center, center,
+                                                       width=max(1, int(width * scale)),
+                                                       fill=self.colors[color_key], capstyle="round",
+                                                       state="hidden")
+
+        # 中心點
+        center_dot = 5 * scale
+        self.canvas.create_oval(center - center_dot, center - center_dot, center + center_dot, center + center_dot,
+                                fill=self.colors["hand_sec"])
+
+    def _endpoint(self, ratio, angle):
+        key = (ratio, angle)
+        point = self._endpoints.get(key)
+        if point is None:
+            length = self.radius * ratio
+            angle_rad = math.radians(angle - 90)
+            point = (self.center + length * math.cos(angle_rad), self.center + length * math.sin(angle_rad))
+            self._endpoints[key] = point
+        return point
+
+    def render(self, now, target=None):
+        """更新指針位置，只動到角度有變化的項目；回傳實際更新的項目數。"""
+        changed = 0
+        angles = hand_angles(now, target)
+        for name, ratio, _, _ in HANDS:
+            angle = angles[name]
+            if name in self.angles and self.angles[name] == angle:
+                continue
+            item = self.items[name]
+            if angle is None:
+                self.canvas.itemconfigure(item, state="hidden")
+            else:
+                x, y = self._endpoint(ratio, angle)
+                self.canvas.coords(item, self.center, self.center, x, y)
+                if self.angles.get(name) is None:
+                    self.canvas.itemconfigure(item, state="normal")
+            self.angles[name] = angle
+            changed += 1
+        return changed
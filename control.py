@@ -0,0 +1,170 @@
+"""本機控制通道：以逐行 JSON 收發指令，同時作為單一執行個體的鎖。
+
+請求範例::
+
+    {"cmd": "countdown", "seconds": 5400, "action": "shutdown"}
+    {"cmd": "at", "time": "03:00"}            # 或 "time": <epoch 秒數>
+    {"cmd": "repeat", "rule": "平日 03:00"}    # 重複排程，也可以是 "every 6h" 或 cron 運算式
+    {"cmd": "process", "target": "game.exe"}  # 程序結束後執行，target 也可以是 PID
+    {"cmd": "idle", "minutes": 15, "cpu": 5}  # 閒置後執行，可加 disk、net (B/s) 與 interval
+    {"cmd": "cancel"}                         # 可加 "id" 取消佇列中的指定項目
+    {"cmd": "query"}
+    {"cmd": "show"}
+
+回應一律帶有 "ok"；失敗時附上 "error" 說明。預設只聽本機；以 --listen 開放給其他電腦 (例如 fleet.py)
+時，非本機的連線每個請求都要帶上 "token"，與 AUTOSHUTDOWN_TOKEN 環境變數或設定檔的 control_token 相同。
+"""
+import hmac
+import ipaddress
+import json
+import os
+import re
+import socket
+import threading
+
+CONTROL_HOST = "127.0.0.1"
+TOKEN_ENV = "AUTOSHUTDOWN_TOKEN"
+COMMANDS = ("countdown", "at", "repeat", "process", "idle", "cancel", "query", "show")
+
+_DURATION_RE = re.compile(r"^(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?$")
+
+
+def parse_duration(text):
+    """將 "90m"、"1h30m"、"45s" 或純數字 (分鐘) 轉成秒數。"""
+    text = text.strip().lower()
+    if text.isdigit():
+        return int(text) * 60
+    match = _DURATION_RE.match(text)
+    if not text or not match:
+        raise ValueError(f"無法解析的時間長度: {text}")
+    h, m, s = (int(part or 0) for part in match.groups())
+    return h * 3600 + m * 60 + s
+
+
+def parse_clock_time(text):
+    """將 "HH:MM" 轉成 (時, 分)。"""
+    try:
+        h, m = (int(part) for part in text.strip().split(":"))
+    except ValueError:
+        raise ValueError(f"時間格式錯誤: {text}") from None
+    if not (0 <= h <= 23 and 0 <= m <= 59):
+        raise ValueError(f"時間格式錯誤: {text}")
+    return h, m
+
+
+def bind_control_socket(port, host=CONTROL_HOST):
+    # 綁定失敗 (OSError) 代表已經有另一個執行個體在跑
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name == "nt":
+        # Windows 預設允許別的程式在同一個連接埠綁定更具體的位址 (例如萬用位址旁邊的 127.0.0.1)，
+        # 要設成獨占才當得了鎖；SO_REUSEADDR 則會讓兩個程式同時綁定，不能用
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+    else:
+        # 非 Windows 平台允許重用 TIME_WAIT 中的連接埠
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind((host, port))
+        sock.listen()
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def control_token(store=None):
+    return os.environ.get(TOKEN_ENV) or (store.get("control_token") if store is not None else None) or None
+
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def is_unspecified(host):
+    # 0.0.0.0 這類萬用位址，本身就涵蓋 127.0.0.1
+    try:
+        return ipaddress.ip_address(host).is_unspecified
+    except ValueError:
+        return host == ""
+
+
+def send_command(request, port, host=CONTROL_HOST, timeout=2.0):
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as stream:
+            line = stream.readline()
+    if not line:
+        raise ConnectionError("控制端點沒有回應")
+    return json.loads(line)
+
+
+class ControlServer:
+    """在背景執行緒跑 asyncio 伺服器，同時聽 sockets 裡的每個 socket；handler(request) 在該執行緒上同步呼叫並回傳 dict。
+
+    每條連線可以連續送多行指令，方便呼叫端重複使用同一條連線。有 token 時，不是來自本機的請求必須帶上相同的
+    "token" 才會執行。
+    """
+
+    def __init__(self, sockets, handler, token=None):
+        self.sockets = sockets
+        self.handler = handler
+        self.token = token
+        self.loop = None
+        self._servers = []
+        self._thread = None
+
+    def start(self):
+        # asyncio 匯入要 50 ms 左右，只轉送指令的命令列不需要它，等真的啟動伺服器才載入
+        import asyncio
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="ControlServer",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.loop:
+            for server in self._servers:
+                self.loop.call_soon_threadsafe(server.close)
+
+    async def _serve(self):
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self._servers = [await asyncio.start_server(self._handle_client, sock=sock) for sock in self.sockets]
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for server in self._servers:
+                server.close()
+
+    async def _handle_client(self, reader, writer):
+        import asyncio
+        peer = writer.get_extra_info("peername")
+        trusted = self.token is None or (peer is not None and is_loopback(peer[0]))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = self.dispatch(line, trusted)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, line, trusted=True):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or request.get("cmd") not in COMMANDS:
+                return {"ok": False, "error": "未知的指令"}
+            token = str(request.pop("token", ""))
+            if not trusted and not hmac.compare_digest(token.encode(), self.token.encode()):
+                return {"ok": False, "error": "驗證失敗"}
+            response = self.handler(request)
+        except (ValueError, TypeError, KeyError) as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, **(response or {})}
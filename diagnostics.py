@@ -0,0 +1,167 @@
+"""計時量測：畫面更新耗時、喚醒誤差、UI 執行緒卡頓與期限到執行的延遲。
+
+每項量測放進固定大小的直方圖 (記憶體用量不隨執行時間增加)。停用時 record() 只檢查一個旗標就返回，
+呼叫端也可以先看 enabled 再決定要不要讀時鐘。結果可以用 snapshot() 取得，或在結束時 dump() 成 JSON。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+# 直方圖各區間的上限 (毫秒)，超過最後一個的放進溢位區間
+BUCKET_BOUNDS_MS = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# UI 執行緒心跳的間隔，以及晚到多久才算一次卡頓 (秒)
+HEARTBEAT_INTERVAL = 0.1
+STALL_THRESHOLD = 0.05
+
+FRAME = "frame_ms"
+TICK_JITTER = "tick_jitter_ms"
+STALL = "stall_ms"
+DEADLINE_LATENCY = "deadline_latency_ms"
+METRICS = (FRAME, TICK_JITTER, STALL, DEADLINE_LATENCY)
+
+
+class Histogram:
+    """固定區間的直方圖；百分位數以所在區間的上限估計 (不超過最大值)。"""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = max(1, round(self.count * fraction))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+    def as_dict(self):
+        result = self.summary()
+        result["buckets"] = {("inf" if i == len(self.bounds) else str(self.bounds[i])): n
+                             for i, n in enumerate(self.counts) if n}
+        return result
+
+
+class Diagnostics:
+    """各項量測的直方圖；可從任何執行緒呼叫 record()。
+
+    add_source(name, func) 可以加入額外的資料來源 (例如 TickStats.summary)，snapshot() 時一起呼叫。
+    """
+
+    def __init__(self, enabled=False, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.started = time.time()
+        self.histograms = {name: Histogram() for name in METRICS}
+        self.sources = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.histograms[name].record(abs(seconds) * 1000)
+
+    def add_source(self, name, func):
+        self.sources[name] = func
+
+    def snapshot(self):
+        with self._lock:
+            result = {"started": self.started, "uptime": time.time() - self.started,
+                      "histograms": {name: hist.as_dict() for name, hist in self.histograms.items()}}
+        for name, func in list(self.sources.items()):
+            try:
+                result[name] = func()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+    def overlay_lines(self):
+        # 診斷疊加層顯示的文字：每項一行 p50/p95/max (毫秒)
+        lines = []
+        with self._lock:
+            for name, hist in self.histograms.items():
+                label = name[:-3]
+                if hist.count:
+                    lines.append(f"{label} n={hist.count} p50={hist.percentile(0.5):g} "
+                                 f"p95={hist.percentile(0.95):g} max={hist.max:.1f} ms")
+                else:
+                    lines.append(f"{label} n=0")
+        return lines
+
+    def dump(self, path):
+        """把 snapshot() 寫成 JSON；停用時不寫。"""
+        if not self.enabled:
+            return False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=4)
+        return True
+
+
+class StallMonitor:
+    """以 after() 排定固定間隔的心跳，心跳晚到超過 threshold 就記一次 UI 執行緒卡頓
+    (例如 messagebox 或長時間的計算把事件迴圈卡住)。只在量測啟用時才需要啟動。
+    """
+
+    def __init__(self, after, after_cancel, diagnostics, interval=HEARTBEAT_INTERVAL, threshold=STALL_THRESHOLD,
+                 clock=time.monotonic):
+        self.after = after
+        self.after_cancel = after_cancel
+        self.diagnostics = diagnostics
+        self.interval = interval
+        self.threshold = threshold
+        self.clock = clock
+        self._job = None
+        self._expected = None
+
+    def start(self):
+        if self._job is None:
+            self._arm()
+
+    def stop(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def _arm(self):
+        self._expected = self.clock() + self.interval
+        self._job = self.after(round(self.interval * 1000), self._beat)
+
+    def _beat(self):
+        self._job = None
+        late = self.clock() - self._expected
+        if late > self.threshold:
+            self.diagnostics.record(STALL, late)
+        self._arm()
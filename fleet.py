@@ -0,0 +1,218 @@
+"""同時控制多台電腦上的自動關機。
+
+    python fleet.py 192.168.1.10 192.168.1.11:53117 @hosts.txt --in 90m
+    python fleet.py @hosts.txt --status
+
+每台電腦要以 --listen 0.0.0.0 啟動，並設定相同的 AUTOSHUTDOWN_TOKEN。所有主機的請求在同一個 asyncio
+迴圈上並行送出，每台各自有逾時；到每台的連線建立後會保留下來，同一個 FleetController 之後的請求直接重用。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import time
+
+from control import TOKEN_ENV, control_token, parse_clock_time, parse_duration
+from recurrence import parse_rule
+from settings import ACTIONS, APP_NAME, PORT_ID
+
+# 每台主機的逾時 (秒，包含連線) 與同時進行中的請求上限
+DEFAULT_TIMEOUT = 3.0
+MAX_CONCURRENCY = 256
+
+
+def parse_host(text, default_port=PORT_ID):
+    """"host"、"host:port" 或 "[IPv6]:port" 轉成 (host, port)。"""
+    text = text.strip()
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        port = rest[1:] if rest.startswith(":") else ""
+    elif text.count(":") == 1:
+        host, port = text.split(":")
+    else:
+        host, port = text, ""
+    if not host:
+        raise ValueError(f"主機格式錯誤: {text}")
+    try:
+        return host, int(port) if port else default_port
+    except ValueError:
+        raise ValueError(f"連接埠格式錯誤: {text}") from None
+
+
+class HostConnection:
+    """到一台主機控制端點的持續連線；同一條連線上的請求依序送出。
+
+    重用中的連線斷掉 (例如對方重新啟動過) 時，自動重新連線再送一次；新建的連線失敗就直接回報錯誤。
+    """
+
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = self.writer = None
+        self.connects = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    async def request(self, command):
+        async with self._lock:
+            try:
+                for attempt in range(2):
+                    fresh = self.writer is None
+                    if fresh:
+                        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                        self.connects += 1
+                    try:
+                        return await self._roundtrip(command)
+                    except (OSError, asyncio.IncompleteReadError, ValueError):
+                        await self.close()
+                        if fresh or attempt:
+                            raise
+            except asyncio.CancelledError:
+                # 逾時被取消時回應可能還在路上，這條連線不能再用
+                await self.close()
+                raise
+
+    async def _roundtrip(self, command):
+        payload = dict(command, token=self.token) if self.token else command
+        self.writer.write(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionResetError("控制端點關閉了連線")
+        return json.loads(line)
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class FleetController:
+    """對一組主機並行送出同一個指令；連線在多次 send() 之間保留，用完要呼叫 close()。"""
+
+    def __init__(self, hosts, timeout=DEFAULT_TIMEOUT, token=None, concurrency=MAX_CONCURRENCY):
+        self.timeout = timeout
+        self.connections = [HostConnection(host, port, token) for host, port in hosts]
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(self, command):
+        """回傳 [(主機, 回應, 耗時秒數)]，順序與主機列表相同；連不上或逾時的主機回應 ok 為 False。"""
+        return await asyncio.gather(*(self._send_one(connection, command) for connection in self.connections))
+
+    async def _send_one(self, connection, command):
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(connection.request(command), self.timeout)
+            except asyncio.TimeoutError:
+                response = {"ok": False, "error": f"逾時 ({self.timeout:g} 秒)"}
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                response = {"ok": False, "error": str(e) or type(e).__name__}
+            return connection.name, response, time.perf_counter() - start
+
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self.connections))
+
+
+def describe_response(response):
+    """一台主機的狀態摘要 (一行)。"""
+    if not response.get("ok"):
+        return f"失敗: {response.get('error')}"
+    action = ACTIONS.get(response.get("action"), response.get("action"))
+    if "deadline" in response:
+        when = datetime.datetime.fromtimestamp(round(response["deadline"]))
+        if "repeat" in response:
+            return f"{when:%m/%d %H:%M} {action} (重複: {response['repeat']})"
+        return f"{when:%m/%d %H:%M} {action}"
+    if "process" in response:
+        return f"等 {response['process']['name']} 結束後{action}"
+    if "idle" in response:
+        return f"閒置 {response['idle']['minutes']:g} 分鐘後{action}"
+    if "running" in response:
+        return "執行中" if response["running"] else "沒有排程"
+    return "完成"
+
+
+def summarize(results):
+    ok = [response for _, response, _ in results if response.get("ok")]
+    return {
+        "hosts": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        # 查詢的回應帶 running；設定排程的回應帶期限或觸發條件
+        "running": sum(1 for response in ok
+                       if response.get("running") or any(key in response for key in ("deadline", "process", "idle"))),
+        "slowest_ms": max((elapsed for _, _, elapsed in results), default=0) * 1000,
+    }
+
+
+def command_from_args(args):
+    if args.countdown is not None:
+        return {"cmd": "countdown", "seconds": args.countdown, "action": args.action}
+    if args.at is not None:
+        return {"cmd": "at", "time": "%02d:%02d" % args.at, "action": args.action}
+    if args.repeat is not None:
+        return {"cmd": "repeat", "rule": args.repeat.text, "action": args.action}
+    if args.cancel:
+        return {"cmd": "cancel"}
+    return {"cmd": "query"}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="fleet", description=f"同時控制多台{APP_NAME}", fromfile_prefix_chars="@")
+    parser.add_argument("hosts", nargs="+", metavar="主機", help="host、host:port，或 @檔案 (每行一台)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--in", dest="countdown", metavar="時間", type=parse_duration, help="經過多久後執行")
+    group.add_argument("--at", metavar="HH:MM", type=parse_clock_time, help="於各主機的當地時間執行")
+    group.add_argument("--repeat", metavar="規則", type=parse_rule, help="重複執行 (各主機的當地時間)，例如 \"平日 03:00\"")
+    group.add_argument("--cancel", action="store_true", help="取消排程")
+    group.add_argument("--status", action="store_true", help="查詢狀態 (預設)")
+    parser.add_argument("--action", choices=ACTIONS, default="shutdown", help="要執行的動作")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="每台主機的逾時秒數")
+    parser.add_argument("--token", default=control_token(), help=f"驗證用的字串 (預設讀取 {TOKEN_ENV})")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出")
+    return parser.parse_args(argv)
+
+
+async def run(hosts, command, timeout, token):
+    controller = FleetController(hosts, timeout, token)
+    try:
+        return await controller.send(command)
+    finally:
+        await controller.close()
+
+
+def main(argv):
+    args = parse_args(argv)
+    try:
+        hosts = [parse_host(host) for host in args.hosts if host.strip() and not host.startswith("#")]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not hosts:
+        print("沒有指定主機", file=sys.stderr)
+        return 2
+    results = asyncio.run(run(hosts, command_from_args(args), args.timeout, args.token))
+    summary = summarize(results)
+    if args.json:
+        print(json.dumps({"summary": summary, "hosts": {name: response for name, response, _ in results}},
+                         ensure_ascii=False))
+    else:
+        width = max(len(name) for name, _, _ in results)
+        for name, response, elapsed in results:
+            print(f"{name:<{width}}  {describe_response(response)}  ({elapsed * 1000:.0f} ms)")
+        print(f"共 {summary['hosts']} 台：成功 {summary['ok']}，失敗 {summary['failed']}，有排程 {summary['running']}")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
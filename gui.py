@@ -0,0 +1,915 @@
+import tkinter as tk
+from tkinter import messagebox
+import math
+import datetime
+import sys
+import ctypes
+
+from animation import Animator
+from clock_renderer import ClockRenderer
+from control import ControlServer, control_token
+from diagnostics import FRAME, TICK_JITTER, StallMonitor
+from history import HistoryReader
+from idle import format_rate
+from recurrence import parse_rule
+from scheduler import calculate_target
+from view import Debouncer, WidgetView
+from settings import APP_NAME, ICON_FILENAME, ACTIONS, resource_path
+from ticker import TickScheduler
+
+# 深色模式配色表
+COLORS = {
+    "bg": "#202020",
+    "fg": "#e0e0e0",
+    "entry_bg": "#3c3f41",
+    "entry_fg": "#ffffff",
+    "entry_focus": "#00bcd4",
+    "border_active": "#00bcd4",
+    "border_inactive": "#424242",
+    "btn_start": "#2e7d32",
+    "btn_cancel": "#c62828",
+    "status_bg": "#004d40",
+    "status_fg": "#80cbc4",
+    "clock_face": "#1e1e1e",
+    "clock_border": "#00bcd4",
+    "clock_tick": "#808080",
+    "hand_target": "#ff1744",
+    "hand_hour": "#ffffff",
+    "hand_min": "#ffffff",
+    "hand_sec": "#2979ff"
+}
+
+FONT_FAMILY = "微軟正黑體"
+FONT_INPUT = "Arial"
+# 模式切換按鈕：(mode_var 的值, 文字)
+MODES = ((1, "⏳ 倒數"), (2, "⏰ 指定時間"), (3, "🎮 程序結束"), (4, "🌙 閒置"))
+# 縮小到系統列與還原時的淡出/淡入秒數
+FADE_SECONDS = 0.15
+# 輸入框停止打字多久 (毫秒) 後才更新預覽
+PREVIEW_DELAY_MS = 150
+
+
+def enable_high_dpi():
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    except Exception:
+        try:
+            ctypes.windll.user32.SetProcessDPIAware()
+        except Exception:
+            pass
+
+
+class ShutdownApp:
+    def __init__(self, root, sockets, service):
+        self.root = root
+        self.sockets = sockets
+        self.service = service
+        self.store = service.store
+
+        current_dpi = self.root.winfo_fpixels('1i')
+        self.scale = current_dpi / 96.0
+        if self.scale < 1.0: self.scale = 1.0
+
+        self.root.title(APP_NAME)
+
+        # 一次只顯示目前模式的設定，高度不隨模式數量增加；佇列較長時可以往下拉大
+        base_w, base_h = 450, 680
+        scaled_w = int(base_w * self.scale)
+        scaled_h = int(base_h * self.scale)
+        self.root.geometry(f"{scaled_w}x{scaled_h}")
+        self.root.minsize(scaled_w, scaled_h)
+        self.root.resizable(False, True)
+        self.root.configure(bg=COLORS["bg"])
+
+        try:
+            self.root.iconbitmap(resource_path(ICON_FILENAME))
+        except:
+            pass
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<Unmap>", self.on_window_minimize)
+        self.target_time = None
+        self.preview_time = None
+        self.queue_lines = []
+        self.mode_var = tk.IntVar(value=self.store.get("mode", 1))
+        self.handoff_var = tk.BooleanVar(value=self.store.get("handoff_mode", False))
+        self.tray = None
+        self.in_tray = False
+        self._tray_job = None
+        # 診斷疊加層預設隱藏，量測啟用時按 F12 切換
+        self.diagnostics = service.diagnostics
+        self.show_diagnostics = False
+        self.diag_item = None
+
+        self.fonts = {
+            "ui": (FONT_FAMILY, int(12 * self.scale)),
+            "ui_bold": (FONT_FAMILY, int(12 * self.scale), "bold"),
+            "input": (FONT_INPUT, int(13 * self.scale), "bold"),
+            "status": (FONT_FAMILY, int(13 * self.scale), "bold"),
+            "title_frame": (FONT_FAMILY, int(11 * self.scale)),
+            "btn_big": (FONT_FAMILY, int(14 * self.scale), "bold"),
+            "warning_title": (FONT_FAMILY, int(16 * self.scale), "bold"),
+            "warning_text": (FONT_FAMILY, int(12 * self.scale))
+        }
+
+        self.form = {key: self.store.get(key, "0") or "0" for key in ("cd_h", "cd_m", "sp_h", "sp_m")}
+        self.form["proc"] = self.store.get("proc", "")
+        self.form["idle_m"] = self.store.get("idle_m", "10") or "10"
+        self.form["sp_repeat"] = self.store.get("sp_repeat", "")
+        self.ui_built = False
+
+        # 上次未到期的排程已在建立視窗前由 main 接回，這裡只接手通知
+        self.service.listener = self
+        on_jitter = None
+        if self.diagnostics.enabled:
+            on_jitter = lambda seconds: self.diagnostics.record(TICK_JITTER, seconds)
+        self.ticker = TickScheduler(self.root.after, self.root.after_cancel, self.on_tick,
+                                    deadline_fn=self.service.waiter.next_deadline_wall, on_jitter=on_jitter)
+        self.animator = Animator(self.root.after, self.root.after_cancel)
+        # 元件屬性一律經由 view 設定，沒變的屬性不送給 Tk；輸入框的預覽等打字停下來才更新
+        self.view = WidgetView()
+        self.preview_debounce = Debouncer(self.root.after, self.root.after_cancel, PREVIEW_DELAY_MS,
+                                          self.update_preview)
+        self.control = ControlServer(self.sockets, self.service.handle_command, token=control_token(self.store))
+        self.control.start()
+
+        if self.diagnostics.enabled:
+            self.enable_diagnostics()
+
+        self.build_ui()
+        self.ticker.start()
+
+    def enable_diagnostics(self):
+        self.stall_monitor = StallMonitor(self.root.after, self.root.after_cancel, self.diagnostics)
+        self.stall_monitor.start()
+        self.diagnostics.add_source("ticker", self.ticker.stats.summary)
+        self.diagnostics.add_source("view", lambda: {"calls": self.view.calls, "skipped": self.view.skipped,
+                                                     "calls_per_second": self.view.calls_per_second()})
+        self.diagnostics.add_source("animator", lambda: {"frames": self.animator.frames,
+                                                         "skipped": self.animator.skipped})
+        self.root.bind("<F12>", self.toggle_diagnostics)
+
+    def build_ui(self):
+        # --- UI 佈局 ---
+
+        clock_size = int(280 * self.scale)
+        self.canvas = tk.Canvas(self.root, width=clock_size, height=clock_size, bg=COLORS["bg"], highlightthickness=0)
+        self.canvas.pack(pady=(int(20 * self.scale), int(10 * self.scale)))
+        self.clock = ClockRenderer(self.canvas, COLORS, self.scale)
+
+        self.frame_status = tk.Frame(self.root, bg=COLORS["status_bg"], bd=0)
+        self.frame_status.pack(fill="x", padx=int(25 * self.scale), pady=int(10 * self.scale))
+
+        self.lbl_status = tk.Label(self.frame_status, text="準備就緒",
+                                   fg=COLORS["status_fg"], bg=COLORS["status_bg"],
+                                   font=self.fonts["status"])
+        self.lbl_status.pack(pady=int(10 * self.scale))
+
+        self.lbl_queue = tk.Label(self.frame_status, text="", fg=COLORS["status_fg"], bg=COLORS["status_bg"],
+                                  font=self.fonts["title_frame"], justify="left")
+
+        # 3. 控制區：上方一排切換模式，下方只放目前模式的設定
+        pad_x_outer = int(20 * self.scale)
+        pad_y_inner = int(15 * self.scale)
+        border_pad = int(3 * self.scale)
+
+        frame_modes = tk.Frame(self.root, bg=COLORS["bg"])
+        frame_modes.pack(fill="x", padx=pad_x_outer, pady=(int(5 * self.scale), 0))
+        self.mode_buttons = []
+        for value, text in MODES:
+            button = tk.Radiobutton(frame_modes, text=text, variable=self.mode_var, value=value, indicatoron=False,
+                                    command=self.on_mode_selected, bg=COLORS["entry_bg"], fg=COLORS["fg"],
+                                    selectcolor=COLORS["border_active"], activebackground=COLORS["border_inactive"],
+                                    activeforeground=COLORS["fg"], font=self.fonts["title_frame"], relief="flat",
+                                    bd=0, cursor="hand2")
+            button.pack(side="left", fill="x", expand=True, padx=1, ipady=int(3 * self.scale))
+            self.mode_buttons.append(button)
+
+        self.frame_panel = tk.Frame(self.root, bg=COLORS["bg"])
+        self.frame_panel.pack(fill="x", padx=pad_x_outer, pady=int(5 * self.scale))
+
+        # --- 倒數模式 ---
+        self.wrap_cd = tk.Frame(self.frame_panel, bg=COLORS["border_active"], padx=border_pad, pady=border_pad)
+
+        self.group_cd = tk.LabelFrame(self.wrap_cd, text=" ⏳ 倒數計時 ",
+                                      bg=COLORS["bg"], fg=COLORS["border_active"], bd=0, font=self.fonts["title_frame"])
+        self.group_cd.pack(fill="both", expand=True)
+
+        frame_cd_inner = tk.Frame(self.group_cd, bg=COLORS["bg"])
+        frame_cd_inner.pack(pady=pad_y_inner)
+
+        tk.Label(frame_cd_inner, text="經過", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(side="left")
+
+        entry_width = 4  # Entry 的 width 是字元數，不需要乘 scale
+        self.entry_cd_h = tk.Entry(frame_cd_inner, width=entry_width, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                   font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_cd_h.insert(0, self.form["cd_h"])
+        self.entry_cd_h.pack(side="left", padx=5)
+
+        tk.Label(frame_cd_inner, text="小時", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(side="left")
+
+        self.entry_cd_m = tk.Entry(frame_cd_inner, width=entry_width, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                   font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_cd_m.insert(0, self.form["cd_m"])
+        self.entry_cd_m.pack(side="left", padx=5)
+        tk.Label(frame_cd_inner, text="分後關機", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+
+        # --- 指定時間 ---
+        self.wrap_sp = tk.Frame(self.frame_panel, bg=COLORS["border_active"], padx=border_pad, pady=border_pad)
+
+        self.group_sp = tk.LabelFrame(self.wrap_sp, text=" ⏰ 指定時間 ",
+                                      bg=COLORS["bg"], fg=COLORS["border_active"], bd=0, font=self.fonts["title_frame"])
+        self.group_sp.pack(fill="both", expand=True)
+
+        frame_sp_inner = tk.Frame(self.group_sp, bg=COLORS["bg"])
+        frame_sp_inner.pack(pady=pad_y_inner)
+
+        tk.Label(frame_sp_inner, text="設定於", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+
+        self.entry_sp_h = tk.Entry(frame_sp_inner, width=entry_width, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                   font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_sp_h.insert(0, self.form["sp_h"])
+        self.entry_sp_h.pack(side="left", padx=5)
+
+        tk.Label(frame_sp_inner, text="點", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(side="left")
+
+        self.entry_sp_m = tk.Entry(frame_sp_inner, width=entry_width, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                   font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_sp_m.insert(0, self.form["sp_m"])
+        self.entry_sp_m.pack(side="left", padx=5)
+        tk.Label(frame_sp_inner, text="分關機", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+
+        frame_sp_repeat = tk.Frame(self.group_sp, bg=COLORS["bg"])
+        frame_sp_repeat.pack(pady=(0, pad_y_inner))
+        tk.Label(frame_sp_repeat, text="重複", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+        self.entry_sp_repeat = tk.Entry(frame_sp_repeat, width=10, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                        font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_sp_repeat.insert(0, self.form["sp_repeat"])
+        self.entry_sp_repeat.pack(side="left", padx=5)
+        tk.Label(frame_sp_repeat, text="空白為一次\n例：平日、一,三,五", bg=COLORS["bg"], fg="gray",
+                 font=self.fonts["title_frame"], justify="left").pack(side="left")
+
+        # --- 程序結束 ---
+        self.wrap_pr = tk.Frame(self.frame_panel, bg=COLORS["border_active"], padx=border_pad, pady=border_pad)
+
+        self.group_pr = tk.LabelFrame(self.wrap_pr, text=" 🎮 程序結束 ",
+                                      bg=COLORS["bg"], fg=COLORS["border_active"], bd=0, font=self.fonts["title_frame"])
+        self.group_pr.pack(fill="both", expand=True)
+
+        frame_pr_inner = tk.Frame(self.group_pr, bg=COLORS["bg"])
+        frame_pr_inner.pack(pady=pad_y_inner)
+
+        tk.Label(frame_pr_inner, text="等", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(side="left")
+
+        self.entry_proc = tk.Entry(frame_pr_inner, width=12, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                   font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_proc.insert(0, self.form["proc"])
+        self.entry_proc.pack(side="left", padx=5)
+
+        self.btn_pick = tk.Button(frame_pr_inner, text="選擇", bg=COLORS["entry_bg"], fg=COLORS["fg"],
+                                  font=self.fonts["title_frame"], relief="flat", cursor="hand2",
+                                  command=self.choose_process)
+        self.btn_pick.pack(side="left")
+        tk.Label(frame_pr_inner, text="結束後關機", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left", padx=(5, 0))
+
+        # --- 閒置 ---
+        self.wrap_idle = tk.Frame(self.frame_panel, bg=COLORS["border_active"], padx=border_pad, pady=border_pad)
+
+        self.group_idle = tk.LabelFrame(self.wrap_idle, text=" 🌙 閒置 ",
+                                        bg=COLORS["bg"], fg=COLORS["border_active"], bd=0,
+                                        font=self.fonts["title_frame"])
+        self.group_idle.pack(fill="both", expand=True)
+
+        frame_idle_inner = tk.Frame(self.group_idle, bg=COLORS["bg"])
+        frame_idle_inner.pack(pady=pad_y_inner)
+
+        tk.Label(frame_idle_inner, text="閒置", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+
+        self.entry_idle_m = tk.Entry(frame_idle_inner, width=entry_width, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"],
+                                     font=self.fonts["input"], justify="center", insertbackground="white")
+        self.entry_idle_m.insert(0, self.form["idle_m"])
+        self.entry_idle_m.pack(side="left", padx=5)
+        tk.Label(frame_idle_inner, text="分後關機", bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["ui"]).pack(
+            side="left")
+
+        # --- 按鈕 ---
+        self.btn_toggle = tk.Button(self.root, text="開始倒數", bg=COLORS["btn_start"], fg="white",
+                                    font=self.fonts["btn_big"], activebackground="#1b5e20", activeforeground="white",
+                                    command=self.toggle_schedule, relief="flat", cursor="hand2")
+        self.btn_toggle.pack(pady=(int(15 * self.scale), int(5 * self.scale)), ipadx=int(30 * self.scale),
+                             ipady=int(5 * self.scale))
+
+        frame_options = tk.Frame(self.root, bg=COLORS["bg"])
+        frame_options.pack()
+        self.chk_handoff = tk.Checkbutton(frame_options, text="交給系統關機排程後結束程式", variable=self.handoff_var,
+                                          bg=COLORS["bg"], fg=COLORS["fg"], font=self.fonts["title_frame"],
+                                          selectcolor=COLORS["entry_bg"], activebackground=COLORS["bg"],
+                                          activeforeground=COLORS["fg"])
+        self.chk_handoff.pack(side="left")
+
+        tk.Button(frame_options, text="📊 使用紀錄", bg=COLORS["bg"], fg="gray", font=self.fonts["title_frame"],
+                  activebackground=COLORS["bg"], activeforeground=COLORS["fg"], relief="flat", cursor="hand2",
+                  command=self.show_history).pack(side="left", padx=(int(10 * self.scale), 0))
+
+        # --- 綁定 ---
+        self.entry_cd_h.bind("<FocusIn>", lambda e: self.set_mode(1))
+        self.entry_cd_m.bind("<FocusIn>", lambda e: self.set_mode(1))
+        self.entry_sp_h.bind("<FocusIn>", lambda e: self.set_mode(2))
+        self.entry_sp_m.bind("<FocusIn>", lambda e: self.set_mode(2))
+        self.entry_sp_repeat.bind("<FocusIn>", lambda e: self.set_mode(2))
+        self.entry_proc.bind("<FocusIn>", lambda e: self.set_mode(3))
+        self.entry_idle_m.bind("<FocusIn>", lambda e: self.set_mode(4))
+
+        for entry in self.entries():
+            entry.bind("<KeyRelease>", self.preview_debounce)
+
+        self.ui_built = True
+        self.on_mode_change()
+        self.update_preview()
+        self.update_queue_view()
+        if self.is_running:
+            self.update_ui_state(locked=True)
+
+    def teardown_ui(self):
+        # 縮小到系統列時拆掉整個元件樹，還原時再重建
+        self.form = {"cd_h": self.entry_cd_h.get(), "cd_m": self.entry_cd_m.get(),
+                     "sp_h": self.entry_sp_h.get(), "sp_m": self.entry_sp_m.get(), "proc": self.entry_proc.get(),
+                     "idle_m": self.entry_idle_m.get(), "sp_repeat": self.entry_sp_repeat.get()}
+        for widget in self.root.winfo_children():
+            widget.destroy()
+        self.preview_debounce.cancel()
+        self.view.forget()
+        self.canvas = self.clock = self.lbl_status = self.lbl_queue = self.diag_item = None
+        self.ui_built = False
+
+    def on_window_minimize(self, event):
+        if event.widget == self.root:
+            if self.root.state() == 'iconic':
+                self.root.withdraw()
+                if not self.in_tray and not self.animator.is_running("alpha"):
+                    self.minimize_to_tray()
+
+    @property
+    def is_running(self):
+        return self.service.is_running
+
+    def toggle_schedule(self):
+        if not self.is_running:
+            self.start_process()
+        else:
+            self.stop_process()
+
+    def set_mode(self, mode):
+        if self.mode_var.get() != mode:
+            self.mode_var.set(mode)
+            self.on_mode_change()
+            self.update_preview()
+
+    def on_mode_selected(self):
+        # 模式按鈕已經改好 mode_var
+        self.on_mode_change()
+        self.update_preview()
+
+    def on_mode_change(self):
+        # 只放目前模式的設定，其他模式的輸入框保留內容但不佔空間
+        mode = self.mode_var.get()
+        for value, wrap in ((1, self.wrap_cd), (2, self.wrap_sp), (3, self.wrap_pr), (4, self.wrap_idle)):
+            if value == mode:
+                wrap.pack(fill="x")
+            else:
+                wrap.pack_forget()
+
+    def calculate_target_time(self):
+        if self.mode_var.get() == 1:
+            return calculate_target(1, self.entry_cd_h.get(), self.entry_cd_m.get())
+        target, err = calculate_target(2, self.entry_sp_h.get(), self.entry_sp_m.get())
+        rule, rule_err = self.repeat_rule()
+        if err or rule_err:
+            return None, err or rule_err
+        if rule is not None:
+            return datetime.datetime.fromtimestamp(rule.next_after(datetime.datetime.now().timestamp())), None
+        return target, None
+
+    def repeat_rule(self):
+        """指定時間模式的重複規則，回傳 (規則, 錯誤訊息)；沒有填重複的日子時規則為 None。"""
+        days = self.entry_sp_repeat.get().strip()
+        if not days:
+            return None, None
+        try:
+            return parse_rule(f"{days} {int(self.entry_sp_h.get() or 0)}:{int(self.entry_sp_m.get() or 0)}"), None
+        except ValueError as e:
+            return None, str(e)
+
+    def update_preview(self, event=None):
+        if self.is_running: return
+        mode = self.mode_var.get()
+        if mode in (3, 4):
+            # 程序什麼時候結束、電腦什麼時候閒置都無從得知，時鐘上不畫目標指針
+            if mode == 3:
+                name = self.entry_proc.get().strip()
+                text = f"等 {name} 結束後關機" if name else None
+            else:
+                minutes = self.idle_minutes()
+                text = f"閒置 {minutes:g} 分鐘後關機" if minutes else None
+            self.preview_time = None
+            if text:
+                self.view.config(self.lbl_status, text=text, fg=COLORS["status_fg"])
+            else:
+                self.view.config(self.lbl_status, text="等待設定...", fg="gray")
+            self.clock.render(datetime.datetime.now(), None)
+            return
+        target, _ = self.calculate_target_time()
+        self.preview_time = target
+        if target:
+            text = f"預計於 {target.strftime('%H:%M')} 關機"
+            if mode == 2 and self.entry_sp_repeat.get().strip():
+                text = f"預計於 {target.strftime('%m/%d %H:%M')} 關機\n之後每逢{self.entry_sp_repeat.get().strip()}重複"
+            self.view.config(self.lbl_status, text=text, fg=COLORS["status_fg"])
+        else:
+            self.view.config(self.lbl_status, text="等待設定...", fg="gray")
+        self.clock.render(datetime.datetime.now(), target)
+
+    def on_tick(self, now):
+        # 只在視窗顯示時執行；縮小到系統列時 ticker 會整個停掉
+        self.update_clock()
+        return 1
+
+    def update_clock(self):
+        diagnostics = self.diagnostics
+        start = diagnostics.clock() if diagnostics.enabled else None
+        now = datetime.datetime.now()
+        display_target = self.target_time if self.is_running else self.preview_time
+
+        remaining = self.service.remaining()
+        if remaining is not None:
+            # 倒數模式的期限跟著單調時鐘走，系統時間被調整後顯示的目標時間也要跟著更新
+            if remaining > 0:
+                self.target_time = datetime.datetime.fromtimestamp(round(self.service.deadline_wall()))
+                display_target = self.target_time
+                rem_sec = math.ceil(remaining)
+                rem_h, rem_r = divmod(rem_sec, 3600)
+                rem_m, rem_s = divmod(rem_r, 60)
+                time_str = f"{rem_h}:{rem_m:02}:{rem_s:02}"
+
+                action = ACTIONS[self.service.current_action()]
+                if self.service.handoff_record:
+                    action += " (已交給系統)"
+                rule = self.service.rule
+                if rule is not None:
+                    action += f" (重複: {rule.text})"
+                text = f"將於 {self.target_time.strftime('%H:%M')} {action}\n剩餘 {time_str}"
+                self.view.config(self.lbl_status, text=text, fg="#ff5252")
+        firing = self.service.firing
+        if firing is not None:
+            self.view.config(self.lbl_status, text=f"正在執行關機前的準備工作\n完成後立即{ACTIONS[firing.action]}",
+                             fg="#ff5252")
+        watch = self.service.watch
+        if watch is not None:
+            text = f"等{watch.label}後{ACTIONS[watch.action]}"
+            if hasattr(watch, "averages"):
+                text += "\n" + self.idle_status(watch)
+            self.view.config(self.lbl_status, text=text, fg="#ff5252")
+
+        self.clock.render(now, display_target)
+        if start is not None:
+            diagnostics.record(FRAME, diagnostics.clock() - start)
+        if self.show_diagnostics:
+            self.draw_diagnostics()
+
+    def toggle_diagnostics(self, event=None):
+        self.show_diagnostics = not self.show_diagnostics
+        if not self.ui_built:
+            return
+        if self.show_diagnostics:
+            self.draw_diagnostics()
+        elif self.diag_item is not None:
+            self.canvas.delete(self.diag_item)
+            self.diag_item = None
+
+    def draw_diagnostics(self):
+        # 疊加在時鐘左上角，跟著每次畫面更新重寫文字
+        text = "\n".join(self.diagnostics.overlay_lines())
+        if self.diag_item is None:
+            self.diag_item = self.canvas.create_text(2, 2, anchor="nw", text=text, fill=COLORS["status_fg"],
+                                                     font=(FONT_INPUT, int(7 * self.scale)))
+        else:
+            self.canvas.itemconfigure(self.diag_item, text=text)
+
+    def start_process(self):
+        if self.mode_var.get() in (3, 4):
+            self.start_process_watch()
+            return
+        target, err = self.calculate_target_time()
+        if self.mode_var.get() == 1:
+            try:
+                if int(self.entry_cd_h.get() or 0) == 0 and int(self.entry_cd_m.get() or 0) == 0:
+                    messagebox.showwarning("警告", "倒數時間不能為 0")
+                    return
+            except:
+                pass
+
+        if err:
+            messagebox.showerror("設定錯誤", err)
+            return
+
+        self.target_time = target
+        self.save_form()
+
+        seconds = epoch = rule = None
+        if self.mode_var.get() == 1:
+            seconds = (int(self.entry_cd_h.get() or 0) * 60 + int(self.entry_cd_m.get() or 0)) * 60
+        else:
+            epoch = target.timestamp()
+            rule, _ = self.repeat_rule()
+
+        if self.handoff_var.get():
+            if rule is not None:
+                messagebox.showerror("設定錯誤", "重複排程無法交給系統")
+                return
+            # 交給作業系統的關機計時器，程式本身不必留在背景
+            try:
+                self.service.handoff("shutdown", seconds, epoch)
+            except ValueError as e:
+                messagebox.showerror("錯誤", str(e))
+                return
+            messagebox.showinfo("提示", f"已交給系統排程，將於 {target.strftime('%H:%M')} 關機\n程式即將結束")
+            self.quit_app()
+            return
+
+        self.service.arm("shutdown", seconds, epoch, rule=rule)
+        self.refresh_schedule()
+        self.minimize_after_start()
+
+    def start_process_watch(self):
+        # 等程序結束 (模式 3) 或等電腦閒置 (模式 4)
+        if self.handoff_var.get():
+            messagebox.showerror("設定錯誤", "這種排程無法交給系統")
+            return
+        self.save_form()
+        try:
+            if self.mode_var.get() == 3:
+                self.service.watch_process("shutdown", self.entry_proc.get())
+            else:
+                minutes = self.idle_minutes()
+                if not minutes:
+                    raise ValueError("閒置時間格式錯誤")
+                thresholds = {key: float(self.store.get(f"idle_{key}"))
+                              for key in ("cpu", "disk", "net", "interval") if self.store.get(f"idle_{key}")}
+                self.service.watch_idle("shutdown", minutes, **thresholds)
+        except ValueError as e:
+            messagebox.showerror("設定錯誤", str(e))
+            return
+        self.refresh_schedule()
+        self.minimize_after_start()
+
+    def save_form(self):
+        self.store.update(mode=self.mode_var.get(), cd_h=self.entry_cd_h.get(), cd_m=self.entry_cd_m.get(),
+                          sp_h=self.entry_sp_h.get(), sp_m=self.entry_sp_m.get(), proc=self.entry_proc.get(),
+                          idle_m=self.entry_idle_m.get(), sp_repeat=self.entry_sp_repeat.get(),
+                          handoff_mode=self.handoff_var.get())
+
+    def entries(self):
+        return [self.entry_cd_h, self.entry_cd_m, self.entry_sp_h, self.entry_sp_m, self.entry_sp_repeat,
+                self.entry_proc, self.entry_idle_m]
+
+    def idle_minutes(self):
+        try:
+            minutes = float(self.entry_idle_m.get() or 0)
+        except ValueError:
+            return None
+        return minutes if minutes > 0 else None
+
+    def idle_status(self, watch):
+        averages = watch.averages()
+        if averages["cpu"] is None:
+            return "取樣中..."
+        parts = [f"CPU {averages['cpu']:.1f}%"]
+        if averages["disk"] is not None:
+            parts.append(f"磁碟 {format_rate(averages['disk'])}")
+        if averages["net"] is not None:
+            parts.append(f"網路 {format_rate(averages['net'])}")
+        if watch.progress() < 1:
+            parts.append(f"{watch.progress():.0%}")
+        return "  ".join(parts)
+
+    def minimize_after_start(self):
+        if not self.store.get("skip_warning", False):
+            self.show_warning_dialog()
+        else:
+            self.minimize_to_tray()
+
+    def choose_process(self):
+        # 列出目前的程序，雙擊或按確定後填入名稱；同名的程序不只一個時改填 PID
+        from process_watch import list_processes
+        processes = list_processes()
+        counts = {}
+        for _, name in processes:
+            counts[name] = counts.get(name, 0) + 1
+
+        top = tk.Toplevel(self.root)
+        top.title("選擇程序")
+        top.configure(bg="#2b2b2b")
+        top.geometry(f"{int(320 * self.scale)}x{int(400 * self.scale)}+{self.root.winfo_x() + 50}+"
+                     f"{self.root.winfo_y() + 100}")
+        frame = tk.Frame(top, bg="#2b2b2b")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        scrollbar = tk.Scrollbar(frame)
+        scrollbar.pack(side="right", fill="y")
+        listbox = tk.Listbox(frame, bg=COLORS["entry_bg"], fg=COLORS["entry_fg"], font=self.fonts["title_frame"],
+                             yscrollcommand=scrollbar.set, activestyle="none", relief="flat")
+        listbox.pack(side="left", fill="both", expand=True)
+        scrollbar.config(command=listbox.yview)
+        for pid, name in processes:
+            listbox.insert("end", f"{name}  ({pid})")
+
+        def on_confirm(event=None):
+            selection = listbox.curselection()
+            if not selection:
+                return
+            pid, name = processes[selection[0]]
+            self.entry_proc.delete(0, "end")
+            self.entry_proc.insert(0, name if counts[name] == 1 else str(pid))
+            top.destroy()
+            self.set_mode(3)
+            self.update_preview()
+
+        listbox.bind("<Double-Button-1>", on_confirm)
+        tk.Button(top, text="確定", command=on_confirm, width=15, bg="#1976d2", fg="white",
+                  font=self.fonts["title_frame"], relief="flat").pack(pady=(0, 10))
+
+    def show_history(self):
+        # 紀錄檔以 mmap 讀取，只看查詢範圍的那一段，在 Tk 執行緒上直接算也很快
+        history = self.service.history
+        stats = (HistoryReader(history.path) if history is not None else HistoryReader()).stats(7)
+        lines = [f"最近 {stats['days']} 天",
+                 f"設定 {stats['armed']} 次，取消 {stats['cancelled']} 次，執行 {stats['fired']} 次"
+                 + (f" (失敗 {stats['failed']})" if stats["failed"] else "")]
+        if stats["average_lead"] is not None:
+            lines.append(f"平均提前 {stats['average_lead'] / 60:.0f} 分鐘設定")
+        if stats["armed"]:
+            lines.append(f"取消比例 {stats['cancelled'] / stats['armed']:.0%}")
+        lines.append("")
+        peak = max(stats["fires_per_day"].values()) or 1
+        for day, count in stats["fires_per_day"].items():
+            lines.append(f"{day[5:].replace('-', '/')}  {count:>2}  {'█' * round(count * 10 / peak)}")
+
+        top = tk.Toplevel(self.root)
+        top.title("使用紀錄")
+        top.configure(bg="#2b2b2b")
+        top.geometry(f"+{self.root.winfo_x() + 50}+{self.root.winfo_y() + 100}")
+        tk.Label(top, text="\n".join(lines), bg="#2b2b2b", fg=COLORS["fg"], font=(FONT_INPUT, int(11 * self.scale)),
+                 justify="left").pack(padx=20, pady=(15, 10))
+        tk.Button(top, text="關閉", command=top.destroy, width=15, bg="#1976d2", fg="white",
+                  font=self.fonts["title_frame"], relief="flat").pack(pady=(0, 10))
+
+    def stop_process(self):
+        self.service.cancel()
+        self.refresh_schedule()
+
+    def refresh_schedule(self):
+        # 排程變動 (按鈕、控制指令或到期) 後同步畫面，只在 Tk 執行緒上呼叫
+        deadline = self.service.deadline_wall()
+        self.target_time = datetime.datetime.fromtimestamp(round(deadline)) if deadline else None
+        if not self.is_running:
+            self.preview_time = None
+        if self.ui_built:
+            self.update_ui_state(locked=self.is_running)
+            if not self.is_running:
+                self.update_preview()
+            self.ticker.poke()
+        self.update_queue_view()
+        self.update_tray()
+
+    # --- ScheduleService 通知 (可能來自控制或等待執行緒) ---
+
+    def on_schedule_changed(self):
+        self.call_in_ui(self.refresh_schedule)
+
+    def on_show(self):
+        self.call_in_ui(self.show_window)
+
+    def on_warning(self, entry, parent):
+        self.call_in_ui(lambda: self.show_schedule_warning(parent))
+
+    def on_action_fired(self, entry, result):
+        self.call_in_ui(lambda: self.show_shutdown_status(entry.action, result))
+
+    def on_clock_event(self, kind, seconds):
+        # 睡眠喚醒或系統時間被調整：在 Tk 執行緒上重新對齊畫面更新
+        self.call_in_ui(self.refresh_after_clock_event)
+
+    def call_in_ui(self, func):
+        try:
+            self.root.after(0, func)
+        except RuntimeError:
+            pass
+
+    def show_window(self):
+        if self.in_tray:
+            self.restore_from_tray()
+        else:
+            self.root.deiconify()
+            self.root.lift()
+            self.root.focus_force()
+
+    def update_queue_view(self):
+        # 狀態列與系統列選單顯示接下來的幾個排程 (預告不列出)
+        lines = [f"{datetime.datetime.fromtimestamp(round(deadline)):%m/%d %H:%M}  {ACTIONS[entry.action]}"
+                 for entry, deadline in self.service.upcoming_actions()]
+        self.queue_lines = lines
+        if self.ui_built:
+            if lines:
+                self.view.config(self.lbl_queue, text="\n".join(lines))
+                self.lbl_queue.pack(pady=(0, int(10 * self.scale)))
+            else:
+                self.lbl_queue.pack_forget()
+        if self.tray:
+            self.tray.update_menu()
+
+    def update_ui_state(self, locked):
+        state = "disabled" if locked else "normal"
+        bg_color = "#2b2b2b" if locked else COLORS["entry_bg"]
+
+        if locked:
+            self.view.config(self.btn_toggle, text="取消設定", bg=COLORS["btn_cancel"], activebackground="#b71c1c")
+        else:
+            self.view.config(self.btn_toggle, text="開始倒數", bg=COLORS["btn_start"], activebackground="#1b5e20")
+
+        for entry in self.entries():
+            self.view.config(entry, state=state, disabledbackground=bg_color)
+        self.view.config(self.chk_handoff, state=state)
+        self.view.config(self.btn_pick, state=state)
+        for button in self.mode_buttons:
+            self.view.config(button, state=state)
+
+    def show_warning_dialog(self):
+        top = tk.Toplevel(self.root)
+        top.title("提示")
+
+        w, h = int(340 * self.scale), int(240 * self.scale)
+        top.geometry(f"{w}x{h}")
+        top.configure(bg="#2b2b2b")
+        top.resizable(False, False)
+
+        x = self.root.winfo_x() + 50
+        y = self.root.winfo_y() + 100
+        top.geometry(f"+{x}+{y}")
+
+        tk.Label(top, text="⚠️ 縮小提示", font=self.fonts["warning_title"], fg="#ffb74d", bg="#2b2b2b").pack(
+            pady=int(15 * self.scale))
+        tk.Label(top, text="程式將縮小至右下角\n在背景執行自動關機", font=self.fonts["warning_text"], fg="#e0e0e0",
+                 bg="#2b2b2b").pack(pady=int(5 * self.scale))
+
+        chk_var = tk.BooleanVar()
+        chk = tk.Checkbutton(top, text="不再提示", variable=chk_var,
+                             bg="#2b2b2b", fg="#4fc3f7", font=self.fonts["ui_bold"],
+                             selectcolor="#3c3f41", activebackground="#2b2b2b", activeforeground="#4fc3f7")
+        chk.pack(pady=int(15 * self.scale))
+
+        def on_confirm():
+            if chk_var.get():
+                self.store.update(skip_warning=True)
+            top.destroy()
+            self.minimize_to_tray()
+
+        tk.Button(top, text="好，我知道了", command=on_confirm, width=15, bg="#1976d2", fg="white",
+                  font=self.fonts["title_frame"], relief="flat").pack(pady=5)
+
+    def window_alpha(self):
+        try:
+            return float(self.root.attributes('-alpha'))
+        except (tk.TclError, ValueError):
+            return 1.0
+
+    def set_alpha(self, alpha):
+        try:
+            self.root.attributes('-alpha', alpha)
+        except tk.TclError:
+            pass
+
+    def minimize_to_tray(self):
+        # 淡出由 after() 驅動，期間事件迴圈與其他計時器照常運作；淡出完才真正收到系統列
+        self.animator.animate("alpha", self.window_alpha(), 0.0, FADE_SECONDS, self.set_alpha,
+                              on_done=self.finish_minimize)
+
+    def finish_minimize(self):
+        self.root.withdraw()
+        self.set_alpha(1.0)
+        self.ticker.stop()
+        if self.ui_built:
+            self.teardown_ui()
+
+        if self.tray is None:
+            # pystray 與 PIL 載入較慢，等第一次縮小到系統列才匯入；之後只切換顯示
+            from tray import TrayIcon
+            self.tray = TrayIcon(self.tray_menu_items, self.scale)
+        self.in_tray = True
+        self.update_tray()
+        self.tray.show()
+
+    def update_tray(self):
+        # 系統列圖示顯示剩餘分鐘數，只在數字要變的那一刻醒來
+        if self._tray_job is not None:
+            self.root.after_cancel(self._tray_job)
+            self._tray_job = None
+        if not self.in_tray:
+            return
+        remaining = self.service.remaining()
+        watch = self.service.watch
+        if self.target_time and remaining is not None:
+            title = f"{APP_NAME} ({self.target_time.strftime('%H:%M')}，剩餘 {math.ceil(remaining / 60)} 分)"
+        elif watch is not None:
+            title = f"{APP_NAME} (等{watch.label})"
+        else:
+            title = APP_NAME
+        self.tray.update(remaining, title)
+        if remaining is not None and remaining > 0:
+            delay = remaining - (math.ceil(remaining / 60) - 1) * 60
+            self._tray_job = self.root.after(max(1, math.ceil(delay * 1000)), self.update_tray)
+
+    def tray_menu_items(self):
+        # 選單在圖示執行緒上觸發，動作一律交回 Tk 執行緒
+        import pystray
+        items = [
+            pystray.MenuItem("顯示主視窗", lambda: self.call_in_ui(self.restore_from_tray), default=True),
+            pystray.MenuItem("取消關機並顯示視窗", lambda: self.call_in_ui(self.cancel_and_restore))
+        ]
+        if self.queue_lines:
+            items.append(pystray.Menu.SEPARATOR)
+            items.extend(pystray.MenuItem(line, None, enabled=False) for line in self.queue_lines)
+        return items
+
+    def restore_from_tray(self, icon=None, item=None):
+        if self.in_tray:
+            self.in_tray = False
+            self.update_tray()
+            self.tray.hide()
+        if not self.ui_built:
+            self.build_ui()
+        # 還原時若還在淡出，從目前的透明度接著淡入 (會取消淡出完成後的收合)
+        start = 0.0 if self.root.state() == "withdrawn" else self.window_alpha()
+        self.animator.animate("alpha", start, 1.0, FADE_SECONDS, self.set_alpha)
+        self.root.deiconify()
+        self.root.state('normal')
+        self.ticker.poke()
+
+    def cancel_and_restore(self, icon=None, item=None):
+        self.restore_from_tray()
+        self.stop_process()
+
+    def refresh_after_clock_event(self):
+        if self.ui_built:
+            self.ticker.poke()
+        self.update_tray()
+
+    def show_schedule_warning(self, parent):
+        minutes = max(1, round(self.service.waiter.remaining(parent) / 60))
+        text = f"將於 {minutes} 分鐘後{ACTIONS[parent.action]}"
+        if self.in_tray:
+            self.tray.notify(text)
+        else:
+            messagebox.showwarning("提示", text)
+
+    def show_shutdown_status(self, action, result):
+        if self.ui_built:
+            text = f"執行{ACTIONS[action]}中..." if result.ok else f"{ACTIONS[action]}失敗"
+            self.view.config(self.lbl_status, text=text, fg="#ff5252")
+            self.update_ui_state(locked=self.is_running)
+        if not result.ok:
+            text = f"{ACTIONS[action]}失敗: {result.error or result.returncode}"
+            if self.in_tray:
+                self.tray.notify(text)
+            else:
+                messagebox.showerror("錯誤", text)
+
+    def on_close(self):
+        # 已交給系統的排程不需要這個程式留著
+        if self.service.schedule is not None or self.service.watch is not None:
+            self.minimize_to_tray()
+            messagebox.showinfo("提示", "倒數計時中，程式已縮小至系統列")
+        else:
+            self.quit_app()
+
+    def quit_app(self):
+        self.control.stop()
+        if self.tray: self.tray.stop()
+        self.root.destroy()
+        sys.exit()
+
+
+def run_gui(sockets, service, command=None):
+    enable_high_dpi()
+    root = tk.Tk()
+    app = ShutdownApp(root, sockets, service)
+    if command:
+        try:
+            service.handle_command(command)
+        except (ValueError, KeyError) as e:
+            messagebox.showerror("錯誤", str(e))
+    root.mainloop()
@@ -0,0 +1,186 @@
+"""執行紀錄：設定、取消與執行排程的事件，附加在固定長度紀錄的二進位檔尾端。
+
+每筆紀錄 16 位元組 (時間、事件、動作、觸發方式、成功與否、一個數值)，寫入只是把打包好的位元組放進緩衝區，
+由背景執行緒批次附加。檔案超過 max_bytes 時改名成 .1 (更舊的丟掉) 再開新檔。
+讀取端以 mmap 對應檔案，依時間二分搜尋到查詢範圍的開頭，直接在對應的記憶體上解開需要的紀錄。
+"""
+import datetime
+import math
+import mmap
+import os
+import struct
+import time
+
+from settings import HISTORY_FILE, WRITE_DELAY
+from write_behind import WriteBehind
+
+# 紀錄檔的大小上限 (位元組)，約 6 萬筆
+HISTORY_MAX_BYTES = 1024 * 1024
+# 檔頭：格式名稱與版本
+MAGIC = b"ASHIST01"
+# 時間 (epoch 秒)、事件、動作、觸發方式、成功與否、數值 (設定時為距離期限的秒數，取消時為剩餘秒數，
+# 執行時為期限到送出指令的延遲秒數；沒有期限的觸發為 NaN)
+RECORD = struct.Struct("<dBBBBf")
+
+ARMED = "armed"
+CANCELLED = "cancelled"
+FIRED = "fired"
+# 寫進檔案的代碼是在這些表裡的位置，只能往後加
+EVENTS = ("", ARMED, CANCELLED, FIRED)
+ACTION_CODES = ("", "shutdown", "reboot", "sleep", "hibernate")
+TRIGGERS = ("", "countdown", "at", "repeat", "process", "idle", "handoff")
+
+
+def _code(table, value):
+    try:
+        return table.index(value or "")
+    except ValueError:
+        return 0
+
+
+class HistoryLog(WriteBehind):
+    """紀錄的寫入端。record() 可從任何執行緒呼叫且不碰檔案，視窗的 Tk 執行緒呼叫也不會卡住。
+    執行關機之後要呼叫 flush()，把這一筆直接寫進檔案。"""
+
+    def __init__(self, path=HISTORY_FILE, max_bytes=HISTORY_MAX_BYTES, delay=WRITE_DELAY, clock=time.time):
+        self.path = path
+        self.max_bytes = max(max_bytes, len(MAGIC) + RECORD.size)
+        self.clock = clock
+        self.writes = 0
+        self.rotations = 0
+        self._buffer = []
+        super().__init__(delay, "HistoryLog")
+
+    def record(self, event, action, trigger=None, value=None, ok=True):
+        data = RECORD.pack(self.clock(), _code(EVENTS, event), _code(ACTION_CODES, action), _code(TRIGGERS, trigger),
+                           1 if ok else 0, math.nan if value is None else value)
+        with self._cond:
+            self._buffer.append(data)
+            self._changed()
+
+    def _has_changes(self):
+        return bool(self._buffer)
+
+    def _take(self):
+        data, self._buffer = b"".join(self._buffer), []
+        return data
+
+    def _restore(self, data):
+        # 寫入失敗 (例如 Windows 上檔案正被讀取端對應著，無法輪替) 就放回最前面，順序不變
+        self._buffer.insert(0, data)
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        while data:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if size > len(MAGIC) and size + len(data) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+                self.rotations += 1
+                size = 0
+            # 一批超過上限時分段寫，每個檔案都不超過 max_bytes
+            room = max(RECORD.size, (self.max_bytes - max(size, len(MAGIC))) // RECORD.size * RECORD.size)
+            chunk, data = data[:room], data[room:]
+            with open(self.path, "r+b" if size else "wb") as f:
+                if size < len(MAGIC):
+                    f.truncate(0)
+                    f.write(MAGIC)
+                else:
+                    # 上次寫到一半當掉留下的殘缺紀錄切掉，後面的紀錄才會對齊
+                    f.truncate(size - (size - len(MAGIC)) % RECORD.size)
+                    f.seek(0, os.SEEK_END)
+                f.write(chunk)
+        self.writes += 1
+
+
+class HistoryReader:
+    """紀錄的讀取端：以 mmap 對應紀錄檔與輪替下來的 .1，查詢完就關掉。"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+
+    def count(self):
+        total = 0
+        for path in (self.path + ".1", self.path):
+            try:
+                total += max(0, os.path.getsize(path) - len(MAGIC)) // RECORD.size
+            except OSError:
+                pass
+        return total
+
+    def records(self, since=None):
+        """依時間順序逐筆產生 (時間, 事件, 動作, 觸發方式, 成功與否, 數值)；since 之前的不讀。"""
+        for path in (self.path + ".1", self.path):
+            try:
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                count = (os.fstat(f.fileno()).st_size - len(MAGIC)) // RECORD.size
+                if count <= 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if mapped[:len(MAGIC)] != MAGIC:
+                        continue
+                    start = self._first_index(mapped, count, since) if since is not None else 0
+                    for offset in range(len(MAGIC) + start * RECORD.size, len(MAGIC) + count * RECORD.size,
+                                        RECORD.size):
+                        when, event, action, trigger, ok, value = RECORD.unpack_from(mapped, offset)
+                        yield (when, EVENTS[event] if event < len(EVENTS) else "",
+                               ACTION_CODES[action] if action < len(ACTION_CODES) else "",
+                               TRIGGERS[trigger] if trigger < len(TRIGGERS) else "", bool(ok), value)
+
+    @staticmethod
+    def _first_index(mapped, count, since):
+        # 紀錄依附加順序排列，時間大致遞增 (手動調整時鐘時才會例外)，用二分搜尋找第一筆 >= since 的
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(mapped, len(MAGIC) + mid * RECORD.size)[0] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def stats(self, days=7, now=None):
+        """最近 days 天 (含今天) 的統計：每天執行次數、設定/取消/執行次數、平均提前設定的時間與執行延遲。"""
+        now = time.time() if now is None else now
+        today = datetime.date.fromtimestamp(now)
+        first_day = today - datetime.timedelta(days=days - 1)
+        since = datetime.datetime.combine(first_day, datetime.time()).timestamp()
+        per_day = {str(first_day + datetime.timedelta(days=i)): 0 for i in range(days)}
+        counts = {ARMED: 0, CANCELLED: 0, FIRED: 0}
+        failed = 0
+        by_action = {}
+        leads = []
+        latencies = []
+        for when, event, action, trigger, ok, value in self.records(since):
+            if event not in counts:
+                continue
+            counts[event] += 1
+            if event == ARMED:
+                if not math.isnan(value):
+                    leads.append(value)
+            elif event == FIRED:
+                day = str(datetime.date.fromtimestamp(when))
+                if day in per_day:
+                    per_day[day] += 1
+                by_action[action] = by_action.get(action, 0) + 1
+                if not ok:
+                    failed += 1
+                if not math.isnan(value):
+                    latencies.append(value)
+        return {
+            "days": days,
+            "armed": counts[ARMED],
+            "cancelled": counts[CANCELLED],
+            "fired": counts[FIRED],
+            "failed": failed,
+            "fires_per_day": per_day,
+            "fires_by_action": by_action,
+            "average_lead": sum(leads) / len(leads) if leads else None,
+            "average_latency_ms": sum(latencies) / len(latencies) * 1000 if latencies else None,
+            "total_records": self.count(),
+        }
@@ -0,0 +1,223 @@
+"""關機前的準備工作：執行指令、請指定的程式自行關閉、把檔案寫回磁碟。
+
+設定檔的 "hooks" 是一個列表，例如::
+
+    [{"type": "command", "argv": ["backup.bat"], "timeout": 60},
+     {"type": "close", "name": "game.exe", "timeout": 20, "force": true},
+     {"type": "flush"}]
+
+在期限前 hook_lead 秒開始，全部交給最多 hook_workers 個執行緒同時執行。每個項目有自己的 timeout，
+整批另有 hook_budget 秒的總時限；真正的關機在期限到了之後，等到全部完成或總時限用完就立刻送出。
+"""
+import concurrent.futures
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from backends import run_command
+from process_watch import ProcessWatch, find_processes
+
+# 會先執行準備工作的動作；睡眠與休眠不會關掉程式，不需要
+HOOK_ACTIONS = ("shutdown", "reboot")
+# 預設值：提前開始的秒數、整批的總時限、同時執行的數量、單一項目的逾時
+HOOK_LEAD = 60
+HOOK_BUDGET = 90
+HOOK_WORKERS = 4
+HOOK_TIMEOUT = 30
+
+
+class HookResult:
+    __slots__ = ("name", "ok", "error", "elapsed")
+
+    def __init__(self, name, ok, error=None, elapsed=0.0):
+        self.name = name
+        self.ok = ok
+        self.error = error
+        self.elapsed = elapsed
+
+    def as_dict(self):
+        return {"name": self.name, "ok": self.ok, "error": self.error, "elapsed_ms": self.elapsed * 1000}
+
+
+def hook_name(hook):
+    kind = hook.get("type")
+    if kind == "command":
+        return " ".join(hook.get("argv", ()))
+    if kind == "close":
+        return f"關閉 {hook.get('name') or hook.get('pid')}"
+    return kind or "?"
+
+
+def wait_for_exit(pid, timeout):
+    """等程序結束，最多 timeout 秒；回傳是否已經結束。"""
+    exited = threading.Event()
+    try:
+        watch = ProcessWatch(None, pid, None, lambda watch, when: exited.set()).start()
+    except ProcessLookupError:
+        return True
+    try:
+        return exited.wait(timeout)
+    finally:
+        watch.cancel()
+
+
+def request_close(pid):
+    # Windows 不加 /F 的 taskkill 會送 WM_CLOSE，讓程式自己存檔結束；其他平台送 SIGTERM
+    if os.name == "nt":
+        returncode, output = run_command(["taskkill", "/PID", str(pid)])
+        return None if returncode == 0 else output
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    except OSError as e:
+        return str(e)
+    return None
+
+
+def force_close(pid):
+    if os.name == "nt":
+        run_command(["taskkill", "/F", "/PID", str(pid)])
+        return
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+class HookRun:
+    """一批正在執行的準備工作。wait() 等到全部完成或總時限用完，cancel() 停掉還沒開始與執行中的指令。"""
+
+    def __init__(self, hooks, workers, budget, clock=time.monotonic):
+        self.hooks = hooks
+        self.budget = budget
+        self.clock = clock
+        self.started = clock()
+        self.cancelled = False
+        # cancel() 時完成，讓 wait() 不必等執行中的項目自己結束
+        self._cancel_future = concurrent.futures.Future()
+        self._procs = set()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers),
+                                                               thread_name_prefix="Hook")
+        self.futures = [self._executor.submit(self._run, hook) for hook in hooks]
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def wait(self):
+        """回傳每個項目的 HookResult，順序與設定相同；總時限內沒做完的記為逾時。"""
+        pending = set(self.futures)
+        while pending and not self.cancelled:
+            remaining = self.started + self.budget - self.clock()
+            if remaining <= 0:
+                break
+            done, pending = concurrent.futures.wait(pending | {self._cancel_future}, timeout=remaining,
+                                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            pending.discard(self._cancel_future)
+        # 沒做完的不再等，還沒開始的直接取消
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        results = []
+        for hook, future in zip(self.hooks, self.futures):
+            if future.done() and not future.cancelled():
+                results.append(future.result())
+            elif self.cancelled:
+                results.append(HookResult(hook_name(hook), False, "已取消", self.clock() - self.started))
+            else:
+                results.append(HookResult(hook_name(hook), False, f"超過總時限 ({self.budget:g} 秒)",
+                                          self.clock() - self.started))
+        return results
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            procs = list(self._procs)
+        if not self._cancel_future.done():
+            self._cancel_future.set_result(None)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for proc in procs:
+            proc.kill()
+
+    def _run(self, hook):
+        start = self.clock()
+        name = hook_name(hook)
+        try:
+            error = self._dispatch(hook)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        return HookResult(name, error is None, error, self.clock() - start)
+
+    def _dispatch(self, hook):
+        if self.cancelled:
+            return "已取消"
+        kind = hook.get("type")
+        timeout = float(hook.get("timeout", HOOK_TIMEOUT))
+        if kind == "command":
+            return self._run_command(hook["argv"], timeout)
+        if kind == "close":
+            return self._close(hook, timeout)
+        if kind == "flush":
+            if hasattr(os, "sync"):
+                os.sync()
+            return None
+        return f"未知的準備工作: {kind}"
+
+    def _run_command(self, argv, timeout):
+        proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        with self._lock:
+            self._procs.add(proc)
+        try:
+            output, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return f"逾時 ({timeout:g} 秒)"
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+        if proc.returncode:
+            return output.decode(errors="replace").strip() or f"結束代碼 {proc.returncode}"
+        return None
+
+    def _close(self, hook, timeout):
+        if "pid" in hook:
+            pids = [int(hook["pid"])]
+        else:
+            pids = [pid for pid, _ in find_processes(hook["name"])]
+        # 同名的程序一起請求關閉，再一起等，共用同一個逾時
+        errors = [error for error in map(request_close, pids) if error]
+        deadline = self.clock() + timeout
+        alive = [pid for pid in pids if not wait_for_exit(pid, max(0.0, deadline - self.clock()))]
+        if alive and hook.get("force"):
+            for pid in alive:
+                force_close(pid)
+            return None
+        if alive:
+            return f"{len(alive)} 個程序在 {timeout:g} 秒內沒有結束"
+        return "; ".join(errors) or None
+
+
+class HookPipeline:
+    """準備工作的設定；start() 在背景開始一批並回傳 HookRun。"""
+
+    def __init__(self, hooks, lead=HOOK_LEAD, budget=HOOK_BUDGET, workers=HOOK_WORKERS):
+        self.hooks = list(hooks)
+        self.lead = lead
+        self.budget = budget
+        self.workers = workers
+
+    def start(self):
+        return HookRun(self.hooks, self.workers, self.budget)
+
+
+def load_pipeline(store):
+    """依設定檔建立 HookPipeline；沒有設定任何準備工作時回傳 None。"""
+    hooks = store.get("hooks") if store is not None else None
+    if not hooks:
+        return None
+    return HookPipeline(hooks, lead=float(store.get("hook_lead", HOOK_LEAD)),
+                        budget=float(store.get("hook_budget", HOOK_BUDGET)),
+                        workers=int(store.get("hook_workers", HOOK_WORKERS)))
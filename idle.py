@@ -0,0 +1,281 @@
+"""閒置觸發：CPU 使用率、磁碟與網路流量在一段時間內的平均都低於門檻時執行動作。
+
+取樣執行緒每 interval 秒讀一次系統累計計數 (Linux 讀 /proc，其他平台用 GetSystemTimes 或 psutil)，
+把與上一次的差值放進預先配置好的固定大小環形緩衝區。每個緩衝區維護目前的總和，
+加入新值時減掉被擠出的舊值，平均值是 O(1) 算出來的，不需要重新掃描歷史。
+"""
+import ctypes
+import math
+import os
+import re
+import threading
+import time
+
+# 預設的取樣間隔 (秒) 與門檻：CPU 百分比、磁碟與網路每秒位元組數
+IDLE_INTERVAL = 5.0
+IDLE_CPU = 10.0
+IDLE_DISK = 1024 * 1024
+IDLE_NET = 100 * 1024
+
+_RATE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_rate(text):
+    """流量門檻，例如 500、100K、1M (每秒位元組數)。"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?(?:/S)?\s*", str(text).upper())
+    if not match:
+        raise ValueError(f"流量格式錯誤: {text}")
+    return float(match.group(1)) * _RATE_UNITS[match.group(2)]
+
+
+def format_rate(rate):
+    for unit in ("G", "M", "K"):
+        if rate >= _RATE_UNITS[unit]:
+            return f"{rate / _RATE_UNITS[unit]:.1f}{unit}B/s"
+    return f"{rate:.0f}B/s"
+
+
+class RingBuffer:
+    """固定大小的環形緩衝區，隨時維護總和；整數資料的總和不會有累積誤差。"""
+
+    __slots__ = ("values", "size", "count", "total", "_pos")
+
+    def __init__(self, size):
+        self.values = [0] * size
+        self.size = size
+        self.count = 0
+        self.total = 0
+        self._pos = 0
+
+    def push(self, value):
+        self.total += value - self.values[self._pos]
+        self.values[self._pos] = value
+        self._pos = (self._pos + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def clear(self):
+        self.values[:] = [0] * self.size
+        self.count = self.total = self._pos = 0
+
+
+class Counters:
+    """某一刻的系統累計計數；disk/net 為 None 表示這個平台量不到。"""
+
+    __slots__ = ("cpu_busy", "cpu_total", "disk", "net")
+
+    def __init__(self, cpu_busy, cpu_total, disk, net):
+        self.cpu_busy = cpu_busy
+        self.cpu_total = cpu_total
+        self.disk = disk
+        self.net = net
+
+
+class ProcSampler:
+    """Linux：/proc/stat 的 CPU 時間、/proc/diskstats 的讀寫磁區、/proc/net/dev 的收送位元組。
+
+    檔案在建構時開好，之後每次取樣只 seek(0) 重讀；磁碟只算 /sys/block 底下的實體裝置，分割區不重複計算。
+    """
+
+    SECTOR_SIZE = 512
+
+    def __init__(self):
+        self._stat = open("/proc/stat", "rb")
+        self._diskstats = open("/proc/diskstats", "rb")
+        self._netdev = open("/proc/net/dev", "rb")
+        try:
+            self.disks = {name.encode() for name in os.listdir("/sys/block")
+                          if not name.startswith(("loop", "ram", "zram"))}
+        except OSError:
+            self.disks = None
+
+    def _read(self, f):
+        f.seek(0)
+        return f.read()
+
+    def sample(self):
+        fields = self._read(self._stat).split(b"\n", 1)[0].split()[1:]
+        ticks = [int(value) for value in fields[:8]]
+        # idle 與 iowait 算閒置；guest 已經包含在 user 裡
+        idle = ticks[3] + ticks[4]
+        total = sum(ticks)
+
+        disk = 0
+        for line in self._read(self._diskstats).splitlines():
+            parts = line.split()
+            if len(parts) > 9 and (self.disks is None or parts[2] in self.disks):
+                disk += (int(parts[5]) + int(parts[9])) * self.SECTOR_SIZE
+
+        net = 0
+        for line in self._read(self._netdev).splitlines()[2:]:
+            name, _, data = line.partition(b":")
+            if name.strip() == b"lo":
+                continue
+            parts = data.split()
+            net += int(parts[0]) + int(parts[8])
+        return Counters(total - idle, total, disk, net)
+
+    def close(self):
+        for f in (self._stat, self._diskstats, self._netdev):
+            f.close()
+
+
+class WindowsSampler:
+    """Windows：CPU 時間用 GetSystemTimes；裝了 psutil 時磁碟與網路也一起量，否則只看 CPU。"""
+
+    def __init__(self):
+        from ctypes import wintypes
+        self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self._times = [wintypes.FILETIME() for _ in range(3)]
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+        self._psutil = psutil
+
+    def sample(self):
+        idle, kernel, user = self._times
+        if not self._kernel32.GetSystemTimes(ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        idle, kernel, user = ((t.dwHighDateTime << 32) | t.dwLowDateTime for t in self._times)
+        # kernel 時間包含 idle
+        total = kernel + user
+        disk = net = None
+        if self._psutil is not None:
+            io = self._psutil.disk_io_counters()
+            disk = io.read_bytes + io.write_bytes if io else None
+            nic = self._psutil.net_io_counters()
+            net = nic.bytes_recv + nic.bytes_sent if nic else None
+        return Counters(total - idle, total, disk, net)
+
+    def close(self):
+        pass
+
+
+class PsutilSampler:
+    """其他平台：需要 psutil。"""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    def sample(self):
+        cpu = self._psutil.cpu_times()
+        total = sum(cpu)
+        idle = cpu.idle + getattr(cpu, "iowait", 0)
+        io = self._psutil.disk_io_counters()
+        nic = self._psutil.net_io_counters()
+        # 秒數換成微秒的整數，環形緩衝區的總和才不會有浮點誤差
+        return Counters(round((total - idle) * 1e6), round(total * 1e6),
+                        io.read_bytes + io.write_bytes if io else None,
+                        nic.bytes_recv + nic.bytes_sent if nic else None)
+
+    def close(self):
+        pass
+
+
+def create_sampler():
+    """依平台挑選取樣方式；都不能用時丟出 ValueError。"""
+    if os.path.exists("/proc/stat"):
+        return ProcSampler()
+    if os.name == "nt":
+        return WindowsSampler()
+    try:
+        return PsutilSampler()
+    except ImportError:
+        raise ValueError("這個平台需要安裝 psutil 才能偵測閒置")
+
+
+class IdleWatch:
+    """在背景執行緒取樣，最近 minutes 分鐘的平均 CPU 使用率 (%)、磁碟與網路流量 (B/s) 都低於門檻時
+    呼叫 callback(watch, now)，之後停止取樣。cancel() 可從任何執行緒呼叫。
+    """
+
+    def __init__(self, action, minutes, callback, cpu=IDLE_CPU, disk=IDLE_DISK, net=IDLE_NET,
+                 interval=IDLE_INTERVAL, sampler=None, clock=time.monotonic, wall=time.time):
+        if minutes <= 0 or interval <= 0:
+            raise ValueError("閒置時間與取樣間隔必須大於 0")
+        self.action = action
+        self.minutes = minutes
+        self.callback = callback
+        self.thresholds = {"cpu": cpu, "disk": disk, "net": net}
+        self.interval = interval
+        self.sampler = sampler or create_sampler()
+        self.clock = clock
+        self.wall = wall
+        self.started = wall()
+        self.samples = 0
+        size = max(1, math.ceil(minutes * 60 / interval))
+        self.buffers = {name: RingBuffer(size) for name in ("busy", "total", "disk", "net", "elapsed")}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last = None
+        self._thread = threading.Thread(target=self._run, name="IdleWatch", daemon=True)
+
+    @property
+    def label(self):
+        return f"電腦閒置 {self.minutes:g} 分鐘"
+
+    def start(self):
+        self._last = (self.clock(), self.sampler.sample())
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._stop.set()
+
+    def averages(self):
+        """目前的滾動平均 {"cpu": %, "disk": B/s, "net": B/s}；還沒有資料或量不到的項目為 None。"""
+        with self._lock:
+            b = self.buffers
+            elapsed = b["elapsed"].total
+            return {
+                "cpu": b["busy"].total * 100 / b["total"].total if b["total"].total else None,
+                "disk": b["disk"].total / elapsed if elapsed and self._last[1].disk is not None else None,
+                "net": b["net"].total / elapsed if elapsed and self._last[1].net is not None else None,
+            }
+
+    def progress(self):
+        """已經累積的取樣時間佔整個視窗的比例；滿了之後才會判斷是否閒置。"""
+        buffer = self.buffers["elapsed"]
+        return buffer.count / buffer.size
+
+    def is_idle(self):
+        if not self.buffers["elapsed"].full:
+            return False
+        for name, value in self.averages().items():
+            if value is not None and value >= self.thresholds[name]:
+                return False
+        return True
+
+    def record(self, now, counters):
+        """加入一筆取樣 (與上一筆的差值)，回傳是否已經閒置。"""
+        last_time, last = self._last
+        with self._lock:
+            self.buffers["elapsed"].push(max(0.0, now - last_time))
+            self.buffers["busy"].push(max(0, counters.cpu_busy - last.cpu_busy))
+            self.buffers["total"].push(max(0, counters.cpu_total - last.cpu_total))
+            # 計數器歸零 (例如網路卡重新啟用) 時當作沒有流量
+            self.buffers["disk"].push(max(0, (counters.disk or 0) - (last.disk or 0)))
+            self.buffers["net"].push(max(0, (counters.net or 0) - (last.net or 0)))
+            self._last = (now, counters)
+            self.samples += 1
+        return self.is_idle()
+
+    def describe(self):
+        return {"idle": {"minutes": self.minutes, "thresholds": self.thresholds, "averages": self.averages(),
+                         "progress": self.progress(), "since": self.started}}
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                if self.record(self.clock(), self.sampler.sample()):
+                    if not self._stop.is_set():
+                        self.callback(self, self.wall())
+                    return
+        finally:
+            self.sampler.close()
@@ -0,0 +1,255 @@
+"""等待指定的程序結束。
+
+Linux 以 pidfd 等待、macOS/BSD 以 kqueue 的 EVFILT_PROC 等待、Windows 等待程序的 handle，
+程序結束時核心直接喚醒等待的執行緒，不需要輪詢程序表；都不支援時才退回定期檢查。
+"""
+import ctypes
+import os
+import select
+import subprocess
+import threading
+import time
+
+# 沒有可等待的 handle 時，檢查程序是否還在的間隔 (秒)
+POLL_INTERVAL = 1.0
+
+
+class PidfdHandle:
+    """Linux 5.3 以上的 pidfd：程序結束時 pidfd 變成可讀。"""
+
+    def __init__(self, pid):
+        self.fd = os.pidfd_open(pid)
+        self._wake_r, self._wake_w = os.pipe()
+
+    def wait(self):
+        """等到程序結束 (回傳 True) 或被 wake() 叫醒 (回傳 False)。"""
+        ready, _, _ = select.select([self.fd, self._wake_r], [], [])
+        return self.fd in ready
+
+    def wake(self):
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        for fd in (self.fd, self._wake_r, self._wake_w):
+            os.close(fd)
+
+
+class KqueueHandle:
+    """macOS/BSD：以 kqueue 監看程序的 NOTE_EXIT，另外用一個 pipe 叫醒。"""
+
+    def __init__(self, pid):
+        self.kq = select.kqueue()
+        self._wake_r, self._wake_w = os.pipe()
+        self.kq.control([select.kevent(pid, select.KQ_FILTER_PROC, select.KQ_EV_ADD, select.KQ_NOTE_EXIT),
+                         select.kevent(self._wake_r, select.KQ_FILTER_READ, select.KQ_EV_ADD)], 0)
+
+    def wait(self):
+        events = self.kq.control(None, 2)
+        return any(event.filter == select.KQ_FILTER_PROC for event in events)
+
+    def wake(self):
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        self.kq.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+
+class WindowsProcessHandle:
+    """Windows：OpenProcess(SYNCHRONIZE) 取得的 handle 在程序結束時變成 signaled。"""
+
+    SYNCHRONIZE = 0x00100000
+    INFINITE = 0xFFFFFFFF
+    WAIT_OBJECT_0 = 0
+    ERROR_INVALID_PARAMETER = 87
+
+    def __init__(self, pid):
+        from ctypes import wintypes
+        kernel32 = self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+        kernel32.CreateEventW.restype = wintypes.HANDLE
+        kernel32.WaitForMultipleObjects.argtypes = (wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE),
+                                                    wintypes.BOOL, wintypes.DWORD)
+        for name in ("SetEvent", "CloseHandle"):
+            getattr(kernel32, name).argtypes = (wintypes.HANDLE,)
+
+        self._process = kernel32.OpenProcess(self.SYNCHRONIZE, False, pid)
+        if not self._process:
+            error = ctypes.get_last_error()
+            if error == self.ERROR_INVALID_PARAMETER:
+                raise ProcessLookupError(pid)
+            raise ctypes.WinError(error)
+        self._event = kernel32.CreateEventW(None, False, False, None)
+        if not self._event:
+            kernel32.CloseHandle(self._process)
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._handles = (wintypes.HANDLE * 2)(self._process, self._event)
+
+    def wait(self):
+        return self._kernel32.WaitForMultipleObjects(2, self._handles, False, self.INFINITE) == self.WAIT_OBJECT_0
+
+    def wake(self):
+        self._kernel32.SetEvent(self._event)
+
+    def close(self):
+        for handle in (self._process, self._event):
+            self._kernel32.CloseHandle(handle)
+
+
+class PollingHandle:
+    """退路：每 interval 秒用 os.kill(pid, 0) 檢查程序是否還在。"""
+
+    def __init__(self, pid, interval=POLL_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self._event = threading.Event()
+        if not pid_exists(pid):
+            raise ProcessLookupError(pid)
+
+    def wait(self):
+        while pid_exists(self.pid):
+            if self._event.wait(self.interval):
+                self._event.clear()
+                return False
+        return True
+
+    def wake(self):
+        self._event.set()
+
+    def close(self):
+        pass
+
+
+def pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def open_process_handle(pid):
+    """取得可等待的程序 handle；程序不存在時丟出 ProcessLookupError。"""
+    if os.name == "nt":
+        return WindowsProcessHandle(pid)
+    if hasattr(os, "pidfd_open"):
+        try:
+            return PidfdHandle(pid)
+        except ProcessLookupError:
+            raise
+        except OSError:
+            pass
+    if hasattr(select, "kqueue"):
+        try:
+            return KqueueHandle(pid)
+        except ProcessLookupError:
+            raise
+        except OSError:
+            pass
+    return PollingHandle(pid)
+
+
+def list_processes():
+    """目前的程序列表 [(pid, 名稱)]，依名稱排序。"""
+    processes = []
+    if os.name == "nt":
+        output = subprocess.run(["tasklist", "/FO", "CSV", "/NH"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).stdout
+        for line in output.decode(errors="replace").splitlines():
+            fields = [field.strip('"') for field in line.split('","')]
+            if len(fields) > 1 and fields[1].isdigit():
+                processes.append((int(fields[1]), fields[0]))
+    elif os.path.isdir("/proc"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/comm", encoding="utf-8", errors="replace") as f:
+                    processes.append((int(entry), f.read().strip()))
+            except OSError:
+                pass
+    else:
+        output = subprocess.run(["ps", "-A", "-o", "pid=,comm="], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL).stdout
+        for line in output.decode(errors="replace").splitlines():
+            pid, _, name = line.strip().partition(" ")
+            if pid.isdigit():
+                processes.append((int(pid), os.path.basename(name.strip())))
+    own = os.getpid()
+    return sorted(((pid, name) for pid, name in processes if pid != own), key=lambda item: (item[1].lower(), item[0]))
+
+
+def find_processes(name):
+    """名稱相符 (不分大小寫，可省略 .exe) 的程序 [(pid, 名稱)]。"""
+    wanted = name.strip().lower()
+    return [(pid, process) for pid, process in list_processes() if process.lower() in (wanted, wanted + ".exe")]
+
+
+def resolve_process(target):
+    """PID 或程序名稱 (不分大小寫，可省略 .exe) 轉成 (pid, 名稱)；找不到或有多個符合時丟出 ValueError。"""
+    target = str(target).strip()
+    if target.isdigit():
+        pid = int(target)
+        name = next((name for p, name in list_processes() if p == pid), None)
+        if name is None and not pid_exists(pid):
+            raise ValueError(f"找不到程序 {pid}")
+        return pid, name or str(pid)
+    matches = find_processes(target)
+    if not matches:
+        raise ValueError(f"找不到程序: {target}")
+    if len(matches) > 1:
+        raise ValueError(f"有 {len(matches)} 個「{target}」，請改用 PID: " + ", ".join(str(pid) for pid, _ in matches))
+    return matches[0]
+
+
+class ProcessWatch:
+    """在背景執行緒等待一個程序結束；callback(watch, exited) 在等待執行緒上執行，exited 是醒來當下的 epoch 秒數。
+
+    cancel() 可從任何執行緒呼叫，取消後 callback 不會被呼叫。
+    """
+
+    def __init__(self, action, pid, name, callback, handle=None, clock=time.time):
+        self.action = action
+        self.pid = pid
+        self.name = name
+        self.callback = callback
+        self.clock = clock
+        self.handle = handle or open_process_handle(pid)
+        self.started = clock()
+        self.cancelled = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"ProcessWatch-{pid}", daemon=True)
+
+    @property
+    def label(self):
+        return f" {self.name} (PID {self.pid}) 結束"
+
+    def describe(self):
+        return {"process": {"pid": self.pid, "name": self.name, "since": self.started}}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        # handle 關閉之後它的 fd 可能已被重用，不能再寫入
+        with self._lock:
+            self.cancelled = True
+            if not self._closed:
+                self.handle.wake()
+
+    def _run(self):
+        try:
+            exited = self.handle.wait()
+            now = self.clock()
+        finally:
+            with self._lock:
+                self._closed = True
+                self.handle.close()
+        if exited and not self.cancelled:
+            self.callback(self, now)
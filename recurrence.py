@@ -0,0 +1,236 @@
+"""重複排程：平日 03:00、每 6 小時、cron 運算式。
+
+規則在設定時解析一次，編譯成每個欄位「從這個值起下一個允許的值」的查表。算下一次的時間是從月、日、時、分
+依序查表直接跳到答案，只有某一欄用完時才進位到上一欄重查，不需要一分鐘一分鐘往後試，花的時間與離下一次多遠無關。
+
+支援的寫法::
+
+    平日 03:00、週末 23:30、一,三,五 22:00、mon-fri 03:00、每天 03:00、03:00
+    every 6h、every 90m              從設定的時候起，每隔固定的時間
+    0 3 * * 1-5                      cron 的五個欄位 (分 時 日 月 星期)，可用 * , - / 與英文縮寫
+    @hourly、@daily、@weekly、@monthly
+"""
+import datetime
+import re
+import time
+
+from control import parse_clock_time, parse_duration
+
+# 往後找下一次的年數上限；2 月 29 日這類規則最久要隔 8 年 (例如 2096 → 2104)
+MAX_YEARS = 9
+
+_MONTH_NAMES = {name: i for i, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), 1)}
+_WEEKDAY_NAMES = {name: i for i, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+_WEEKDAY_CHINESE = {"日": 0, "天": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6}
+_DAY_ALIASES = {"daily": "*", "everyday": "*", "每天": "*", "weekdays": "1-5", "平日": "1-5",
+                "weekends": "0,6", "週末": "0,6", "周末": "0,6"}
+_MACROS = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@midnight": "0 0 * * *", "@weekly": "0 0 * * 0",
+           "@monthly": "0 0 1 * *", "@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *"}
+# 各月份最多的天數 (2 月以閏年計)
+_MONTH_DAYS = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _field_value(text, names):
+    text = text.lower()
+    if text.isdigit():
+        return int(text)
+    if names and text[:3] in names:
+        return names[text[:3]]
+    raise ValueError(f"無法辨識的值: {text}")
+
+
+def _parse_field(text, lo, hi, names=None):
+    """cron 的一個欄位轉成允許值的集合。"""
+    values = set()
+    for part in text.split(","):
+        body, slash, step = part.partition("/")
+        try:
+            step = int(step) if slash else 1
+            if body == "*":
+                start, end = lo, hi
+            elif "-" in body:
+                first, last = body.split("-", 1)
+                start, end = _field_value(first, names), _field_value(last, names)
+            else:
+                start = _field_value(body, names)
+                end = hi if slash else start
+        except ValueError:
+            raise ValueError(f"欄位格式錯誤: {text}") from None
+        if step <= 0 or not lo <= start <= end <= hi:
+            raise ValueError(f"欄位超出範圍 ({lo}-{hi}): {text}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _next_table(values, hi):
+    # table[v] 是 >= v 的最小允許值，沒有就是 None；多留一格給進位用的 hi + 1
+    table = [None] * (hi + 2)
+    found = None
+    for value in range(hi, -1, -1):
+        if value in values:
+            found = value
+        table[value] = found
+    return table
+
+
+def _weekday(text):
+    text = re.sub(r"^(星期|禮拜|週|周)", "", text)
+    if text in _WEEKDAY_CHINESE:
+        return _WEEKDAY_CHINESE[text]
+    if text[:3] in _WEEKDAY_NAMES:
+        return _WEEKDAY_NAMES[text[:3]]
+    raise ValueError(f"無法辨識的星期: {text}")
+
+
+def _parse_days(text):
+    """「平日」、「一,三,五」、「mon-fri」這類寫法轉成 cron 的星期欄位。"""
+    text = text.strip().lower()
+    if not text:
+        return "*"
+    if text in _DAY_ALIASES:
+        return _DAY_ALIASES[text]
+    parts = []
+    for token in re.split(r"[,、\s]+", text):
+        bounds = [_weekday(part) for part in token.split("-")]
+        if len(bounds) == 2 and bounds[1] == 0:
+            # 「一-日」：週日放在範圍的結尾時當作 7
+            bounds[1] = 7
+        if len(bounds) > 2:
+            raise ValueError(f"星期格式錯誤: {token}")
+        parts.append("-".join(map(str, bounds)))
+    return ",".join(parts)
+
+
+class CronRule:
+    """編譯好的 cron 規則，以當地時間計算。
+
+    與 cron 相同：日與星期兩欄都有限制 (都不是以 * 開頭) 時，符合其中一個就算；否則兩個都要符合。
+    """
+
+    def __init__(self, text, minute, hour, day, month, weekday):
+        self.text = text
+        self.minutes = _next_table(_parse_field(minute, 0, 59), 59)
+        self.hours = _next_table(_parse_field(hour, 0, 23), 23)
+        days = _parse_field(day, 1, 31)
+        self.days = _next_table(days, 31)
+        months = _parse_field(month, 1, 12, _MONTH_NAMES)
+        self.months = _next_table(months, 12)
+        weekdays = {value % 7 for value in _parse_field(weekday, 0, 7, _WEEKDAY_NAMES)}
+        # 從星期 w (0 為週日) 起，到下一個允許的星期要幾天
+        self.weekday_offsets = [min((value - w) % 7 for value in weekdays) for w in range(7)]
+        self.either = not day.startswith("*") and not weekday.startswith("*")
+        if not self.either and all(min(days) > _MONTH_DAYS[m] for m in months):
+            raise ValueError(f"這個規則永遠不會發生: {text}")
+
+    def spec(self):
+        return {"rule": self.text}
+
+    def next_after(self, epoch):
+        """epoch 之後 (不含) 的下一次，回傳 epoch 秒數；找不到時丟出 ValueError。"""
+        start = datetime.datetime.fromtimestamp(epoch).replace(second=0, microsecond=0)
+        while True:
+            start += datetime.timedelta(minutes=1)
+            found = self._next(start.year, start.month, start.day, start.hour, start.minute)
+            if found.timestamp() > epoch:
+                return found.timestamp()
+            # 夏令時間結束時同一段當地時間會出現兩次，已經過的那一次跳過
+            start = found
+
+    def _next(self, year, month, day, hour, minute):
+        # 回傳 >= 指定時間的第一個符合的當地時間
+        limit = year + MAX_YEARS
+        while year <= limit:
+            found = self.months[month]
+            if found is None:
+                year, month, day, hour, minute = year + 1, 1, 1, 0, 0
+                continue
+            if found != month:
+                month, day, hour, minute = found, 1, 0, 0
+            found = self._next_day(year, month, day)
+            if found is None:
+                year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+                day, hour, minute = 1, 0, 0
+                continue
+            if found != day:
+                day, hour, minute = found, 0, 0
+            found = self.hours[hour]
+            if found is None:
+                day, hour, minute = day + 1, 0, 0
+                continue
+            if found != hour:
+                hour, minute = found, 0
+            found = self.minutes[minute]
+            if found is None:
+                hour, minute = hour + 1, 0
+                continue
+            return datetime.datetime(year, month, day, hour, found)
+        raise ValueError(f"{MAX_YEARS} 年內找不到下一次: {self.text}")
+
+    def _next_day(self, year, month, day):
+        # 這個月 >= day 的第一個符合的日子，沒有就是 None
+        last = (datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)).day
+        if day > last:
+            return None
+        first_weekday = (datetime.date(year, month, 1).weekday() + 1) % 7
+        if self.either:
+            by_day = self.days[day]
+            by_weekday = day + self.weekday_offsets[(first_weekday + day - 1) % 7]
+            found = min(by_weekday, by_day if by_day is not None else by_weekday)
+            return found if found <= last else None
+        # 兩個條件都要符合：輪流跳到下一個允許的日期與星期，直到兩者一致 (通常一兩次)
+        while day <= last:
+            day = self.days[day]
+            if day is None or day > last:
+                return None
+            offset = self.weekday_offsets[(first_weekday + day - 1) % 7]
+            if offset == 0:
+                return day
+            day += offset
+        return None
+
+
+class IntervalRule:
+    """從 anchor (設定的時刻) 起每隔 seconds 秒一次，下一次直接用除法算出來。"""
+
+    def __init__(self, text, seconds, anchor=None):
+        if seconds < 60:
+            raise ValueError("重複的間隔至少要 1 分鐘")
+        self.text = text
+        self.seconds = seconds
+        self.anchor = time.time() if anchor is None else anchor
+
+    def spec(self):
+        return {"rule": self.text, "anchor": self.anchor}
+
+    def next_after(self, epoch):
+        return self.anchor + ((epoch - self.anchor) // self.seconds + 1) * self.seconds
+
+
+def parse_rule(text, anchor=None):
+    """解析重複規則，回傳有 next_after(epoch) 的規則物件；格式錯誤時丟出 ValueError。
+
+    anchor 只用於 every 規則，預設為現在。
+    """
+    text = " ".join(str(text).split())
+    lowered = text.lower()
+    if lowered.startswith("every "):
+        return IntervalRule(text, parse_duration(lowered[6:].replace(" ", "")), anchor)
+    if lowered in _MACROS:
+        return CronRule(text, *_MACROS[lowered].split())
+    fields = text.split()
+    if len(fields) == 5:
+        return CronRule(text, *fields)
+    if not fields:
+        raise ValueError("沒有指定重複規則")
+    # 「星期 時間」的簡寫
+    h, m = parse_clock_time(fields[-1])
+    return CronRule(text, str(m), str(h), "*", "*", _parse_days(" ".join(fields[:-1])))
+
+
+def load_rule(spec):
+    """把 spec() 存下的內容還原成規則；內容無效時丟出 ValueError。"""
+    try:
+        return parse_rule(spec["rule"], spec.get("anchor"))
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError(f"重複規則格式錯誤: {spec}") from None
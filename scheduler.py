@@ -0,0 +1,559 @@
+import ctypes
+import datetime
+import errno
+import heapq
+import os
+import select
+import sys
+import threading
+import time
+import traceback
+
+# 期限的時間基準：倒數模式跟著單調時鐘 (含睡眠時間)，指定時間模式跟著牆上時鐘
+MONOTONIC = "monotonic"
+WALL = "wall"
+
+# 兩次觀察之間的誤差超過這個秒數才視為睡眠或時間被調整
+JUMP_TOLERANCE = 2.0
+
+
+def next_time_of_day(h, m, now=None):
+    """今天 h:m 若已經過了就排到明天。"""
+    now = now or datetime.datetime.now().replace(microsecond=0)
+    target = now.replace(hour=h, minute=m, second=0, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return target
+
+
+def calculate_target(mode, h_text, m_text, now=None):
+    """依表單內容計算目標時間，回傳 (目標時間, 錯誤訊息)；mode 1 為倒數，2 為指定時間。"""
+    now = now or datetime.datetime.now().replace(microsecond=0)
+    try:
+        h = int(h_text or 0)
+        m = int(m_text or 0)
+    except ValueError:
+        return None, "格式錯誤"
+    if mode == 1:
+        if h == 0 and m == 0: return now, None
+        return now + datetime.timedelta(hours=h, minutes=m), None
+    if not (0 <= h <= 23 and 0 <= m <= 59): return None, "時間格式錯誤"
+    return next_time_of_day(h, m, now), None
+
+
+class SystemClock:
+    """wall: 牆上時鐘；monotonic: 單調且包含睡眠時間；awake: 單調但不含睡眠時間。"""
+
+    def wall(self):
+        return time.time()
+
+    if sys.platform.startswith("linux"):
+        def monotonic(self):
+            return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+        def awake(self):
+            return time.clock_gettime(time.CLOCK_MONOTONIC)
+    elif os.name == "nt":
+        def monotonic(self):
+            return time.monotonic()
+
+        def awake(self):
+            value = ctypes.c_ulonglong()
+            ctypes.windll.kernel32.QueryUnbiasedInterruptTime(ctypes.byref(value))
+            return value.value / 1e7
+    else:
+        def monotonic(self):
+            return time.monotonic()
+
+        def awake(self):
+            return time.monotonic()
+
+
+class FakeClock:
+    """可注入 SchedulerCore 的假時鐘，用來模擬經過時間、睡眠與手動調整時間。"""
+
+    def __init__(self, wall=1_700_000_000.0):
+        self._wall = wall
+        self._monotonic = 1000.0
+        self._awake = 1000.0
+
+    def wall(self):
+        return self._wall
+
+    def monotonic(self):
+        return self._monotonic
+
+    def awake(self):
+        return self._awake
+
+    def advance(self, seconds):
+        self._wall += seconds
+        self._monotonic += seconds
+        self._awake += seconds
+
+    def suspend(self, seconds):
+        self._wall += seconds
+        self._monotonic += seconds
+
+    def jump(self, seconds):
+        self._wall += seconds
+
+
+class ScheduleEntry:
+    __slots__ = ("id", "action", "kind", "target", "parent", "pos")
+
+    def __init__(self, entry_id, action, kind, target, parent=None):
+        self.id = entry_id
+        self.action = action
+        self.kind = kind
+        self.target = target
+        self.parent = parent
+        self.pos = None
+
+    def __lt__(self, other):
+        return (self.target, self.id) < (other.target, other.id)
+
+
+class EntryHeap:
+    """記錄每個項目位置的二元堆積，新增與任意刪除都是 O(log n)。"""
+
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def peek(self):
+        return self.items[0] if self.items else None
+
+    def smallest(self, count, main_only=False):
+        # 從堆頂往下做最佳優先搜尋，只走訪期限在結果之前的節點；main_only 時略過預告等子項目
+        # (仍往下走它們的子節點)，被略過的不算在 count 裡
+        items = self.items
+        result = []
+        frontier = [(items[0], 0)] if items else []
+        while frontier and len(result) < count:
+            entry, i = heapq.heappop(frontier)
+            if not main_only or entry.parent is None:
+                result.append(entry)
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(items):
+                    heapq.heappush(frontier, (items[child], child))
+        return result
+
+    def push(self, entry):
+        entry.pos = len(self.items)
+        self.items.append(entry)
+        self._sift_up(entry.pos)
+
+    def remove(self, entry):
+        i = entry.pos
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            last.pos = i
+            self._sift_up(i)
+            self._sift_down(last.pos)
+        entry.pos = None
+
+    def _swap(self, i, j):
+        items = self.items
+        items[i], items[j] = items[j], items[i]
+        items[i].pos = i
+        items[j].pos = j
+
+    def _sift_up(self, i):
+        items = self.items
+        while i > 0:
+            parent = (i - 1) // 2
+            if not items[i] < items[parent]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        items = self.items
+        n = len(items)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and items[child] < items[smallest]:
+                    smallest = child
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
+
+
+class SchedulerCore:
+    """不依賴 GUI 的排程核心，可同時排多個動作 (關機、重新開機、睡眠、預告…)。
+
+    倒數模式的期限記在單調時鐘上，NTP 校時、夏令時間或手動改時間都不會影響；
+    指定時間模式則記在牆上時鐘上，改時間後自然跟著移動。兩種期限各放在一個堆積裡，
+    最早的項目只要比較兩個堆頂即可。observe() 比較三個時鐘自上次觀察以來的差值，
+    以 O(1) 判斷期間是否發生睡眠或時間跳動。
+    """
+
+    def __init__(self, clock=None, on_event=None):
+        self.clock = clock or SystemClock()
+        self.on_event = on_event
+        self.heaps = {MONOTONIC: EntryHeap(), WALL: EntryHeap()}
+        self.entries = {}
+        self.children = {}
+        self._next_id = 1
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        return self.clock.wall(), self.clock.monotonic(), self.clock.awake()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def now(self, kind):
+        return self.clock.monotonic() if kind == MONOTONIC else self.clock.wall()
+
+    def _add(self, action, kind, target, warnings, parent=None):
+        entry = ScheduleEntry(self._next_id, action, kind, target, parent)
+        self._next_id += 1
+        self.entries[entry.id] = entry
+        self.heaps[kind].push(entry)
+        if parent is None:
+            # 預告項目掛在主項目底下，取消主項目時一併移除；已經來不及的預告直接略過。
+            # warnings 的項目可以是提前的秒數 (預告)，或 (秒數, 動作) 指定其他的子項目 (例如 "prepare")
+            now = self.now(kind)
+            for lead in warnings:
+                lead, child_action = lead if isinstance(lead, tuple) else (lead, "warning")
+                if target - lead > now:
+                    child = self._add(child_action, kind, target - lead, (), parent=entry.id)
+                    self.children.setdefault(entry.id, []).append(child.id)
+        return entry
+
+    def add_countdown(self, action, seconds, warnings=()):
+        self.observe()
+        return self._add(action, MONOTONIC, self.clock.monotonic() + seconds, warnings)
+
+    def add_at(self, action, epoch, warnings=()):
+        self.observe()
+        return self._add(action, WALL, epoch, warnings)
+
+    def cancel(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return False
+        self.heaps[entry.kind].remove(entry)
+        for child_id in self.children.pop(entry_id, ()):
+            self.cancel(child_id)
+        if entry.parent in self.children:
+            self.children[entry.parent].remove(entry_id)
+        return True
+
+    def clear(self):
+        for entry_id in list(self.entries):
+            self.cancel(entry_id)
+
+    def remaining(self, entry):
+        return entry.target - self.now(entry.kind)
+
+    def deadline_wall(self, entry):
+        if entry.kind == WALL:
+            return entry.target
+        return self.clock.wall() + self.remaining(entry)
+
+    def next_entry(self):
+        heads = [heap.peek() for heap in self.heaps.values() if heap]
+        if not heads:
+            return None
+        return min(heads, key=self.remaining)
+
+    def pop_due(self):
+        due = []
+        for heap in self.heaps.values():
+            now = None
+            while heap:
+                entry = heap.peek()
+                now = now if now is not None else self.now(entry.kind)
+                if entry.target > now:
+                    break
+                due.append(entry)
+                self.cancel(entry.id)
+        due.sort(key=lambda entry: (entry.parent is None, self.deadline_wall(entry)))
+        return due
+
+    def upcoming(self, count, main_only=False):
+        """依期限先後回傳前 count 個項目 (main_only 時不含預告等子項目)，只看兩個堆積的前段，不需要整個排序。"""
+        candidates = []
+        for heap in self.heaps.values():
+            candidates.extend(heap.smallest(count, main_only))
+        return sorted(candidates, key=self.deadline_wall)[:count]
+
+    def targets(self):
+        return {kind: heap.peek().target for kind, heap in self.heaps.items() if heap}
+
+    def observe(self):
+        """回傳自上次呼叫以來偵測到的事件列表: ("suspend", 秒數) 或 ("clock_jump", 秒數)。"""
+        wall, mono, awake = snapshot = self._take_snapshot()
+        prev_wall, prev_mono, prev_awake = self._snapshot
+        self._snapshot = snapshot
+
+        events = []
+        suspended = (mono - prev_mono) - (awake - prev_awake)
+        if suspended > JUMP_TOLERANCE:
+            events.append(("suspend", suspended))
+        jumped = (wall - prev_wall) - (mono - prev_mono)
+        if abs(jumped) > JUMP_TOLERANCE:
+            events.append(("clock_jump", jumped))
+        if events and self.on_event:
+            for event in events:
+                self.on_event(*event)
+        return events
+
+
+class ConditionTimer:
+    """通用的等待方式；Condition 的逾時不含睡眠時間，因此最長只等 max_wait 秒。"""
+
+    def __init__(self, clock, max_wait=60.0):
+        self.clock = clock
+        self.max_wait = max_wait
+        self._event = threading.Event()
+
+    def wait(self, targets):
+        timeout = None
+        for kind, target in targets.items():
+            now = self.clock.monotonic() if kind == MONOTONIC else self.clock.wall()
+            remaining = min(max(0.0, target - now), self.max_wait)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        self._event.clear()
+
+    def wake(self):
+        self._event.set()
+
+    def close(self):
+        pass
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+class _Itimerspec(ctypes.Structure):
+    _fields_ = [("it_interval", _Timespec), ("it_value", _Timespec)]
+
+
+class TimerFdTimer:
+    """Linux timerfd：CLOCK_BOOTTIME 在睡眠後照樣到期，CLOCK_REALTIME 搭配
+    TFD_TIMER_CANCEL_ON_SET 在時間被調整時立刻喚醒，完全不需要輪詢。"""
+
+    CLOCK_REALTIME = 0
+    CLOCK_BOOTTIME = 7
+    TFD_CLOEXEC = 0o2000000
+    TFD_TIMER_ABSTIME = 1
+    TFD_TIMER_CANCEL_ON_SET = 2
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fds = {
+            MONOTONIC: self._create(self.CLOCK_BOOTTIME),
+            WALL: self._create(self.CLOCK_REALTIME),
+        }
+        self._wake_r, self._wake_w = os.pipe()
+
+    def _create(self, clock_id):
+        fd = self._libc.timerfd_create(clock_id, self.TFD_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "timerfd_create")
+        return fd
+
+    def _settime(self, fd, target, flags):
+        sec = int(target)
+        spec = _Itimerspec(_Timespec(0, 0), _Timespec(sec, max(1, int((target - sec) * 1e9))))
+        if self._libc.timerfd_settime(fd, flags, ctypes.byref(spec), None) < 0:
+            raise OSError(ctypes.get_errno(), "timerfd_settime")
+
+    def wait(self, targets):
+        fds = [self._wake_r]
+        for kind, target in targets.items():
+            fd = self._fds[kind]
+            flags = self.TFD_TIMER_ABSTIME
+            if kind == WALL:
+                flags |= self.TFD_TIMER_CANCEL_ON_SET
+            self._settime(fd, target, flags)
+            fds.append(fd)
+        ready, _, _ = select.select(fds, [], [])
+        for fd in ready:
+            try:
+                os.read(fd, 8 if fd != self._wake_r else 512)
+            except OSError as e:
+                if e.errno != errno.ECANCELED:
+                    raise
+
+    def wake(self):
+        os.write(self._wake_w, b"\0")
+
+    def close(self):
+        for fd in (*self._fds.values(), self._wake_r, self._wake_w):
+            os.close(fd)
+
+
+class WaitableTimer:
+    """Windows 可等待計時器：絕對時間的計時器會跟著系統時間調整，睡眠喚醒後也會立即觸發。"""
+
+    EPOCH_AS_FILETIME = 116444736000000000
+    INFINITE = 0xFFFFFFFF
+
+    def __init__(self, clock):
+        from ctypes import wintypes
+        self.clock = clock
+        kernel32 = self._kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateWaitableTimerW.restype = wintypes.HANDLE
+        kernel32.CreateEventW.restype = wintypes.HANDLE
+        kernel32.SetWaitableTimer.argtypes = (wintypes.HANDLE, ctypes.POINTER(ctypes.c_longlong), wintypes.LONG,
+                                              ctypes.c_void_p, ctypes.c_void_p, wintypes.BOOL)
+        kernel32.WaitForMultipleObjects.argtypes = (wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE),
+                                                    wintypes.BOOL, wintypes.DWORD)
+        for name in ("CancelWaitableTimer", "SetEvent", "CloseHandle"):
+            getattr(kernel32, name).argtypes = (wintypes.HANDLE,)
+
+        self._timers = {kind: kernel32.CreateWaitableTimerW(None, True, None) for kind in (MONOTONIC, WALL)}
+        self._event = kernel32.CreateEventW(None, False, False, None)
+        if not all(self._timers.values()) or not self._event:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def wait(self, targets):
+        # 手動重設的計時器觸發後一直有訊號，CancelWaitableTimer 也清不掉，要等下次 SetWaitableTimer 才會重設；
+        # 只等這一輪有期限的種類，否則上一輪觸發過的計時器會讓等待立刻返回
+        handles = [self._event]
+        for kind, target in targets.items():
+            if kind == WALL:
+                due = int(target * 1e7) + self.EPOCH_AS_FILETIME
+            else:
+                due = -max(1, int((target - self.clock.monotonic()) * 1e7))
+            self._kernel32.SetWaitableTimer(self._timers[kind], ctypes.byref(ctypes.c_longlong(due)),
+                                            0, None, None, False)
+            handles.append(self._timers[kind])
+        self._kernel32.WaitForMultipleObjects(len(handles), (ctypes.c_void_p * len(handles))(*handles), False,
+                                              self.INFINITE)
+        for kind in targets:
+            self._kernel32.CancelWaitableTimer(self._timers[kind])
+
+    def wake(self):
+        self._kernel32.SetEvent(self._event)
+
+    def close(self):
+        for handle in (*self._timers.values(), self._event):
+            self._kernel32.CloseHandle(handle)
+
+
+def create_timer(clock):
+    if isinstance(clock, SystemClock):
+        try:
+            if sys.platform.startswith("linux"):
+                return TimerFdTimer()
+            if os.name == "nt":
+                return WaitableTimer(clock)
+        except (OSError, AttributeError):
+            pass
+    return ConditionTimer(clock)
+
+
+class DeadlineWaiter:
+    """專用的等待執行緒：只等最早的項目，阻塞到期限為止才醒來，期間不做任何輪詢。
+
+    其他方法可從任何執行緒呼叫；callback(entry, deadline) 在等待執行緒上執行。active 為 False 時只記錄期限，
+    不啟動等待執行緒，到期也不會呼叫 callback。
+    """
+
+    def __init__(self, callback, core=None, timer=None, active=True):
+        self.callback = callback
+        self.active = active
+        # SchedulerCore 定義了 __len__，空的核心是 falsy，不能用 or 判斷
+        self.core = core if core is not None else SchedulerCore()
+        self.timer = timer or create_timer(self.core.clock)
+        self._lock = threading.Lock()
+        self._thread = None
+        # 最近一次在等待執行緒上發生的例外 (文字)，describe() 會顯示出來
+        self.error = None
+
+    def add_countdown(self, action, seconds, warnings=()):
+        with self._lock:
+            entry = self.core.add_countdown(action, seconds, warnings)
+        self._wake()
+        return entry
+
+    def add_at(self, action, epoch, warnings=()):
+        with self._lock:
+            entry = self.core.add_at(action, epoch, warnings)
+        self._wake()
+        return entry
+
+    def cancel(self, entry_id):
+        with self._lock:
+            cancelled = self.core.cancel(entry_id)
+        self._wake()
+        return cancelled
+
+    def clear(self):
+        with self._lock:
+            self.core.clear()
+        self._wake()
+
+    def get(self, entry_id):
+        return self.core.entries.get(entry_id)
+
+    def remaining(self, entry):
+        with self._lock:
+            return self.core.remaining(entry)
+
+    def deadline_wall(self, entry):
+        with self._lock:
+            return self.core.deadline_wall(entry)
+
+    def next_deadline_wall(self):
+        with self._lock:
+            entry = self.core.next_entry()
+            return self.core.deadline_wall(entry) if entry else None
+
+    def upcoming(self, count, main_only=False):
+        with self._lock:
+            return [(entry, self.core.deadline_wall(entry)) for entry in self.core.upcoming(count, main_only)]
+
+    def pending(self):
+        """所有尚未到期的主項目 (不含預告) 與其牆上時鐘期限，順序不定。"""
+        with self._lock:
+            return [(entry, self.core.deadline_wall(entry)) for entry in self.core.entries.values()
+                    if entry.parent is None]
+
+    def _wake(self):
+        if not self.active:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="DeadlineWaiter", daemon=True)
+            self._thread.start()
+        else:
+            self.timer.wake()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self.core.observe()
+                due = [(entry, self.core.deadline_wall(entry)) for entry in self.core.pop_due()]
+                targets = self.core.targets()
+            # 等待執行緒只有一條，任何例外都不能讓它結束，否則之後的排程全都不會執行
+            for entry, deadline in due:
+                try:
+                    self.callback(entry, deadline)
+                except Exception:
+                    self._report()
+            if due:
+                continue
+            try:
+                self.timer.wait(targets)
+            except Exception:
+                # 系統計時器出錯 (例如期限超出範圍) 時改用不會失敗的 ConditionTimer，代價是定期醒來
+                self._report()
+                self.timer = ConditionTimer(self.core.clock)
+
+    def _report(self):
+        error = sys.exc_info()[1]
+        self.error = f"{type(error).__name__}: {error}"
+        traceback.print_exc()
@@ -0,0 +1,513 @@
+import math
+import threading
+import time
+
+from backends import HANDOFF_ACTIONS, OsTimer, create_backend
+from control import parse_clock_time
+from diagnostics import DEADLINE_LATENCY, Diagnostics
+from history import ARMED, CANCELLED, FIRED
+from hooks import HOOK_ACTIONS
+from idle import IdleWatch
+from process_watch import ProcessWatch, resolve_process
+from recurrence import load_rule, parse_rule
+from scheduler import MONOTONIC, WALL, DeadlineWaiter, SchedulerCore, next_time_of_day
+from settings import ACTIONS, WARNING_LEADS, UPCOMING_COUNT
+
+# 控制通道接受的最遠期限 (秒)；再遠的排程沒有意義，也放不進系統的計時器
+MAX_DELAY = 366 * 86400
+# 閒置的判斷視窗越長，取樣的環形緩衝區越大，最多一天
+MAX_IDLE_MINUTES = 24 * 60
+
+
+def _bounded(value, name, low=0.0, high=MAX_DELAY):
+    # NaN 與無限大也能從 JSON 或字串轉出來，比大小檢查不到，要另外擋掉
+    seconds = float(value)
+    if not math.isfinite(seconds) or not low < seconds <= high:
+        raise ValueError(f"{name}超出範圍")
+    return seconds
+
+
+class ScheduleService:
+    """主排程、排程佇列與控制指令的處理，視窗版與常駐模式共用，不依賴任何 GUI 模組。
+
+    listener 可實作 on_schedule_changed()、on_action_fired(entry, result)、on_warning(entry, parent)、
+    on_clock_event(kind, seconds)、on_hooks_finished(entry, results)、on_show()；
+    這些方法可能在控制、等待或準備工作的執行緒上被呼叫。不給 store、hooks、history 時就不存檔、
+    不執行準備工作、不記錄。active 為 False 時排程只存檔不等待 (做完一個指令就結束的命令列)。
+    """
+
+    def __init__(self, listener=None, store=None, backend=None, os_timer=None, diagnostics=None, hooks=None,
+                 history=None, active=True):
+        self.listener = listener
+        self.store = store
+        self.backend = backend or create_backend()
+        self.os_timer = os_timer or OsTimer()
+        # 期限到指令送出的延遲記在 diagnostics (預設停用)，視窗也用它記錄畫面的量測
+        self.diagnostics = diagnostics or Diagnostics()
+        self.schedule = None
+        self.handoff_record = self._load_handoff()
+        self.watch = None
+        self.rule = None
+        self.hooks = hooks
+        self.history = history
+        # 已經開始的準備工作，鍵為主項目的 id (等程序結束或閒置的觸發則是 watch 本身)；
+        # firing 是期限已到、正在等準備工作做完的項目 (或 watch)
+        self.hook_runs = {}
+        self.firing = None
+        self.last_hooks = None
+        # 最近一次執行的結果，以及期限到指令送出之間的延遲 (秒)
+        self.last_result = None
+        self.last_latency = None
+        # 期限由獨立的等待執行緒負責，不依賴 Tk 迴圈或畫面更新
+        self.waiter = DeadlineWaiter(self.on_deadline, SchedulerCore(on_event=self.on_clock_event), active=active)
+
+    @property
+    def is_running(self):
+        return (self.schedule is not None or self.handoff_record is not None or self.watch is not None
+                or self.firing is not None)
+
+    def _load_handoff(self):
+        record = self.store.get("handoff") if self.store else None
+        if not record:
+            return None
+        if record.get("deadline", 0) <= time.time():
+            # 期限已過 (系統已經關過機或被取消)，紀錄沒有用了
+            self.store.update(handoff=None)
+            return None
+        return record
+
+    def _notify(self, name, *args):
+        method = getattr(self.listener, name, None)
+        if method:
+            method(*args)
+
+    def arm(self, action, seconds=None, epoch=None, rule=None):
+        """設定主排程，取代原本的 (包括已交給系統的與等待程序結束的)。
+
+        有 rule (重複規則) 時期限是規則的下一次，每次到期執行前先排好下一次 (_rearm)；
+        規則跟著排程存進 store，重新啟動後由 resume() 從當下起算下一次。
+        """
+        if rule is not None:
+            epoch = rule.next_after(time.time())
+        if self.schedule:
+            self._cancel_entry(self.schedule.id)
+        self._cancel_handoff()
+        self._cancel_watch()
+        self._cancel_firing()
+        self.rule = rule
+        self.schedule = self._add(action, seconds, epoch)
+        self._log_armed(self.schedule, "repeat" if rule is not None else None)
+        self._persist()
+        self._notify("on_schedule_changed")
+        return self.schedule
+
+    def add(self, action, seconds=None, epoch=None):
+        # 加入排程佇列，不影響主排程
+        entry = self._add(action, seconds, epoch)
+        self._log_armed(entry)
+        self._persist()
+        self._notify("on_schedule_changed")
+        return entry
+
+    def _log(self, event, action, trigger=None, value=None, ok=True):
+        # 有 history (HistoryLog) 時，設定、取消與執行各記一筆；只是放進緩衝區，不會在呼叫端的執行緒寫檔
+        if self.history is not None:
+            self.history.record(event, action, trigger, value, ok)
+
+    def _log_armed(self, entry, trigger=None):
+        self._log(ARMED, entry.action, trigger or self._trigger(entry),
+                  self.waiter.deadline_wall(entry) - time.time())
+
+    @staticmethod
+    def _trigger(entry):
+        # 紀錄裡的觸發方式
+        if isinstance(entry, ProcessWatch):
+            return "process"
+        if isinstance(entry, IdleWatch):
+            return "idle"
+        return {MONOTONIC: "countdown", WALL: "at"}.get(entry.kind)
+
+    def _leads(self, action):
+        if self.hooks is not None and action in HOOK_ACTIONS:
+            return WARNING_LEADS + ((self.hooks.lead, "prepare"),)
+        return WARNING_LEADS
+
+    def _add(self, action, seconds, epoch):
+        if seconds is not None:
+            return self.waiter.add_countdown(action, seconds, self._leads(action))
+        return self.waiter.add_at(action, epoch, self._leads(action))
+
+    def _cancel_entry(self, entry_id):
+        # 取消排程項目，已經開始的準備工作一併停掉
+        run = self.hook_runs.pop(entry_id, None)
+        if run is not None:
+            run.cancel()
+        return self.waiter.cancel(entry_id) or run is not None
+
+    def _cancel_firing(self):
+        # 期限已到但還在等準備工作的項目：取消後就不執行了
+        firing = self.firing
+        return firing is not None and self._cancel_entry(getattr(firing, "id", firing))
+
+    def cancel(self, entry_id=None):
+        # 不指定 entry_id 時取消主排程，也取消已交給系統的排程與程序結束的觸發
+        if entry_id is None or (self.schedule and self.schedule.id == entry_id):
+            action, remaining = self.current_action(), self.remaining()
+            schedule, self.schedule = self.schedule, None
+            self.rule = None
+            cancelled = schedule is not None and self._cancel_entry(schedule.id)
+            cancelled = self._cancel_handoff() or cancelled
+            cancelled = self._cancel_watch() or cancelled
+            cancelled = self._cancel_firing() or cancelled
+        else:
+            entry = self.waiter.get(entry_id)
+            action, remaining = (entry.action, self.waiter.remaining(entry)) if entry is not None else (None, None)
+            cancelled = self._cancel_entry(entry_id)
+        if cancelled:
+            self._log(CANCELLED, action, value=remaining)
+        self._persist()
+        self._notify("on_schedule_changed")
+        return cancelled
+
+    def handoff(self, action, seconds=None, epoch=None):
+        """把主排程交給作業系統的關機計時器 (os_timer)，之後這個程式可以直接結束；失敗時丟出 ValueError。
+
+        交接紀錄存在 store 裡，重新啟動或從命令列查詢時仍然查得到、取消得了。
+        """
+        if action not in HANDOFF_ACTIONS:
+            raise ValueError(f"{ACTIONS[action]}無法交給系統排程")
+        deadline = time.time() + seconds if seconds is not None else epoch
+        self._cancel_handoff()
+        result = self.os_timer.arm(action, deadline)
+        if not result.ok:
+            raise ValueError(f"系統排程失敗: {result.error or result.returncode}")
+        if self.schedule:
+            self._cancel_entry(self.schedule.id)
+            self.schedule = None
+        self.rule = None
+        self._cancel_watch()
+        self._cancel_firing()
+        self.handoff_record = {"action": action, "deadline": deadline, "argv": result.argv}
+        self._log(ARMED, action, "handoff", deadline - time.time())
+        self._persist()
+        if self.store is not None:
+            # 程式接著就要結束，交接紀錄要確實寫進磁碟，之後才查得到、取消得了
+            self.store.update(handoff=self.handoff_record)
+            self.store.flush()
+        self._notify("on_schedule_changed")
+        return self.handoff_record
+
+    def _cancel_handoff(self):
+        if self.handoff_record is None:
+            return False
+        # 系統那邊可能已經被手動取消，結果不論成功與否都清掉紀錄
+        self.os_timer.cancel()
+        self.handoff_record = None
+        if self.store is not None:
+            self.store.update(handoff=None)
+        return True
+
+    def watch_process(self, action, target):
+        """主排程改成等 target (PID 或程序名稱) 結束後執行 action；找不到程序時丟出 ValueError。
+
+        等程序結束與等閒置的觸發放在 watch，跟重新開機前的狀態無關，不會存檔。
+        """
+        pid, name = resolve_process(target)
+        try:
+            watch = ProcessWatch(action, pid, name, self.on_watch_fired)
+        except ProcessLookupError:
+            raise ValueError(f"找不到程序 {pid}")
+        return self._set_watch(watch)
+
+    def watch_idle(self, action, minutes, **thresholds):
+        """主排程改成等電腦閒置 minutes 分鐘後執行 action；thresholds 可指定 cpu、disk、net、interval。"""
+        return self._set_watch(IdleWatch(action, minutes, self.on_watch_fired, **thresholds))
+
+    def _set_watch(self, watch):
+        if self.schedule:
+            self._cancel_entry(self.schedule.id)
+            self.schedule = None
+        self.rule = None
+        self._cancel_handoff()
+        self._cancel_watch()
+        self._cancel_firing()
+        self.watch = watch.start()
+        self._log(ARMED, watch.action, self._trigger(watch))
+        self._persist()
+        self._notify("on_schedule_changed")
+        return watch
+
+    def _cancel_watch(self):
+        watch, self.watch = self.watch, None
+        if watch is None:
+            return False
+        watch.cancel()
+        return True
+
+    def _persist(self):
+        # 尚未到期的項目 (與主排程的重複規則) 存進 store，重新啟動後由 resume() 接回
+        if self.store is None:
+            return
+        schedule, rule = self.schedule, self.rule
+        self.store.update(schedule=[
+            {"action": entry.action, "kind": entry.kind, "deadline": deadline,
+             "main": schedule is not None and entry.id == schedule.id}
+            for entry, deadline in sorted(self.waiter.pending(), key=lambda item: item[1])],
+            recurrence=dict(rule.spec(), action=schedule.action) if rule is not None and schedule else None)
+
+    def _load_recurrence(self):
+        # 存檔的重複規則還原成 (動作, 規則)；沒有或內容無效時回傳 None
+        saved = self.store.get("recurrence") if self.store else None
+        if not saved:
+            return None
+        try:
+            action, rule = saved["action"], load_rule(saved)
+        except (KeyError, TypeError, ValueError):
+            return None
+        return (action, rule) if action in ACTIONS else None
+
+    def resume(self):
+        """重新排入上次結束時還沒到期的排程，已經過期的直接丟掉；回傳接回的數量。"""
+        saved = self.store.get("schedule") if self.store else None
+        recurrence = self._load_recurrence()
+        if not saved and recurrence is None:
+            return 0
+        now = time.time()
+        resumed = 0
+        for item in saved or ():
+            try:
+                action, deadline = item["action"], float(item["deadline"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if action not in ACTIONS or deadline <= now:
+                continue
+            if recurrence is not None and item.get("main"):
+                # 重複排程的主項目從規則重新算 (關機期間錯過的不補)
+                continue
+            # 倒數模式以剩餘秒數重新排入單調時鐘，指定時間模式照原本的牆上時鐘時間
+            if item.get("kind") == MONOTONIC:
+                entry = self._add(action, deadline - now, None)
+            else:
+                entry = self._add(action, None, deadline)
+            if item.get("main") and self.schedule is None:
+                self.schedule = entry
+            resumed += 1
+        if recurrence is not None:
+            action, rule = recurrence
+            try:
+                self.schedule = self._add(action, None, rule.next_after(now))
+                self.rule = rule
+                resumed += 1
+            except ValueError:
+                pass
+        self._persist()
+        self._notify("on_schedule_changed")
+        return resumed
+
+    def current_action(self):
+        schedule, record, watch, firing = self.schedule, self.handoff_record, self.watch, self.firing
+        if schedule is not None:
+            return schedule.action
+        if watch is not None:
+            return watch.action
+        if firing is not None:
+            return firing.action
+        return record["action"] if record else None
+
+    def remaining(self):
+        schedule, record = self.schedule, self.handoff_record
+        if schedule is not None:
+            return self.waiter.remaining(schedule)
+        return record["deadline"] - time.time() if record else None
+
+    def deadline_wall(self):
+        schedule, record = self.schedule, self.handoff_record
+        if schedule is not None:
+            return self.waiter.deadline_wall(schedule)
+        return record["deadline"] if record else None
+
+    def upcoming_actions(self, count=UPCOMING_COUNT):
+        return self.waiter.upcoming(count, main_only=True)
+
+    def describe(self):
+        schedule = self.schedule
+        result = {
+            "running": self.is_running,
+            "upcoming": [{"id": entry.id, "action": entry.action, "deadline": deadline}
+                         for entry, deadline in self.upcoming_actions()],
+        }
+        if schedule is not None:
+            result.update(id=schedule.id, action=schedule.action, remaining=self.waiter.remaining(schedule),
+                          deadline=self.waiter.deadline_wall(schedule))
+        elif self.handoff_record is not None:
+            result.update(action=self.current_action(), remaining=self.remaining(), deadline=self.deadline_wall(),
+                          handoff=True)
+        elif self.watch is not None:
+            watch = self.watch
+            result.update(action=watch.action, **watch.describe())
+        rule = self.rule
+        if rule is not None:
+            result["repeat"] = rule.text
+        firing = self.firing
+        if firing is not None:
+            result.update(action=firing.action, preparing=True)
+        if self.waiter.error is not None:
+            result["waiter_error"] = self.waiter.error
+        if self.last_hooks is not None:
+            result["last_hooks"] = [hook.as_dict() for hook in self.last_hooks]
+        last = self.last_result
+        if last is not None:
+            result["last_action"] = {
+                "action": last.action, "ok": last.ok, "error": last.error, "argv": last.argv,
+                "latency_ms": None if self.last_latency is None else self.last_latency * 1000,
+            }
+        return result
+
+    def handle_command(self, request):
+        # 控制通道的指令，在控制執行緒上執行
+        cmd = request["cmd"]
+        if cmd == "query":
+            return self.describe()
+        if cmd == "show":
+            if not hasattr(self.listener, "on_show"):
+                raise ValueError("常駐模式沒有視窗")
+            self._notify("on_show")
+            return {}
+        if cmd == "cancel":
+            entry_id = int(request["id"]) if "id" in request else None
+            if not self.cancel(entry_id) and entry_id is not None:
+                raise ValueError("找不到指定的排程")
+            return {}
+
+        action = request.get("action", "shutdown")
+        if action not in ACTIONS:
+            raise ValueError(f"未知的動作: {action}")
+        if cmd == "process":
+            watch = self.watch_process(action, request["target"])
+            return {"action": action, **watch.describe()}
+        if cmd == "idle":
+            thresholds = {key: _bounded(request[key], "閒置門檻", -math.inf, math.inf)
+                          for key in ("cpu", "disk", "net") if key in request}
+            if "interval" in request:
+                thresholds["interval"] = _bounded(request["interval"], "取樣間隔", high=3600)
+            watch = self.watch_idle(action, _bounded(request["minutes"], "閒置時間", high=MAX_IDLE_MINUTES),
+                                    **thresholds)
+            return {"action": action, **watch.describe()}
+        if cmd == "repeat":
+            if request.get("handoff") or request.get("add"):
+                raise ValueError("重複排程不能交給系統或加入佇列")
+            entry = self.arm(action, rule=parse_rule(request["rule"]))
+            return {"id": entry.id, "action": action, "deadline": self.waiter.deadline_wall(entry),
+                    "repeat": self.rule.text}
+        seconds = epoch = None
+        if cmd == "countdown":
+            seconds = _bounded(request["seconds"], "倒數時間")
+        elif isinstance(request["time"], str):
+            epoch = next_time_of_day(*parse_clock_time(request["time"])).timestamp()
+        else:
+            epoch = float(request["time"])
+            _bounded(epoch - time.time(), "指定時間", -math.inf)
+
+        if request.get("handoff"):
+            record = self.handoff(action, seconds, epoch)
+            return {"action": action, "deadline": record["deadline"], "handoff": True}
+        if request.get("add"):
+            entry = self.add(action, seconds, epoch)
+        else:
+            entry = self.arm(action, seconds, epoch)
+        return {"id": entry.id, "action": action, "deadline": self.waiter.deadline_wall(entry)}
+
+    def on_clock_event(self, kind, seconds):
+        self._notify("on_clock_event", kind, seconds)
+
+    def on_deadline(self, entry, deadline):
+        # 在等待執行緒上直接執行動作
+        if entry.action == "warning":
+            parent = self.waiter.get(entry.parent)
+            if parent is not None:
+                self._notify("on_warning", entry, parent)
+            return
+        if entry.action == "prepare":
+            # 準備工作在背景的執行緒池裡跑，不佔用等待執行緒
+            if self.waiter.get(entry.parent) is not None and self.hooks is not None:
+                self.hook_runs[entry.parent] = self.hooks.start()
+            return
+        if self.schedule is not None and entry.id == self.schedule.id:
+            self.schedule = None
+            if self.rule is not None:
+                self._rearm(entry, deadline)
+        self._fire(entry, deadline)
+
+    def _rearm(self, entry, deadline):
+        # 重複排程：執行前先排好下一次，關機的話存檔裡也已經是下一次；睡眠太久錯過的幾次直接跳過
+        try:
+            self.schedule = self._add(entry.action, None, self.rule.next_after(max(deadline, time.time())))
+        except ValueError:
+            self.rule = None
+
+    def on_watch_fired(self, watch, when):
+        # 在程序等待或閒置取樣執行緒上執行；when 是條件成立 (程序結束或判定閒置) 的 epoch 秒數
+        if self.watch is not watch:
+            return
+        self.watch = None
+        self._fire(watch, when)
+
+    def _fire(self, entry, deadline):
+        # 有 hooks (HookPipeline) 時，關機與重新開機在期限前 hooks.lead 秒就由 "prepare" 子項目開始準備工作，
+        # 到期時等準備工作做完 (或總時限用完) 才執行；交給系統的排程不會執行準備工作
+        if self.hooks is not None and entry.action in HOOK_ACTIONS:
+            key = getattr(entry, "id", entry)
+            # 來不及提前開始 (排程太近、等程序結束或閒置) 的就現在開始
+            run = self.hook_runs.get(key)
+            if run is None:
+                run = self.hook_runs[key] = self.hooks.start()
+            self.firing = entry
+            if not run.done():
+                # 還沒做完時交給另一個執行緒等，等待執行緒馬上回去處理其他項目與預告
+                threading.Thread(target=self._fire_after_hooks, args=(entry, deadline, key, run),
+                                 name="HookWait", daemon=True).start()
+                return
+            self._fire_after_hooks(entry, deadline, key, run)
+            return
+        self._execute(entry, deadline)
+
+    def _fire_after_hooks(self, entry, deadline, key, run):
+        # 等準備工作全部完成或總時限用完才執行；等待期間被取消 (_cancel_entry 會取消 run) 就不執行
+        try:
+            results = run.wait()
+        finally:
+            if self.firing is entry:
+                self.firing = None
+            self.hook_runs.pop(key, None)
+        self.last_hooks = results
+        self._notify("on_hooks_finished", entry, results)
+        if run.cancelled:
+            self._notify("on_schedule_changed")
+            return
+        self._execute(entry, deadline)
+
+    def _execute(self, entry, deadline):
+        if self.store is not None:
+            # 關機後行程就沒了，執行前先把排程狀態寫進磁碟，免得開機後又接回同一個排程
+            self._persist()
+            try:
+                self.store.flush()
+            except OSError:
+                pass
+        result = self.execute(entry.action)
+        self.last_result = result
+        self.last_latency = None if result.issued is None else result.issued - deadline
+        if self.last_latency is not None:
+            self.diagnostics.record(DEADLINE_LATENCY, self.last_latency)
+        if self.history is not None:
+            self._log(FIRED, entry.action, self._trigger(entry), self.last_latency, result.ok)
+            # 關機時程式隨時會被結束，這一筆直接寫進檔案 (這裡是等待或準備工作的執行緒，不是視窗的執行緒)
+            try:
+                self.history.flush()
+            except OSError:
+                pass
+        self._notify("on_schedule_changed")
+        self._notify("on_action_fired", entry, result)
+
+    def execute(self, action):
+        return self.backend.run(action)
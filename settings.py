@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+
+from write_behind import WriteBehind
+
+# --- 設定區 ---
+APP_NAME = "自動關機"
+PORT_ID = 53117
+CONFIG_DIR = os.path.join(os.environ.get('APPDATA') or os.path.join(os.path.expanduser("~"), ".config"),
+                          "AutoShutdown")
+CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+HISTORY_FILE = os.path.join(CONFIG_DIR, "history.bin")
+ICON_FILENAME = "icon.ico"
+
+# 排程動作的顯示名稱；實際執行的指令在 backends.py
+ACTIONS = {
+    "shutdown": "關機",
+    "reboot": "重新開機",
+    "sleep": "睡眠",
+    "hibernate": "休眠",
+}
+# 在期限前幾秒跳出預告 (T-10 分、T-1 分)
+WARNING_LEADS = (600, 60)
+# 狀態列與系統列選單顯示的排程數量
+UPCOMING_COUNT = 3
+# 連續的設定變更在這段時間 (秒) 內合併成一次寫入
+WRITE_DELAY = 0.5
+
+DEFAULT_CONFIG = {"mode": 1, "cd_h": "0", "cd_m": "0", "sp_h": "0", "sp_m": "0", "sp_repeat": "", "proc": "",
+                  "idle_m": "10", "skip_warning": False}
+
+
+def resource_path(relative_path):
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+class ConfigStore(WriteBehind):
+    """設定與排程狀態。建構時讀取一次；寫入交給背景執行緒，連續的變更合併成一次寫入，
+    並以暫存檔加 os.replace 原子地取代舊檔，寫到一半當掉也不會留下壞掉的設定檔。
+    """
+
+    def __init__(self, path=CONFIG_FILE, delay=WRITE_DELAY):
+        self.path = path
+        self.data = self._load()
+        self.writes = 0
+        self._dirty = False
+        super().__init__(delay, "ConfigStore")
+
+    def _load(self):
+        data = dict(DEFAULT_CONFIG)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                data.update(loaded)
+        except (OSError, ValueError):
+            pass
+        return data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def update(self, **changes):
+        # 可從任何執行緒呼叫，立即返回；實際寫入在 delay 秒後由背景執行緒完成
+        with self._cond:
+            self.data.update(changes)
+            self._dirty = True
+            self._changed()
+
+    def _has_changes(self):
+        return self._dirty
+
+    def _take(self):
+        self._dirty = False
+        return json.dumps(self.data, ensure_ascii=False, indent=4)
+
+    def _restore(self, text):
+        # 寫入失敗就保留變更，背景執行緒下一輪再試 (期間又有變更時寫的是較新的內容)
+        self._dirty = True
+
+    def _write(self, text):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.writes += 1
@@ -0,0 +1,162 @@
+import json
+import socket
+import time
+import unittest
+
+from control import ControlServer, bind_control_socket, parse_clock_time, parse_duration, send_command
+from backends import DryRunBackend
+from main import check_single_instance
+from service import ScheduleService
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("90"), 5400)
+        self.assertEqual(parse_duration("1h30m"), 5400)
+        self.assertEqual(parse_duration("45s"), 45)
+        for text in ("", "1x", "h"):
+            with self.assertRaises(ValueError):
+                parse_duration(text)
+
+    def test_parse_clock_time(self):
+        self.assertEqual(parse_clock_time(" 03:05 "), (3, 5))
+        for text in ("24:00", "3", "a:b"):
+            with self.assertRaises(ValueError):
+                parse_clock_time(text)
+
+
+class DispatchTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.server = ControlServer([], self.handle, token="secret")
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request["cmd"] == "cancel":
+            raise ValueError("找不到指定的排程")
+        return {"running": False}
+
+    def test_ok_response(self):
+        self.assertEqual(self.server.dispatch(b'{"cmd": "query"}\n'), {"ok": True, "running": False})
+        self.assertEqual(self.requests, [{"cmd": "query"}])
+
+    def test_errors(self):
+        self.assertFalse(self.server.dispatch(b"not json")["ok"])
+        self.assertEqual(self.server.dispatch(b'{"cmd": "format"}'), {"ok": False, "error": "未知的指令"})
+        self.assertEqual(self.server.dispatch(b'["query"]'), {"ok": False, "error": "未知的指令"})
+        self.assertEqual(self.server.dispatch(b'{"cmd": "cancel", "id": 3}'),
+                         {"ok": False, "error": "找不到指定的排程"})
+
+    def test_token_required_when_untrusted(self):
+        self.assertEqual(self.server.dispatch(b'{"cmd": "query"}', trusted=False), {"ok": False, "error": "驗證失敗"})
+        self.assertEqual(self.server.dispatch(b'{"cmd": "query", "token": "wrong"}', trusted=False)["ok"], False)
+        self.assertTrue(self.server.dispatch(b'{"cmd": "query", "token": "secret"}', trusted=False)["ok"])
+        # token 不會傳給 handler
+        self.assertEqual(self.requests, [{"cmd": "query"}])
+
+
+class CommandRangeTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = DryRunBackend()
+        self.service = ScheduleService(backend=self.backend)
+        self.server = ControlServer([], self.service.handle_command)
+
+    def tearDown(self):
+        self.service.cancel()
+
+    def test_non_finite_and_far_times_are_rejected(self):
+        for line in (b'{"cmd": "countdown", "seconds": "nan"}', b'{"cmd": "countdown", "seconds": NaN}',
+                     b'{"cmd": "countdown", "seconds": "inf"}', b'{"cmd": "countdown", "seconds": 0}',
+                     b'{"cmd": "at", "time": 1e19}', b'{"cmd": "at", "time": -Infinity}',
+                     b'{"cmd": "idle", "minutes": "inf"}', b'{"cmd": "idle", "minutes": 10, "interval": 0}',
+                     b'{"cmd": "idle", "minutes": 10, "cpu": NaN}'):
+            response = self.server.dispatch(line)
+            self.assertFalse(response["ok"], line)
+        self.assertFalse(self.service.is_running)
+        self.assertEqual(self.backend.calls, [])
+        # 等待執行緒還活著，之後的排程照常
+        self.assertTrue(self.server.dispatch(b'{"cmd": "countdown", "seconds": 0.05, "action": "sleep"}')["ok"])
+        for _ in range(100):
+            if self.backend.calls:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(self.backend.calls), 1)
+
+
+class LoopbackTest(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.sock = bind_control_socket(0)
+        self.port = self.sock.getsockname()[1]
+        self.server = ControlServer([self.sock], self.handle)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def handle(self, request):
+        self.requests.append(request)
+        return {"echo": request["cmd"]}
+
+    def test_send_command(self):
+        self.assertEqual(send_command({"cmd": "query"}, self.port), {"ok": True, "echo": "query"})
+
+    def test_many_commands_on_one_connection(self):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=2) as sock:
+            sock.sendall(b'{"cmd": "query"}\n{"cmd": "show"}\n{"cmd": "nope"}\n')
+            with sock.makefile("rb") as stream:
+                responses = [json.loads(stream.readline()) for _ in range(3)]
+            sock.sendall(b'{"cmd": "cancel"}\n')
+            with sock.makefile("rb") as stream:
+                responses.append(json.loads(stream.readline()))
+        self.assertEqual(responses, [{"ok": True, "echo": "query"}, {"ok": True, "echo": "show"},
+                                     {"ok": False, "error": "未知的指令"}, {"ok": True, "echo": "cancel"}])
+        self.assertEqual([request["cmd"] for request in self.requests], ["query", "show", "cancel"])
+
+    def test_second_bind_fails(self):
+        with self.assertRaises(OSError):
+            bind_control_socket(self.port)
+
+
+class SingleInstanceTest(unittest.TestCase):
+    def setUp(self):
+        probe = bind_control_socket(0)
+        self.port = probe.getsockname()[1]
+        probe.close()
+        self.requests = []
+
+    def handle(self, request):
+        self.requests.append(request)
+        return {"running": True}
+
+    def test_lock_held_with_extra_listen_address(self):
+        sockets = check_single_instance({"cmd": "query"}, self.port, "127.0.0.2")
+        server = ControlServer(sockets, self.handle)
+        server.start()
+        try:
+            self.assertEqual([sock.getsockname() for sock in sockets],
+                             [("127.0.0.1", self.port), ("127.0.0.2", self.port)])
+            # 第二個執行個體不論聽哪個位址都拿不到鎖，指令轉送給第一個
+            for listen in ("127.0.0.1", "127.0.0.2", "127.0.0.3", "0.0.0.0"):
+                with self.assertRaises(SystemExit) as raised:
+                    check_single_instance(None, self.port, listen)
+                self.assertEqual(raised.exception.code, 0)
+            self.assertEqual(send_command({"cmd": "query"}, self.port, "127.0.0.2"), {"ok": True, "running": True})
+            self.assertEqual(len(self.requests), 5)
+        finally:
+            server.stop()
+            for sock in sockets:
+                sock.close()
+
+    def test_wildcard_is_the_lock(self):
+        sockets = check_single_instance({"cmd": "query"}, self.port, "0.0.0.0")
+        try:
+            self.assertEqual(len(sockets), 1)
+            with self.assertRaises(OSError):
+                bind_control_socket(self.port)
+        finally:
+            sockets[0].close()
+
+
+if __name__ == "__main__":
+    unittest.main()
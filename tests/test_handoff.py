@@ -0,0 +1,132 @@
+import os
+import tempfile
+import time
+import unittest
+
+from backends import DryRunBackend, FakeRunner, OsTimer
+from history import CANCELLED, HistoryLog, HistoryReader
+from service import ScheduleService
+from settings import ConfigStore
+
+
+class OsTimerTest(unittest.TestCase):
+    def test_linux_argv_rounds_up_to_minutes(self):
+        timer = OsTimer(FakeRunner(), windows=False, clock=lambda: 1000.0)
+        self.assertEqual(timer.arm_argv("shutdown", 1000.0 + 3 * 3600), ["shutdown", "-h", "+180"])
+        self.assertEqual(timer.arm_argv("reboot", 1000.0 + 61), ["shutdown", "-r", "+2"])
+        self.assertEqual(timer.arm_argv("shutdown", 900.0), ["shutdown", "-h", "+0"])
+        self.assertEqual(timer.cancel_argv(), ["shutdown", "-c"])
+
+    def test_windows_argv_uses_seconds(self):
+        timer = OsTimer(FakeRunner(), windows=True, clock=lambda: 1000.0)
+        self.assertEqual(timer.arm_argv("shutdown", 1090.5), ["shutdown", "/s", "/f", "/t", "91"])
+        self.assertEqual(timer.arm_argv("reboot", 1000.0 + 1e10), ["shutdown", "/r", "/f", "/t", "315360000"])
+        self.assertEqual(timer.cancel_argv(), ["shutdown", "/a"])
+
+    def test_arm_runs_command(self):
+        runner = FakeRunner(returncode=1, output="權限不足")
+        timer = OsTimer(runner, windows=False, clock=lambda: 0.0)
+        result = timer.arm("shutdown", 120)
+        self.assertEqual(runner.calls, [["shutdown", "-h", "+2"]])
+        self.assertFalse(result.ok)
+        self.assertEqual(result.error, "權限不足")
+        with self.assertRaises(ValueError):
+            timer.arm("sleep", 120)
+        self.assertEqual(len(runner.calls), 1)
+
+
+class HandoffTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "config.json")
+        self.runner = FakeRunner()
+        self.history = HistoryLog(os.path.join(self.tmp.name, "history.bin"), delay=60)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def service(self, runner=None, history=None, active=True):
+        store = ConfigStore(self.path, delay=60)
+        return ScheduleService(store=store, backend=DryRunBackend(), history=history, active=active,
+                               os_timer=OsTimer(runner or self.runner, windows=False))
+
+    def cli(self, command):
+        # 跟 main.run_once 一樣：接回存檔的排程但不等待，做完一個指令就存檔
+        service = self.service(history=self.history, active=False)
+        service.resume()
+        response = service.handle_command(command)
+        service.store.flush()
+        return service, response
+
+    def test_handoff_record_survives_restart(self):
+        service = self.service()
+        service.arm("reboot", seconds=600)
+        record = service.handoff("shutdown", seconds=3600)
+        self.assertEqual(record["action"], "shutdown")
+        self.assertEqual(record["argv"], ["shutdown", "-h", "+60"])
+        self.assertIsNone(service.schedule)
+        self.assertEqual(len(service.waiter.core), 0)
+        described = service.describe()
+        self.assertTrue(described["handoff"])
+        self.assertEqual(described["action"], "shutdown")
+
+        # handoff() 已經寫進磁碟，重新啟動後查得到，也取消得了
+        restarted = self.service()
+        self.assertEqual(restarted.handoff_record, record)
+        self.assertTrue(restarted.is_running)
+        self.assertTrue(restarted.cancel())
+        self.assertEqual(self.runner.calls[-1], ["shutdown", "-c"])
+        self.assertIsNone(restarted.handoff_record)
+        restarted.store.flush()
+        self.assertIsNone(self.service().handoff_record)
+
+    def test_handoff_failure_keeps_schedule(self):
+        service = self.service(FakeRunner(returncode=1, output="權限不足"))
+        entry = service.arm("shutdown", seconds=600)
+        with self.assertRaises(ValueError):
+            service.handoff("shutdown", seconds=3600)
+        self.assertIs(service.schedule, entry)
+        self.assertIsNone(service.handoff_record)
+        with self.assertRaises(ValueError):
+            service.handoff("sleep", seconds=3600)
+
+    def test_expired_record_is_dropped(self):
+        store = ConfigStore(self.path, delay=60)
+        store.update(handoff={"action": "shutdown", "deadline": time.time() - 1, "argv": []})
+        store.flush()
+        self.assertIsNone(self.service().handoff_record)
+
+    def queue(self):
+        service = self.service()
+        service.arm("shutdown", seconds=7200)
+        service.add("reboot", seconds=18000)
+        service.store.flush()
+
+    def test_cli_handoff_keeps_queue(self):
+        self.queue()
+        self.cli({"cmd": "countdown", "seconds": 3600, "action": "shutdown", "handoff": True})
+        saved = ConfigStore(self.path).get("schedule")
+        self.assertEqual([(item["action"], item["main"]) for item in saved], [("reboot", False)])
+        restarted = self.service()
+        self.assertEqual(restarted.resume(), 1)
+        self.assertEqual([entry.action for entry, _ in restarted.upcoming_actions()], ["reboot"])
+        self.assertIsNotNone(restarted.handoff_record)
+
+    def test_cli_status_and_cancel_match_running_instance(self):
+        self.queue()
+        service, status = self.cli({"cmd": "query"})
+        self.assertTrue(status["running"])
+        self.assertEqual(status["action"], "shutdown")
+        self.assertEqual([item["action"] for item in status["upcoming"]], ["shutdown", "reboot"])
+        # 等待執行緒沒有啟動，不會在命令列裡執行到期的動作
+        self.assertIsNone(service.waiter._thread)
+
+        self.cli({"cmd": "cancel"})
+        saved = ConfigStore(self.path).get("schedule")
+        self.assertEqual([(item["action"], item["main"]) for item in saved], [("reboot", False)])
+        self.history.flush()
+        self.assertEqual([record[1] for record in HistoryReader(self.history.path).records()], [CANCELLED])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import sys
+import threading
+import time
+import unittest
+
+from backends import DryRunBackend
+from hooks import HookPipeline, HookRun
+from service import ScheduleService
+
+
+def sleeper(seconds, timeout=30):
+    return {"type": "command", "argv": [sys.executable, "-c", f"import time; time.sleep({seconds})"],
+            "timeout": timeout}
+
+
+class Listener:
+    def __init__(self):
+        self.fired = []
+        self.hooks = threading.Event()
+        self.event = threading.Event()
+
+    def on_hooks_finished(self, entry, results):
+        self.hooks.set()
+
+    def on_action_fired(self, entry, result):
+        self.fired.append((entry.action, time.time()))
+        self.event.set()
+
+
+class HookRunTest(unittest.TestCase):
+    def test_timeout_and_budget(self):
+        results = HookRun([sleeper(0), sleeper(30, timeout=0.2)], workers=2, budget=10).wait()
+        self.assertTrue(results[0].ok)
+        self.assertEqual(results[1].error, "逾時 (0.2 秒)")
+        start = time.monotonic()
+        run = HookRun([sleeper(30)], workers=1, budget=0.3)
+        [result] = run.wait()
+        run.cancel()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertIn("超過總時限", result.error)
+
+    def test_cancel_returns_promptly(self):
+        run = HookRun([sleeper(30)], workers=1, budget=30)
+        threading.Timer(0.2, run.cancel).start()
+        start = time.monotonic()
+        [result] = run.wait()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(result.error, "已取消")
+
+
+class ServiceHooksTest(unittest.TestCase):
+    def test_hooks_do_not_block_other_entries(self):
+        listener = Listener()
+        backend = DryRunBackend()
+        service = ScheduleService(listener, backend=backend, hooks=HookPipeline([sleeper(3)], lead=0))
+        start = time.time()
+        service.arm("shutdown", seconds=0.2)
+        service.add("sleep", seconds=1.0)
+        self.assertTrue(listener.event.wait(5))
+        # 關機還在等準備工作，排在後面的睡眠照常準時執行
+        self.assertEqual(listener.fired[0][0], "sleep")
+        self.assertLess(listener.fired[0][1] - start, 2.0)
+        self.assertTrue(service.is_running)
+        self.assertTrue(service.describe()["preparing"])
+        service.cancel()
+        self.assertTrue(listener.hooks.wait(5))
+        time.sleep(0.1)
+        self.assertEqual([action for action, _ in backend.calls], ["sleep"])
+        self.assertFalse(service.is_running)
+
+    def test_action_runs_after_hooks(self):
+        listener = Listener()
+        backend = DryRunBackend()
+        service = ScheduleService(listener, backend=backend, hooks=HookPipeline([sleeper(0.3)], lead=0))
+        service.arm("reboot", seconds=0.1)
+        self.assertTrue(listener.event.wait(5))
+        self.assertEqual([action for action, _ in backend.calls], ["reboot"])
+        self.assertTrue(all(hook.ok for hook in service.last_hooks))
+        self.assertIsNone(service.firing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from backends import DryRunBackend
+from process_watch import PollingHandle, ProcessWatch, open_process_handle
+from service import ScheduleService
+
+# 程序結束到 callback 被呼叫的上限 (秒)；核心直接喚醒，實際上只要幾毫秒
+FIRE_BOUND = 2.0
+
+
+def spawn_sleeper():
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+
+class ProcessWatchTest(unittest.TestCase):
+    def setUp(self):
+        self.child = spawn_sleeper()
+        self.fired = threading.Event()
+        self.calls = []
+
+    def tearDown(self):
+        if self.child.poll() is None:
+            self.child.kill()
+        self.child.wait()
+
+    def callback(self, watch, exited):
+        self.calls.append((watch, exited))
+        self.fired.set()
+
+    def test_fires_when_child_is_killed(self):
+        watch = ProcessWatch("shutdown", self.child.pid, "sleeper", self.callback).start()
+        self.assertFalse(self.fired.wait(0.2))
+        killed = time.time()
+        self.child.kill()
+        self.child.wait()
+        self.assertTrue(self.fired.wait(FIRE_BOUND))
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(self.calls[0][0], watch)
+        self.assertLess(self.calls[0][1] - killed, FIRE_BOUND)
+
+    def test_cancel_suppresses_callback(self):
+        watch = ProcessWatch("shutdown", self.child.pid, "sleeper", self.callback).start()
+        watch.cancel()
+        watch._thread.join(FIRE_BOUND)
+        self.assertFalse(watch._thread.is_alive())
+        self.child.kill()
+        self.child.wait()
+        self.assertFalse(self.fired.wait(0.3))
+        self.assertEqual(self.calls, [])
+        # 已經結束的 watch 再取消也不會出錯
+        watch.cancel()
+
+    def test_polling_fallback(self):
+        handle = PollingHandle(self.child.pid, interval=0.05)
+        ProcessWatch("shutdown", self.child.pid, "sleeper", self.callback, handle=handle).start()
+        self.child.kill()
+        self.child.wait()
+        self.assertTrue(self.fired.wait(FIRE_BOUND))
+
+    def test_missing_process(self):
+        self.child.kill()
+        self.child.wait()
+        with self.assertRaises(ProcessLookupError):
+            open_process_handle(self.child.pid)
+        with self.assertRaises(ProcessLookupError):
+            PollingHandle(self.child.pid)
+
+
+class ServiceWatchTest(unittest.TestCase):
+    def test_action_fires_after_exit(self):
+        child = spawn_sleeper()
+        fired = threading.Event()
+
+        class Listener:
+            def on_action_fired(self, entry, result):
+                fired.set()
+
+        backend = DryRunBackend()
+        service = ScheduleService(Listener(), backend=backend)
+        try:
+            service.watch_process("reboot", child.pid)
+            self.assertTrue(service.is_running)
+            self.assertEqual(service.describe()["process"]["pid"], child.pid)
+        finally:
+            child.kill()
+            child.wait()
+        self.assertTrue(fired.wait(FIRE_BOUND))
+        self.assertEqual([action for action, _ in backend.calls], ["reboot"])
+        self.assertFalse(service.is_running)
+
+    def test_cancel_before_exit(self):
+        child = spawn_sleeper()
+        backend = DryRunBackend()
+        service = ScheduleService(backend=backend)
+        try:
+            watch = service.watch_process("shutdown", child.pid)
+            self.assertTrue(service.cancel())
+        finally:
+            child.kill()
+            child.wait()
+        watch._thread.join(FIRE_BOUND)
+        self.assertEqual(backend.calls, [])
+
+    def test_unknown_pid(self):
+        child = spawn_sleeper()
+        child.kill()
+        child.wait()
+        with self.assertRaises(ValueError):
+            ScheduleService(backend=DryRunBackend()).watch_process("shutdown", child.pid)
+
+
+if __name__ == "__main__":
+    unittest.main()
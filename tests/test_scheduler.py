@@ -0,0 +1,201 @@
+import contextlib
+import io
+import threading
+import unittest
+
+from scheduler import MONOTONIC, WALL, ConditionTimer, DeadlineWaiter, FakeClock, SchedulerCore, WaitableTimer
+
+
+class SchedulerCoreTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.core = SchedulerCore(self.clock)
+
+    def test_countdown_counts_suspended_time(self):
+        entry = self.core.add_countdown("shutdown", 600)
+        self.clock.advance(100)
+        self.assertEqual(self.core.remaining(entry), 500)
+        # 睡眠的時間也算在倒數裡
+        self.clock.suspend(200)
+        self.assertEqual(self.core.remaining(entry), 300)
+
+    def test_countdown_ignores_clock_jump(self):
+        entry = self.core.add_countdown("shutdown", 600)
+        before = self.core.deadline_wall(entry)
+        self.clock.jump(3600)
+        self.assertEqual(self.core.remaining(entry), 600)
+        self.assertEqual(self.core.deadline_wall(entry), before + 3600)
+
+    def test_wall_deadline_follows_clock_jump(self):
+        epoch = self.clock.wall() + 600
+        entry = self.core.add_at("reboot", epoch)
+        self.clock.jump(500)
+        self.assertEqual(self.core.deadline_wall(entry), epoch)
+        self.assertEqual(self.core.remaining(entry), 100)
+        self.clock.jump(200)
+        self.assertEqual([due.id for due in self.core.pop_due()], [entry.id])
+
+    def test_observe_reports_suspend_and_jump(self):
+        events = []
+        core = SchedulerCore(self.clock, on_event=lambda kind, seconds: events.append((kind, seconds)))
+        self.clock.advance(30)
+        self.assertEqual(core.observe(), [])
+        self.clock.suspend(120)
+        self.assertEqual(core.observe(), [("suspend", 120)])
+        self.clock.jump(-90)
+        self.assertEqual(core.observe(), [("clock_jump", -90)])
+        # 誤差在容許範圍內的不算
+        self.clock.jump(1)
+        self.assertEqual(core.observe(), [])
+        self.assertEqual(events, [("suspend", 120), ("clock_jump", -90)])
+
+    def test_cancel_removes_children(self):
+        entry = self.core.add_countdown("shutdown", 600, warnings=(300, 60, (30, "prepare")))
+        self.assertEqual(len(self.core), 4)
+        self.assertEqual(sorted(self.core.entries[child].action for child in self.core.children[entry.id]),
+                         ["prepare", "warning", "warning"])
+        self.assertTrue(self.core.cancel(entry.id))
+        self.assertEqual(len(self.core), 0)
+        self.assertEqual(self.core.children, {})
+        self.assertEqual(self.core.targets(), {})
+        self.assertFalse(self.core.cancel(entry.id))
+
+    def test_cancel_child_keeps_parent(self):
+        entry = self.core.add_countdown("shutdown", 600, warnings=(300,))
+        child_id = self.core.children[entry.id][0]
+        self.assertTrue(self.core.cancel(child_id))
+        self.assertIn(entry.id, self.core.entries)
+        self.assertEqual(self.core.children[entry.id], [])
+
+    def test_late_warnings_are_skipped(self):
+        self.core.add_countdown("shutdown", 100, warnings=(300, 60))
+        self.assertEqual(sorted(entry.action for entry in self.core.entries.values()), ["shutdown", "warning"])
+
+    def test_pop_due_order(self):
+        now = self.clock.wall()
+        late = self.core.add_countdown("sleep", 50)
+        early = self.core.add_at("reboot", now + 20)
+        main = self.core.add_countdown("shutdown", 40, warnings=(30,))
+        self.core.add_countdown("hibernate", 500)
+        self.clock.advance(60)
+        due = self.core.pop_due()
+        # 預告排在主項目之前，同一類依牆上時鐘期限先後，兩個堆積的項目交錯排列
+        self.assertEqual([(entry.action, entry.parent) for entry in due],
+                         [("warning", main.id), ("reboot", None), ("shutdown", None), ("sleep", None)])
+        self.assertEqual(due[1].id, early.id)
+        self.assertEqual(due[3].id, late.id)
+        self.assertEqual(len(self.core), 1)
+        self.assertEqual(self.core.pop_due(), [])
+
+    def test_next_entry_across_heaps(self):
+        self.core.add_countdown("shutdown", 300)
+        entry = self.core.add_at("reboot", self.clock.wall() + 200)
+        self.assertIs(self.core.next_entry(), entry)
+        self.assertEqual(set(self.core.targets()), {MONOTONIC, WALL})
+
+    def test_upcoming_skips_children(self):
+        entries = [self.core.add_countdown("reboot", 1000 + i, warnings=(300, 60, (30, "prepare")))
+                   for i in range(6)]
+        self.assertEqual([entry.id for entry in self.core.upcoming(3, main_only=True)],
+                         [entry.id for entry in entries[:3]])
+        self.assertTrue(all(entry.parent is not None for entry in self.core.upcoming(3)))
+
+    def test_heap_invariant_after_random_cancels(self):
+        import random
+        rng = random.Random(4)
+        ids = [self.core.add_countdown("sleep", rng.uniform(1, 1000)).id for _ in range(200)]
+        for entry_id in rng.sample(ids, 120):
+            self.core.cancel(entry_id)
+        self.clock.advance(2000)
+        due = self.core.pop_due()
+        self.assertEqual(len(due), 80)
+        deadlines = [entry.target for entry in due]
+        self.assertEqual(deadlines, sorted(deadlines))
+
+
+class FakeKernel32:
+    """模擬手動重設的可等待計時器：觸發後一直有訊號，CancelWaitableTimer 清不掉，SetWaitableTimer 才會重設。"""
+
+    def __init__(self):
+        self.signaled = {}
+        self.armed = []
+
+    def SetWaitableTimer(self, handle, due, period, routine, arg, resume):
+        self.signaled[handle] = False
+        self.armed.append(handle)
+
+    def CancelWaitableTimer(self, handle):
+        self.armed.remove(handle)
+
+    def WaitForMultipleObjects(self, count, handles, wait_all, timeout):
+        handles = list(handles[:count])
+        for index, handle in enumerate(handles):
+            if self.signaled.get(handle):
+                return index
+        # 沒有東西有訊號時，讓這一輪設定的第一個計時器到期
+        handle = self.armed[0]
+        self.signaled[handle] = True
+        return handles.index(handle)
+
+
+class WaitableTimerTest(unittest.TestCase):
+    def setUp(self):
+        self.kernel32 = FakeKernel32()
+        self.timer = WaitableTimer.__new__(WaitableTimer)
+        self.timer.clock = FakeClock()
+        self.timer._kernel32 = self.kernel32
+        self.timer._timers = {MONOTONIC: 11, WALL: 12}
+        self.timer._event = 10
+
+    def wait(self, targets):
+        waits = []
+        wait_for = self.kernel32.WaitForMultipleObjects
+        self.kernel32.WaitForMultipleObjects = lambda *args: waits.append(wait_for(*args))
+        try:
+            self.timer.wait(targets)
+        finally:
+            del self.kernel32.WaitForMultipleObjects
+        return waits[0]
+
+    def test_fired_kind_absent_from_targets_is_not_waited_on(self):
+        self.wait({MONOTONIC: self.timer.clock.monotonic() + 10})
+        self.assertTrue(self.kernel32.signaled[11])
+        # 倒數的計時器還有訊號，只剩指定時間的項目時不能因為它而立刻返回
+        self.assertEqual(self.wait({WALL: self.timer.clock.wall() + 10}), 1)
+        self.assertTrue(self.kernel32.signaled[12])
+        self.assertEqual(self.kernel32.armed, [])
+
+
+class BrokenTimer:
+    def wait(self, targets):
+        raise OverflowError("timestamp too large")
+
+    def wake(self):
+        pass
+
+
+class DeadlineWaiterTest(unittest.TestCase):
+    def test_errors_do_not_stop_the_thread(self):
+        fired = []
+        done = threading.Event()
+
+        def callback(entry, deadline):
+            fired.append(entry.action)
+            if entry.action == "reboot":
+                raise RuntimeError("boom")
+            done.set()
+
+        waiter = DeadlineWaiter(callback, timer=BrokenTimer())
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            waiter.add_countdown("reboot", 0.05)
+            waiter.add_countdown("sleep", 0.1)
+            self.assertTrue(done.wait(5))
+        # 計時器出錯後改用 ConditionTimer，callback 的例外也只記下來
+        self.assertEqual(fired, ["reboot", "sleep"])
+        self.assertIsInstance(waiter.timer, ConditionTimer)
+        self.assertEqual(waiter.error, "RuntimeError: boom")
+        self.assertIn("OverflowError", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from history import HistoryLog, HistoryReader, FIRED
+from settings import ConfigStore
+
+
+class ConfigStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "config.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_updates_coalesce_into_one_write(self):
+        store = ConfigStore(self.path, delay=60)
+        for i in range(100):
+            store.update(cd_m=str(i))
+        self.assertTrue(store.flush())
+        self.assertFalse(store.flush())
+        self.assertEqual(store.writes, 1)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["cd_m"], "99")
+        self.assertEqual(ConfigStore(self.path).get("cd_m"), "99")
+
+    def test_failed_write_is_retried(self):
+        blocker = os.path.join(self.tmp.name, "file")
+        with open(blocker, "w"):
+            pass
+        # 上層目錄其實是一個檔案，寫不進去
+        store = ConfigStore(os.path.join(blocker, "config.json"), delay=60)
+        store.update(mode=2)
+        with self.assertRaises(OSError):
+            store.flush()
+        os.remove(blocker)
+        self.assertTrue(store.flush())
+        self.assertEqual(ConfigStore(store.path).get("mode"), 2)
+
+    def test_exit_flush_reports_instead_of_raising(self):
+        blocker = os.path.join(self.tmp.name, "file")
+        with open(blocker, "w"):
+            pass
+        store = ConfigStore(os.path.join(blocker, "config.json"), delay=60)
+        store.update(mode=3)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            store._flush_at_exit()
+        self.assertIn("ConfigStore 寫入失敗", stderr.getvalue())
+
+
+class HistoryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "history.bin")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records_are_batched(self):
+        log = HistoryLog(self.path, delay=60, clock=lambda: 1_700_000_000.0)
+        for _ in range(10):
+            log.record(FIRED, "shutdown", "countdown", 0.01)
+        self.assertTrue(log.flush())
+        self.assertFalse(log.flush())
+        self.assertEqual(log.writes, 1)
+        records = list(HistoryReader(self.path).records())
+        self.assertEqual(len(records), 10)
+        self.assertEqual(records[0][1:5], (FIRED, "shutdown", "countdown", True))
+
+    def test_failed_write_keeps_order(self):
+        blocker = os.path.join(self.tmp.name, "file")
+        with open(blocker, "w"):
+            pass
+        clock = iter(range(1, 100)).__next__
+        log = HistoryLog(os.path.join(blocker, "history.bin"), delay=60, clock=clock)
+        log.record(FIRED, "shutdown")
+        with self.assertRaises(OSError):
+            log.flush()
+        log.record(FIRED, "reboot")
+        os.remove(blocker)
+        self.assertTrue(log.flush())
+        self.assertEqual([record[2] for record in HistoryReader(log.path).records()], ["shutdown", "reboot"])
+
+
+if __name__ == "__main__":
+    unittest.main()
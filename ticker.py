@@ -0,0 +1,95 @@
+import collections
+import math
+import time
+
+
+class TickScheduler:
+    """對齊牆上時鐘整秒 (或整分) 喚醒的排程器，取代固定 100 ms 的 after() 輪詢。
+
+    callback(now) 回傳下一次希望的更新週期 (秒)，deadline_fn() 回傳期限的 epoch 秒數或 None；
+    期限早於下一個對齊點時會直接在期限當下喚醒。on_jitter(秒數) 在每次喚醒時收到喚醒誤差。
+    """
+
+    def __init__(self, after, after_cancel, callback, deadline_fn=None, clock=time.time, on_jitter=None):
+        self.after = after
+        self.after_cancel = after_cancel
+        self.callback = callback
+        self.deadline_fn = deadline_fn or (lambda: None)
+        self.clock = clock
+        self.on_jitter = on_jitter
+        self.period = 1
+        self._job = None
+        self._intended = None
+        self.stats = TickStats()
+
+    def start(self):
+        self.poke()
+
+    def stop(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        self._intended = None
+
+    def poke(self):
+        """立即執行一次更新並重新排程 (例如狀態改變或視窗還原時)。"""
+        self.stop()
+        self._run(self.clock())
+
+    def _fire(self):
+        self._job = None
+        now = self.clock()
+        # after() 以毫秒為單位，若提早醒來就補睡剩下的時間，不算一次更新
+        if self._intended is not None and now < self._intended - 0.001:
+            self._arm(self._intended, now)
+            return
+        if self._intended is not None:
+            self.stats.record(now, now - self._intended)
+            if self.on_jitter is not None:
+                self.on_jitter(now - self._intended)
+        self._run(now)
+
+    def _run(self, now):
+        self.period = self.callback(now) or 1
+        target = (math.floor(now / self.period) + 1) * self.period
+        deadline = self.deadline_fn()
+        if deadline is not None and now < deadline < target:
+            target = deadline
+        self._arm(target, self.clock())
+
+    def _arm(self, target, now):
+        self._intended = target
+        delay_ms = max(0, math.ceil((target - now) * 1000))
+        self._job = self.after(delay_ms, self._fire)
+
+
+class TickStats:
+    """記錄每分鐘喚醒次數與喚醒誤差 (jitter)。"""
+
+    def __init__(self, size=600):
+        self.wakeups = collections.deque(maxlen=size)
+        self.jitter = collections.deque(maxlen=size)
+        self.total = 0
+
+    def record(self, now, jitter):
+        self.total += 1
+        self.wakeups.append(now)
+        self.jitter.append(jitter)
+
+    def wakeups_per_minute(self, now=None):
+        if not self.wakeups:
+            return 0
+        now = self.wakeups[-1] if now is None else now
+        return sum(1 for t in self.wakeups if now - t < 60)
+
+    def summary(self):
+        if not self.jitter:
+            return {"wakeups": self.total, "wakeups_per_minute": 0}
+        ordered = sorted(abs(j) for j in self.jitter)
+        return {
+            "wakeups": self.total,
+            "wakeups_per_minute": self.wakeups_per_minute(),
+            "jitter_mean_ms": sum(ordered) / len(ordered) * 1000,
+            "jitter_p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            "jitter_max_ms": ordered[-1] * 1000,
+        }
@@ -0,0 +1,142 @@
+"""系統列圖示：整個程式只建立一個 pystray.Icon 與一條執行緒，縮小/還原只切換顯示與否。
+
+圖示上的剩餘時間徽章由 PIL 繪製，依 (顯示文字, DPI 縮放) 放進有上限的 LRU 快取；
+顯示的文字沒變就不重畫也不重設圖示。pystray 與 PIL 在建立 TrayIcon 時才匯入。
+"""
+import collections
+import math
+import os
+import threading
+
+from settings import APP_NAME, ICON_FILENAME, resource_path
+
+# 徽章快取的上限；倒數中每分鐘只會用到一張，留一些給縮放變動與重新設定
+BADGE_CACHE_SIZE = 32
+# 縮放 1.0 時的圖示邊長 (px)
+ICON_SIZE = 64
+
+
+def badge_label(remaining):
+    """剩餘秒數轉成徽章文字：100 分鐘內顯示分鐘數，再長就顯示小時數；沒有排程時回傳 None。"""
+    if remaining is None:
+        return None
+    minutes = max(0, math.ceil(remaining / 60))
+    if minutes < 100:
+        return str(minutes)
+    return f"{min(99, math.ceil(minutes / 60))}h"
+
+
+def load_base_icon():
+    """讀取 icon.ico；找不到時畫一個紅色圓點代替。整個程式只解碼一次。"""
+    from PIL import Image, ImageDraw
+    try:
+        icon_path = resource_path(ICON_FILENAME)
+        if os.path.exists(icon_path):
+            with Image.open(icon_path) as img:
+                return img.convert("RGBA")
+    except OSError:
+        pass
+    img = Image.new("RGBA", (ICON_SIZE, ICON_SIZE), (32, 32, 32, 255))
+    ImageDraw.Draw(img).ellipse((8, 8, 56, 56), fill="#ff1744")
+    return img
+
+
+def render_badge(base, label, scale):
+    from PIL import Image, ImageDraw, ImageFont
+    size = max(16, round(ICON_SIZE * scale))
+    img = base.resize((size, size), Image.LANCZOS)
+    if label is None:
+        return img
+    font_size = max(8, round(size * (0.5 if len(label) < 3 else 0.4)))
+    try:
+        font = ImageFont.truetype("arialbd.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    draw = ImageDraw.Draw(img)
+    left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+    pad = max(1, size // 16)
+    box = (size - (right - left) - pad * 3, size - (bottom - top) - pad * 3, size, size)
+    draw.rounded_rectangle(box, radius=pad * 2, fill="#c62828")
+    draw.text((box[0] + pad * 1.5 - left, box[1] + pad * 1.5 - top), label, font=font, fill="white")
+    return img
+
+
+class BadgeCache:
+    """已繪製徽章圖示的 LRU 快取，鍵為 (顯示文字, DPI 縮放)。"""
+
+    def __init__(self, base, maxsize=BADGE_CACHE_SIZE):
+        self.base = base
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._images = collections.OrderedDict()
+
+    def get(self, label, scale):
+        key = (label, scale)
+        image = self._images.get(key)
+        if image is not None:
+            self.hits += 1
+            self._images.move_to_end(key)
+            return image
+        self.misses += 1
+        image = self._images[key] = render_badge(self.base, label, scale)
+        if len(self._images) > self.maxsize:
+            self._images.popitem(last=False)
+        return image
+
+
+class TrayIcon:
+    """常駐的系統列圖示；items_fn() 回傳目前的 pystray 選單項目。"""
+
+    def __init__(self, items_fn, scale=1.0):
+        import pystray
+        self.scale = scale
+        self.badges = BadgeCache(load_base_icon())
+        self.label = None
+        self.shown = False
+        self.icon_updates = 0
+        self.icon = pystray.Icon("MapleTimer", self.badges.get(None, scale), APP_NAME, pystray.Menu(items_fn))
+        self._ready = False
+        self._thread = None
+
+    def _setup(self, icon):
+        # 在圖示執行緒上呼叫；show()/hide() 在這之前只記錄狀態
+        self._ready = True
+        icon.visible = self.shown
+
+    def show(self):
+        self.shown = True
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.icon.run, args=(self._setup,), name="TrayIcon", daemon=True)
+            self._thread.start()
+        elif self._ready:
+            self.icon.visible = True
+
+    def hide(self):
+        self.shown = False
+        if self._ready:
+            self.icon.visible = False
+
+    def update(self, remaining, title):
+        """更新提示文字與徽章；顯示的值沒變時不重設圖示，回傳是否換了圖。"""
+        if self.icon.title != title:
+            self.icon.title = title
+        label = badge_label(remaining)
+        if label == self.label:
+            return False
+        self.label = label
+        self.icon.icon = self.badges.get(label, self.scale)
+        self.icon_updates += 1
+        return True
+
+    def update_menu(self):
+        if self._ready:
+            self.icon.update_menu()
+
+    def notify(self, text):
+        self.icon.notify(text, APP_NAME)
+
+    def stop(self):
+        if self._thread is not None:
+            self.icon.stop()
+            self._thread = None
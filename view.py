@@ -0,0 +1,62 @@
+import collections
+import time
+
+_MISSING = object()
+
+
+class WidgetView:
+    """記住每個元件最後一次設定的屬性，只把真的改變的屬性送給 Tk。
+
+    所有元件屬性都經由 config() 設定時，記錄下來的值就是元件目前的狀態；
+    元件樹被拆掉重建後要呼叫 forget()。calls_per_second() 回傳最近一秒實際送出的 configure 次數。
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.calls = 0
+        self.skipped = 0
+        self._state = {}
+        self._times = collections.deque(maxlen=1000)
+
+    def config(self, widget, **options):
+        state = self._state.setdefault(widget, {})
+        changed = {key: value for key, value in options.items() if state.get(key, _MISSING) != value}
+        if not changed:
+            self.skipped += 1
+            return False
+        widget.config(**changed)
+        state.update(changed)
+        self.calls += 1
+        self._times.append(self.clock())
+        return True
+
+    def forget(self):
+        self._state.clear()
+
+    def calls_per_second(self, now=None):
+        now = self.clock() if now is None else now
+        return sum(1 for t in self._times if now - t < 1)
+
+
+class Debouncer:
+    """連續呼叫時只在最後一次呼叫的 delay_ms 之後執行一次 func。"""
+
+    def __init__(self, after, after_cancel, delay_ms, func):
+        self.after = after
+        self.after_cancel = after_cancel
+        self.delay_ms = delay_ms
+        self.func = func
+        self._job = None
+
+    def __call__(self, *args):
+        self.cancel()
+        self._job = self.after(self.delay_ms, self._fire)
+
+    def cancel(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+
+    def _fire(self):
+        self._job = None
+        self.func()
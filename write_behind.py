@@ -0,0 +1,72 @@
+"""背景合併寫入：變更先留在記憶體，由背景執行緒等一小段時間後合併成一次寫入。
+
+ConfigStore (設定檔) 與 HistoryLog (執行紀錄) 共用。呼叫端改完資料後呼叫 _changed() 就返回，不碰檔案；
+flush() 可從任何執行緒立即寫入 (例如關機前)。跟程式一樣長壽的實例以 flush_at_exit() 在結束時再寫一次。
+"""
+import atexit
+import sys
+import threading
+import time
+
+
+class WriteBehind:
+    """子類別實作下列方法，前三個都在持有 _cond 時呼叫：
+
+    _has_changes()   是否有還沒寫入的變更
+    _take()          取出要寫的內容並清空待寫狀態
+    _restore(data)   寫入失敗時把內容放回去，下一輪再試
+    _write(data)     實際寫檔，在背景執行緒或 flush() 的呼叫端執行
+    """
+
+    def __init__(self, delay, name):
+        self.delay = delay
+        self._name = name
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def _changed(self):
+        # 在持有 _cond 時呼叫：通知背景執行緒有新的變更，第一次才啟動它
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def flush(self):
+        """立即寫入尚未寫入的變更，回傳是否真的寫了檔；寫入失敗時變更保留下來並丟出 OSError。"""
+        with self._write_lock:
+            with self._cond:
+                if not self._has_changes():
+                    return False
+                data = self._take()
+            try:
+                self._write(data)
+            except OSError:
+                with self._cond:
+                    self._restore(data)
+                raise
+            return True
+
+    def flush_at_exit(self):
+        """程式結束時再寫入一次，回傳 self；註冊後實例會一直留到程式結束，暫時用的實例不要呼叫。"""
+        atexit.register(self._flush_at_exit)
+        return self
+
+    def _flush_at_exit(self):
+        # 結束時寫不進去 (例如目錄被刪掉) 也只能放棄，印一行說明就好，不要丟出例外
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"{self._name} 寫入失敗: {e}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._has_changes():
+                    self._cond.wait()
+            # 等一小段時間，把這期間的變更合併成一次寫入
+            time.sleep(self.delay)
+            try:
+                self.flush()
+            except OSError:
+                time.sleep(self.delay)